@@ -1,72 +1,750 @@
 import math
 import random
+import time
 
-# Piece type to piece value conversion
-eval_position = {"P": 1, "B": 3, "N": 3, "R": 5, "Q": 9, "K": 1000}
+from tablebase import DRAW, WIN
+from tablebase import probe as probe_tablebase
+from transposition import EXACT, LOWER_BOUND, UPPER_BOUND, TranspositionTable
+from zobrist import PLAYER_COLOUR_KEYS
 
 
-def piece_value(piece, player_colour):
-    """Receives a piece and returns its respective value depending on type and colour
+def evaluate(chessboard, player_colour):
+    """Calculates the total evaluation of the chessboard where a larger evaluation is better for the AI
 
     Args:
-        piece (str): piece type initial
-        player_colour (int): player's side colour value
+        chessboard ('chessboard.Chessboard' object): instance of the Chessboard class
+        player_colour (int): player's side colour
 
     Returns:
-        int: value of the piece
+        int: total evaluation value of the chessboard
     """
 
-    value = eval_position[piece.name[0]]
+    # the chessboard keeps white's material minus black's up to date as moves are made and undone
+    if player_colour == 0:
+        return -chessboard.material
 
-    # If the colour of the piece is the same as the player's colour then the value is turned negative
-    if piece.colour == player_colour:
-        value *= -1
+    return chessboard.material
 
-    return value
 
+class SearchTimeout(Exception):
+    """Raised inside the search when its time or node budget has run out
+    """
 
-def evaluate(chessboard, player_colour):
-    """Calculates the total evaluation of the chessboard where a larger evaluation is better for the AI
+
+class SearchLimits:
+    """Time and node budget of a search, checked at every node
+    """
+
+    def __init__(self, time_budget=None, node_budget=None):
+        self.start_time = time.perf_counter()
+
+        if time_budget is None:
+            self.deadline = math.inf
+        else:
+            self.deadline = self.start_time + time_budget
+
+        if node_budget is None:
+            node_budget = math.inf
+
+        self.node_budget = node_budget
+        self.nodes = 0
+
+    def count_node(self):
+        """Counts a node and stops the search if the budget has run out
+        """
+        self.nodes += 1
+
+        if self.nodes > self.node_budget or time.perf_counter() > self.deadline:
+            raise SearchTimeout
+
+    def elapsed(self):
+        return time.perf_counter() - self.start_time
+
+    def half_used(self):
+        """Checks whether at least half of the time or node budget has been used. Each depth takes
+        several times longer than the last, so a new depth is unlikely to finish after this.
+
+        Returns:
+            bool: whether half of the budget has been used
+        """
+        return self.elapsed() * 2 >= self.deadline - self.start_time or self.nodes * 2 >= self.node_budget
+
+
+# Values of the pieces when ordering moves. The pieces are looked up by their full name, and the
+# king is never captured so it is the last attacker to try.
+ORDERING_VALUES = {"Pawn": 1, "Knight": 3, "Bishop": 3,
+                   "Rook": 5, "Queen": 9, "King": 10}
+
+# Score of a position the tablebase says the AI wins, less the ply of the chessboard the mate is on so nearer mates
+# score higher. It is far above any material balance, but below the infinity of a checkmate found by the search.
+# The ply counts from the start of the game, so the table stores the score counted from the position, see score_to_table
+TABLEBASE_WIN = 100000
+
+# Scores further from 0 than this are a mate, found by the negamax search or the tablebase, which depend on how many
+# plies away the mate is. They are stored in the transposition table counted from the position instead of the root
+MATE_THRESHOLD = 50000
+
+# A capture is not searched by the quiescence search if it could not raise the evaluation to alpha
+# even with this much to spare, which allows for positional changes the material balance misses
+DELTA_MARGIN = 2
+
+
+def material_gain(chessboard, coord, move):
+    """Finds the value of the piece a move captures plus the value gained by promoting
+
+    Args:
+        chessboard ('chessboard.Chessboard' object): instance of the Chessboard class
+        coord (tuple): start coordinate of the move
+        move (tuple): (end coord, special move)
+
+    Returns:
+        int: material gained, 0 for a quiet move
+    """
+    end_coord, special_move = move
+    captured = chessboard.get_square(end_coord)
+    gain = 0
+
+    if captured != 0:
+        gain = ORDERING_VALUES[captured.name]
+
+    elif special_move == 5:
+        gain = ORDERING_VALUES["Pawn"]
+
+    # pawns are always promoted to a queen
+    if special_move in (1, 3) and end_coord[1] in (0, 7) and chessboard.get_square(coord).name == "Pawn":
+        gain += ORDERING_VALUES["Queen"] - ORDERING_VALUES["Pawn"]
+
+    return gain
+
+
+class MoveOrdering:
+    """Killer moves and history heuristic scores shared by every node of a search, used to search
+    the moves most likely to cause a cutoff first
+    """
+
+    # number of killer moves remembered at each ply
+    KILLER_SLOTS = 2
+
+    def __init__(self, seed=None):
+        """
+        Args:
+            seed (int, optional): seed of a small random part added to the history scores, so searches with different
+                seeds try quiet moves in slightly different orders. Defaults to None (no random part).
+        """
+        # quiet moves that caused a cutoff, keyed by the ply of the chessboard
+        self.killers = {}
+
+        # how often each quiet move caused a cutoff, weighted by depth and keyed by (colour, start coord, end coord)
+        self.history = {}
+
+        self.random = None if seed is None else random.Random(seed)
+
+    def history_score(self, chessboard, coord, move):
+        """Finds the history score of a quiet move
+
+        Args:
+            chessboard ('chessboard.Chessboard' object): instance of the Chessboard class
+            coord (tuple): start coordinate of the move
+            move (tuple): (end coord, special move)
+
+        Returns:
+            int/float: the history score
+        """
+        score = self.history.get((chessboard.get_square(coord).colour, coord, move[0]), 0)
+
+        # history scores are whole numbers, so the random part only reorders moves with the same history score
+        if self.random is not None:
+            score += self.random.random()
+
+        return score
+
+    def record_cutoff(self, chessboard, coord, move, depth):
+        """Remembers a quiet move that caused a cutoff as a killer move and adds to its history score
+
+        Args:
+            chessboard ('chessboard.Chessboard' object): instance of the Chessboard class, with the move undone
+            coord (tuple): start coordinate of the move
+            move (tuple): (end coord, special move)
+            depth (int): depth left at the node, deeper cutoffs prune more so count for more
+        """
+        if material_gain(chessboard, coord, move):
+            return
+
+        killers = self.killers.setdefault(chessboard.ply, [])
+        item = (coord, move)
+
+        if item in killers:
+            killers.remove(item)
+
+        killers.insert(0, item)
+        del killers[self.KILLER_SLOTS:]
+
+        history_key = (chessboard.get_square(coord).colour, coord, move[0])
+        self.history[history_key] = self.history.get(
+            history_key, 0) + depth * depth
+
+
+class SearchStats:
+    """Counts the nodes, cutoffs and legal move generation of a search so the effect of move ordering can be measured,
+    and records how deep and how long the search went
+    """
+
+    def __init__(self):
+        self.nodes = 0
+        self.cutoffs = 0
+        self.legal_move_calls = 0
+
+        # nodes of the quiescence search past the depth limit
+        self.quiescence_nodes = 0
+
+        # null move pruning cutoffs and moves searched with a late move reduction by the negamax search
+        self.null_move_cutoffs = 0
+        self.reduced_moves = 0
+
+        # cutoffs caused by the first move searched, the higher the share the better the ordering
+        self.first_move_cutoffs = 0
+
+        # positions whose score came from the endgame tablebase instead of a search
+        self.tablebase_hits = 0
+
+        # positions whose score came from the transposition table instead of a search
+        self.table_hits = 0
+
+        # positions scored by evaluate, at the depth limit or as the stand pat of the quiescence search
+        self.leaf_evaluations = 0
+
+        # depths searched by the negamax search with an aspiration window, and searches repeated with a wider window
+        # because the score fell outside of it
+        self.aspiration_searches = 0
+        self.aspiration_researches = 0
+
+        # deepest depth whose search was completed, and seconds taken by iterative deepening
+        self.depth = 0
+        self.elapsed = 0.0
+
+    @property
+    def first_move_cutoff_rate(self):
+        if self.cutoffs == 0:
+            return 0
+
+        return self.first_move_cutoffs / self.cutoffs
+
+    @property
+    def aspiration_research_rate(self):
+        if self.aspiration_searches == 0:
+            return 0
+
+        return self.aspiration_researches / self.aspiration_searches
+
+    def to_dict(self):
+        """Gets the counters, e.g. to log them
+
+        Returns:
+            dict: value of each counter by name
+        """
+        return dict(vars(self), first_move_cutoff_rate=self.first_move_cutoff_rate,
+                    aspiration_research_rate=self.aspiration_research_rate)
+
+    def __str__(self):
+        return (f"SearchStats(depth={self.depth}, elapsed={self.elapsed:.3f}s, nodes={self.nodes}, cutoffs={self.cutoffs}, "
+                f"first_move_cutoffs={self.first_move_cutoff_rate:.2%}, legal_move_calls={self.legal_move_calls}, "
+                f"leaf_evaluations={self.leaf_evaluations}, quiescence_nodes={self.quiescence_nodes}, "
+                f"table_hits={self.table_hits}, null_move_cutoffs={self.null_move_cutoffs}, "
+                f"reduced_moves={self.reduced_moves}, tablebase_hits={self.tablebase_hits}, "
+                f"aspiration_researches={self.aspiration_researches}/{self.aspiration_searches})")
+
+
+def iterative_deepening(chessboard, player_colour, time_budget=None, max_depth=None, node_budget=None, table=None, stats=None, quiescence=True, workers=None):
+    """Searches to depth 1, 2, 3, ... until the time or node budget runs out and returns the best moves of the last completed depth
 
     Args:
         chessboard ('chessboard.Chessboard' object): instance of the Chessboard class
         player_colour (int): player's side colour
+        time_budget (float, optional): seconds the search can take. Defaults to None (no limit).
+        max_depth (int, optional): the deepest depth to search to. Defaults to None (no limit).
+        node_budget (int, optional): number of nodes the search can visit. Defaults to None (no limit).
+        table ('transposition.TranspositionTable' object, optional): transposition table. Defaults to a new table for this search.
+        stats (SearchStats, optional): node and cutoff counters. Defaults to None.
+        quiescence (bool, optional): whether to search captures past the depth limit. Defaults to True.
+        workers (int, optional): number of processes searching each depth with lazy SMP, which uses the shared
+            table of the parallel module instead of table. Defaults to None (searched in this process).
 
     Returns:
-        int: total evaluation value of the chessboard
+        list of tuple: the best moves found by the deepest completed search
+    """
+    if max_depth is None and time_budget is None and node_budget is None:
+        raise ValueError("Iterative deepening needs a depth, time or node limit.")
+
+    # the best moves of each depth are stored in the table and searched first by the next depth
+    if table is None:
+        table = TranspositionTable(1)
+
+    limits = SearchLimits(time_budget, node_budget)
+    start_ply = chessboard.ply
+
+    # the killer moves and history scores of each depth order the moves of the next
+    ordering = MoveOrdering()
+
+    # depth 1 is always completed so there is a move to return
+    best_moves = minimax(chessboard, 1, player_colour,
+                         table, None, ordering, stats, quiescence, workers, True)
+    depth = 1
+
+    while max_depth is None or depth < max_depth:
+        if limits.half_used():
+            break
+
+        try:
+            best_moves = minimax(chessboard, depth + 1, player_colour,
+                                 table, limits, ordering, stats, quiescence, workers, True)
+        except SearchTimeout:
+            # undo the moves of the unfinished search
+            while chessboard.ply > start_ply:
+                chessboard.undo_move()
+
+            break
+
+        depth += 1
+
+    # the depth of the unfinished search is not counted
+    if stats is not None:
+        stats.depth = depth
+        stats.elapsed = limits.elapsed()
+
+    return best_moves
+
+
+def minimax(chessboard, depth, player_colour, table=None, limits=None, ordering=None, stats=None, quiescence=False, workers=None, lazy_smp=False):
+    """Uses the minimax algorithm to decide the best move the computer should make given the depth value given (how many moves ahead the algorithm will look at)
+
+    Args:
+        chessboard ('chessboard.Chessboard' object): instance of the Chessboard class
+        depth (int): the maximum depth to traverse the tree
+        player_colour (int): player's side colour
+        table ('transposition.TranspositionTable' object, optional): transposition table to reuse results of positions already searched. Defaults to None.
+        limits (SearchLimits, optional): budget that raises SearchTimeout when it runs out. Defaults to None.
+        ordering (MoveOrdering, optional): killer moves and history scores to order the moves with. Defaults to None (board scan order).
+        stats (SearchStats, optional): node and cutoff counters. Defaults to None.
+        quiescence (bool, optional): whether to search captures past the depth limit. Defaults to False.
+        workers (int, optional): number of worker processes to split the root moves between, see the parallel module.
+            The table, limits, ordering and stats are not used by the workers. Defaults to None (searched in this process).
+        lazy_smp (bool, optional): whether the workers search the whole position alongside this process instead of
+            splitting the root moves, sharing a transposition table in shared memory that is used in place of table.
+            Defaults to False.
+
+    Returns:
+        tuple: tuple coorindate of the move decided by the algorithm
+    """
+    if workers is not None and lazy_smp:
+        from parallel import lazy_smp_minimax
+
+        return lazy_smp_minimax(chessboard, depth, player_colour, workers, limits, ordering, stats, quiescence)
+
+    if workers is not None:
+        from parallel import root_split_minimax
+
+        return root_split_minimax(chessboard, depth, player_colour, workers, quiescence)
+
+    if table is not None:
+        table.new_search()
+
+    return maximise(chessboard, depth, -math.inf, math.inf, player_colour, True, table, limits, ordering, stats, quiescence)
+
+
+def score_to_table(score, ply):
+    """Counts the plies of a mate score from the position instead of the root, so the score is right for the
+    position wherever it is found again, in this search or a later one
+
+    Args:
+        score (int/inf): score of the position
+        ply (int): number of plies from the root to the position
+
+    Returns:
+        int/inf: the score to store
+    """
+    if score >= MATE_THRESHOLD:
+        return score + ply
+
+    if score <= -MATE_THRESHOLD:
+        return score - ply
+
+    return score
+
+
+def score_from_table(score, ply):
+    """Counts the plies of a stored mate score from the root again, the reverse of score_to_table
+
+    Args:
+        score (int/inf): stored score of the position
+        ply (int): number of plies from the root to the position
+
+    Returns:
+        int/inf: the score of the position in this search
+    """
+    if score >= MATE_THRESHOLD:
+        return score - ply
+
+    if score <= -MATE_THRESHOLD:
+        return score + ply
+
+    return score
+
+
+def probe_table(table, key, depth, alpha, beta, ply=0):
+    """Looks up the position in the transposition table
+
+    Args:
+        table ('transposition.TranspositionTable' object): the transposition table
+        key (int): key of the position
+        depth (int): depth the position is going to be searched to
+        alpha (int/inf): value of alpha
+        beta (int/inf): value of beta
+        ply (int, optional): number of plies from the root to the position, that mate scores count from. Defaults to 0.
+
+    Returns:
+        tuple of (NoneType/int, NoneType/tuple): the stored score if it can be used instead of searching, and the stored best move
+    """
+    entry = table.probe(key)
+
+    if entry is None:
+        return None, None
+
+    stored_depth, score, bound, best_move = entry
+    score = score_from_table(score, ply)
+
+    if stored_depth >= depth:
+        if bound == EXACT or (bound == LOWER_BOUND and score >= beta) or (bound == UPPER_BOUND and score <= alpha):
+            return score, best_move
+
+    return None, best_move
+
+
+def store_table(table, key, depth, score, original_alpha, beta, best_move, ply=0):
+    """Stores the result of searching a position in the transposition table
+
+    Args:
+        table ('transposition.TranspositionTable' object): the transposition table
+        key (int): key of the position
+        depth (int): depth the position was searched to
+        score (int/inf): the evaluation of the position
+        original_alpha (int/inf): value of alpha when the search of the position started
+        beta (int/inf): value of beta when the search of the position started
+        best_move (NoneType/tuple): the best move found
+        ply (int, optional): number of plies from the root to the position, that mate scores count from. Defaults to 0.
+    """
+    if score <= original_alpha:
+        bound = UPPER_BOUND
+    elif score >= beta:
+        bound = LOWER_BOUND
+    else:
+        bound = EXACT
+
+    table.store(key, depth, score_to_table(score, ply), bound, best_move)
+
+
+def raise_alpha(alpha, max_eval, best_move_wanted):
+    """Raises alpha to the best evaluation found so far
+
+    Args:
+        alpha (int/inf): value of alpha
+        max_eval (int/inf): the best evaluation found so far
+        best_move_wanted (bool): if this is the root that returns every best move
+
+    Returns:
+        int/inf: the new value of alpha
     """
+    # The root keeps alpha just below the best evaluation, so a move that is only as good as alpha is
+    # searched exactly rather than cut off, and every move that really has the best evaluation is returned.
+    if best_move_wanted:
+        max_eval -= 1
+
+    return max(alpha, max_eval)
+
 
-    total_eval_value = 0
+def staged_moves(chessboard, colour, hash_move=None, ordering=None, stats=None):
+    """Generates the moves of a node one piece at a time, so when a move causes a cutoff the
+    legal moves of the pieces that have not been reached are never generated.
 
-    # iterates through each square
+    With move ordering the stages are: the hash move and the killer moves of the ply, which only need
+    the legal moves of their own piece, then the captures by most valuable victim then least valuable
+    attacker, and last the quiet moves by history score.
+
+    Args:
+        chessboard ('chessboard.Chessboard' object): instance of the Chessboard class
+        colour (int): colour of the pieces to move
+        hash_move (NoneType/tuple, optional): best move stored in the transposition table. Defaults to None.
+        ordering (MoveOrdering, optional): killer moves and history scores, or None for board scan order. Defaults to None.
+        stats (SearchStats, optional): counts the calls to get_legal_moves. Defaults to None.
+
+    Yields:
+        tuple: (start coord, (end coord, special move)) of each legal move
+    """
+    pieces = []
+
+    # finding the pieces is cheap, generating their legal moves is not
     for num_row in range(8):
         for num_column in range(8):
             coord = (num_column, num_row)
             square = chessboard.get_square(coord)
 
-            # if square contains a piece
-            if square != 0:
-                # add the value of the piece to total_eval_value
-                total_eval_value += piece_value(square, player_colour)
+            if square != 0 and square.colour == colour:
+                pieces.append(coord)
 
-    return total_eval_value
+    # legal moves of each piece generated so far
+    legal_moves = {}
 
+    def moves_of(coord):
+        if coord not in legal_moves:
+            if stats is not None:
+                stats.legal_move_calls += 1
 
-def minimax(chessboard, depth, player_colour):
-    """Uses the minimax algorithm to decide the best move the computer should make given the depth value given (how many moves ahead the algorithm will look at)
+            legal_moves[coord] = chessboard.get_legal_moves(coord)
+
+        return legal_moves[coord]
+
+    searched = []
+
+    # the best move stored in the transposition table is searched first as it is likely to cause a cutoff
+    if hash_move is not None and hash_move[0] in pieces and hash_move[1] in moves_of(hash_move[0]):
+        searched.append(hash_move)
+        yield hash_move
+
+    if ordering is None:
+        for coord in pieces:
+            for move in moves_of(coord):
+                if (coord, move) not in searched:
+                    yield coord, move
+
+        return
+
+    # killer moves are only checked against the legal moves of their own piece
+    for killer in ordering.killers.get(chessboard.ply, ()):
+        if killer not in searched and killer[0] in pieces and killer[1] in moves_of(killer[0]) \
+                and not material_gain(chessboard, killer[0], killer[1]):
+            searched.append(killer)
+            yield killer
+
+    quiet_moves = []
+    captures = []
+
+    for coord in pieces:
+        for move in moves_of(coord):
+            if (coord, move) in searched:
+                continue
+
+            gain = material_gain(chessboard, coord, move)
+
+            if gain:
+                attacker = chessboard.get_square(coord)
+                captures.append(
+                    (gain * 16 - ORDERING_VALUES[attacker.name], coord, move))
+            else:
+                quiet_moves.append((coord, move))
+
+    # the sort is stable, so moves with the same score stay in board scan order
+    captures.sort(key=lambda capture: capture[0], reverse=True)
+
+    for _, coord, move in captures:
+        yield coord, move
+
+    quiet_moves.sort(key=lambda item: ordering.history_score(
+        chessboard, item[0], item[1]), reverse=True)
+
+    yield from quiet_moves
+
+
+def capture_moves(chessboard, colour, stats=None):
+    """Generates the captures and promotions of a colour for the quiescence search
 
     Args:
         chessboard ('chessboard.Chessboard' object): instance of the Chessboard class
-        depth (int): the maximum depth to traverse the tree
+        colour (int): colour of the pieces to move
+        stats (SearchStats, optional): counts the calls to get_legal_captures. Defaults to None.
+
+    Returns:
+        list of tuple: (material gained, start coord, (end coord, special move)) of each capture,
+            by most valuable victim then least valuable attacker
+    """
+    captures = []
+
+    for num_row in range(8):
+        for num_column in range(8):
+            coord = (num_column, num_row)
+            square = chessboard.get_square(coord)
+
+            if square != 0 and square.colour == colour:
+                if stats is not None:
+                    stats.legal_move_calls += 1
+
+                for move in chessboard.get_legal_captures(coord):
+                    gain = material_gain(chessboard, coord, move)
+                    captures.append(
+                        (gain * 16 - ORDERING_VALUES[square.name], gain, coord, move))
+
+    captures.sort(key=lambda capture: capture[0], reverse=True)
+
+    return [capture[1:] for capture in captures]
+
+
+def quiesce_max(chessboard, alpha, beta, player_colour, limits=None, stats=None):
+    """Searches only the AI's captures past the depth limit, so a position is not evaluated in the middle of an exchange
+
+    Args:
+        chessboard ('chessboard.Chessboard' object): instance of the Chessboard class
+        alpha (int/inf): value of alpha
+        beta (int/inf): value of beta
         player_colour (int): player's side colour
+        limits (SearchLimits, optional): search budget. Defaults to None.
+        stats (SearchStats, optional): node counters. Defaults to None.
 
     Returns:
-        tuple: tuple coorindate of the move decided by the algorithm
+        int: the maximum evaluation
+    """
+    # stand pat: the AI does not have to capture, so the evaluation is at least the static evaluation
+    max_eval = evaluate(chessboard, player_colour)
+
+    if stats is not None:
+        stats.leaf_evaluations += 1
+
+    if max_eval >= beta:
+        return max_eval
+
+    alpha = max(alpha, max_eval)
+    stand_pat = max_eval
+
+    for gain, coord, move in capture_moves(chessboard, 1 - player_colour, stats):
+        # delta pruning: the captures are sorted by the value of the victim, so if this one cannot
+        # raise the evaluation to alpha, none of the rest can
+        if stand_pat + gain + DELTA_MARGIN <= alpha:
+            # the player can stand pat after any of the captures left, so none of them can score more than
+            # stand_pat + gain. Returning that keeps the upper bound stored in the transposition table correct.
+            max_eval = max(max_eval, stand_pat + gain)
+            break
+
+        if limits is not None:
+            limits.count_node()
+
+        if stats is not None:
+            stats.quiescence_nodes += 1
+
+        chessboard.move_and_special_moves(coord, move[0], move[1])
+        score = quiesce_min(chessboard, alpha, beta,
+                            player_colour, limits, stats)
+        chessboard.undo_move()
+
+        if score > max_eval:
+            max_eval = score
+
+        alpha = max(alpha, max_eval)
+
+        if alpha >= beta:
+            break
+
+    return max_eval
+
+
+def quiesce_min(chessboard, alpha, beta, player_colour, limits=None, stats=None):
+    """Searches only the player's captures past the depth limit, so a position is not evaluated in the middle of an exchange
+
+    Args:
+        chessboard ('chessboard.Chessboard' object): instance of the Chessboard class
+        alpha (int/inf): value of alpha
+        beta (int/inf): value of beta
+        player_colour (int): player's side colour
+        limits (SearchLimits, optional): search budget. Defaults to None.
+        stats (SearchStats, optional): node counters. Defaults to None.
+
+    Returns:
+        int: the minimum evaluation
+    """
+    # stand pat: the player does not have to capture either
+    min_eval = evaluate(chessboard, player_colour)
+
+    if stats is not None:
+        stats.leaf_evaluations += 1
+
+    if min_eval <= alpha:
+        return min_eval
+
+    beta = min(beta, min_eval)
+    stand_pat = min_eval
+
+    for gain, coord, move in capture_moves(chessboard, player_colour, stats):
+        # delta pruning, the same as in quiesce_max
+        if stand_pat - gain - DELTA_MARGIN >= beta:
+            min_eval = min(min_eval, stand_pat - gain)
+            break
+
+        if limits is not None:
+            limits.count_node()
+
+        if stats is not None:
+            stats.quiescence_nodes += 1
+
+        chessboard.move_and_special_moves(coord, move[0], move[1])
+        score = quiesce_max(chessboard, alpha, beta,
+                            player_colour, limits, stats)
+        chessboard.undo_move()
+
+        if score < min_eval:
+            min_eval = score
+
+        beta = min(beta, min_eval)
+
+        if alpha >= beta:
+            break
+
+    return min_eval
+
+
+def tablebase_score(chessboard, player_colour, stats=None):
+    """Scores the position from the endgame tablebase, which has the positions with few pieces
+
+    Args:
+        chessboard ('chessboard.Chessboard' object): instance of the Chessboard class
+        player_colour (int): player's side colour
+        stats (SearchStats, optional): counters of the search. Defaults to None.
+
+    Returns:
+        NoneType/int: None if the position is not in the tablebase, otherwise its exact score for the AI
+    """
+    entry = probe_tablebase(chessboard)
+
+    if entry is None:
+        return None
+
+    if stats is not None:
+        stats.tablebase_hits += 1
+
+    result, plies = entry
+
+    if result == DRAW:
+        return 0
+
+    score = TABLEBASE_WIN - chessboard.ply - plies
+
+    # the result is for the side to move
+    if (result == WIN) == (chessboard.turn == 1 - player_colour):
+        return score
+
+    return -score
+
+
+def count_cutoff(stats, moves_searched):
+    """Counts a beta cutoff
+
+    Args:
+        stats (SearchStats): search counters, or None
+        moves_searched (int): number of moves searched at the node, including the one that caused the cutoff
     """
-    return maximise(chessboard, depth, -math.inf, math.inf, player_colour, True)
+    if stats is not None:
+        stats.cutoffs += 1
 
+        if moves_searched == 1:
+            stats.first_move_cutoffs += 1
 
-def maximise(chessboard, depth, alpha, beta, player_colour, best_move_wanted):
+
+def maximise(chessboard, depth, alpha, beta, player_colour, best_move_wanted, table=None, limits=None, ordering=None, stats=None, quiescence=False):
     """Maximises the chessboard evaluation
 
     Args:
@@ -76,54 +754,98 @@ def maximise(chessboard, depth, alpha, beta, player_colour, best_move_wanted):
         beta (int/inf): value of beta
         player_colour (int): player's side colour
         best_move_wanted (bool): if the move is needed to be returned by the function
+        table ('transposition.TranspositionTable' object, optional): transposition table. Defaults to None.
+        limits (SearchLimits, optional): search budget. Defaults to None.
+        ordering (MoveOrdering, optional): killer moves and history scores to order the moves with. Defaults to None (board scan order).
+        stats (SearchStats, optional): node and cutoff counters. Defaults to None.
+        quiescence (bool, optional): whether to search captures past the depth limit. Defaults to False.
 
     Returns:
         int/tuple: the maximum evaluation or the decided move
     """
 
+    if limits is not None:
+        limits.count_node()
+
+    if stats is not None:
+        stats.nodes += 1
+
+    # the tablebase gives the exact score of an ending with few pieces, the root still searches to pick a move
+    if not best_move_wanted:
+        score = tablebase_score(chessboard, player_colour, stats)
+
+        if score is not None:
+            return score
+
     if depth == 0:
+        if quiescence:
+            return quiesce_max(chessboard, alpha, beta, player_colour, limits, stats)
+
+        if stats is not None:
+            stats.leaf_evaluations += 1
+
         return evaluate(chessboard, player_colour)
 
+    original_alpha = alpha
+    hash_move = None
+
+    if table is not None:
+        key = chessboard.zobrist_key ^ PLAYER_COLOUR_KEYS[player_colour]
+        # tablebase scores count plies from the start of the game, see TABLEBASE_WIN
+        score, hash_move = probe_table(table, key, depth, alpha, beta, chessboard.ply)
+
+        # the root always searches so that it can return the moves
+        if score is not None and not best_move_wanted:
+            if stats is not None:
+                stats.table_hits += 1
+
+            return score
+
     # sets max_eval to negative infinity
     max_eval = -math.inf
     best_move = []
+    first_best_move = None
+    moves_searched = 0
 
-    # iterates through each square in the chessboard
-    for num_row in range(8):
-        for num_column in range(8):
-            coord = (num_column, num_row)
-            square = chessboard.get_square(coord)
+    # get the best possible move the computer could make
+    for coord, move in staged_moves(chessboard, 1 - player_colour, hash_move, ordering, stats):
+        chessboard.move_and_special_moves(coord, move[0], move[1])
 
-            if square != 0 and square.colour != player_colour:
-                all_moves = chessboard.get_legal_moves(coord)
+        score = minimise(chessboard, depth - 1, alpha, beta,
+                         player_colour, table, limits, ordering, stats, quiescence)
 
-                # get the best possible move the computer could make
-                for move in all_moves:
-                    chessboard.move_and_special_moves(coord, move[0], move[1])
+        # undo the move
+        chessboard.undo_move()
 
-                    score = minimise(chessboard, depth - 1,
-                                     alpha, beta, player_colour)
+        moves_searched += 1
 
-                    # undo the move
-                    chessboard.undo_move()
+        if best_move_wanted:
+            # Once the evaluation of each move is calculated, if the current move's evaluation score is greater than max_eval, set max_value to the current move's score.
+            if score > max_eval:
+                best_move = [(coord, move)]
 
-                    if best_move_wanted:
-                        # Once the evaluation of each move is calculated, if the current move's evaluation score is greater than max_eval, set max_value to the current move's score.
-                        if score > max_eval:
-                            best_move = [(coord, move)]
+            elif score == max_eval:
+                # If multiple moves with the same best evalution, then append it to the best_move list.
+                best_move.append((coord, move))
 
-                        elif score == max_eval:
-                            # If multiple moves with the same best evalution, then append it to the best_move list.
-                            best_move.append((coord, move))
+        if score > max_eval:
+            max_eval = score
+            first_best_move = (coord, move)
 
-                    if score > max_eval:
-                        max_eval = score
+        alpha = raise_alpha(alpha, max_eval, best_move_wanted)
 
-                    if max_eval > alpha:
-                        alpha = max_eval
+        # the rest of the node's moves are never generated. The root is never cut off as beta is infinity
+        if alpha >= beta:
+            count_cutoff(stats, moves_searched)
 
-                    if alpha >= beta:
-                        break
+            if ordering is not None:
+                ordering.record_cutoff(chessboard, coord, move, depth)
+
+            break
+
+    if table is not None:
+        store_table(table, key, depth, max_eval,
+                    original_alpha, beta, first_best_move, chessboard.ply)
 
     if best_move_wanted:
         # print(f"score: {max_eval}")
@@ -133,7 +855,7 @@ def maximise(chessboard, depth, alpha, beta, player_colour, best_move_wanted):
     return max_eval
 
 
-def minimise(chessboard, depth, alpha, beta, player_colour):
+def minimise(chessboard, depth, alpha, beta, player_colour, table=None, limits=None, ordering=None, stats=None, quiescence=False):
     """Minimises the chessboard evaluation
 
     Args:
@@ -142,42 +864,83 @@ def minimise(chessboard, depth, alpha, beta, player_colour):
         beta (int/inf): value of beta
         depth (int): the maximum depth to traverse the tree
         player_colour (int): player's side colour
+        table ('transposition.TranspositionTable' object, optional): transposition table. Defaults to None.
+        limits (SearchLimits, optional): search budget. Defaults to None.
+        ordering (MoveOrdering, optional): killer moves and history scores to order the moves with. Defaults to None (board scan order).
+        stats (SearchStats, optional): node and cutoff counters. Defaults to None.
+        quiescence (bool, optional): whether to search captures past the depth limit. Defaults to False.
 
     Returns:
         int: the minimum evaluation
     """
+    if limits is not None:
+        limits.count_node()
+
+    if stats is not None:
+        stats.nodes += 1
+
+    score = tablebase_score(chessboard, player_colour, stats)
+
+    if score is not None:
+        return score
+
     if depth == 0:
+        if quiescence:
+            return quiesce_min(chessboard, alpha, beta, player_colour, limits, stats)
+
+        if stats is not None:
+            stats.leaf_evaluations += 1
+
         return evaluate(chessboard, player_colour)
 
+    original_beta = beta
+    hash_move = None
+
+    if table is not None:
+        key = chessboard.zobrist_key ^ PLAYER_COLOUR_KEYS[player_colour]
+        score, hash_move = probe_table(table, key, depth, alpha, beta, chessboard.ply)
+
+        if score is not None:
+            if stats is not None:
+                stats.table_hits += 1
+
+            return score
+
     # Sets max_eval to positive infinity
     min_eval = math.inf
+    first_best_move = None
+    moves_searched = 0
 
-    # Iterates through each square in the chessboard
-    for num_row in range(8):
-        for num_column in range(8):
-            coord = (num_column, num_row)
-            square = chessboard.get_square(coord)
+    # Get the best possible move the player could make
+    for coord, move in staged_moves(chessboard, player_colour, hash_move, ordering, stats):
+        chessboard.move_and_special_moves(coord, move[0], move[1])
+
+        score = maximise(chessboard, depth - 1, alpha, beta,
+                         player_colour, False, table, limits, ordering, stats, quiescence)
+
+        chessboard.undo_move()
 
-            if square != 0 and square.colour == player_colour:
-                all_moves = chessboard.get_legal_moves(coord)
+        moves_searched += 1
 
-                # Get the best possible move the player could make
-                for move in all_moves:
-                    chessboard.move_and_special_moves(coord, move[0], move[1])
+        if score < min_eval:
+            min_eval = score
+            first_best_move = (coord, move)
 
-                    score = maximise(chessboard, depth - 1, alpha, beta,
-                                     player_colour, False)
+        if min_eval < beta:
+            beta = min_eval
 
-                    chessboard.undo_move()
+        # the rest of the node's moves are never generated
+        if alpha >= beta:
+            count_cutoff(stats, moves_searched)
 
-                    if score < min_eval:
-                        min_eval = score
+            if ordering is not None:
+                ordering.record_cutoff(chessboard, coord, move, depth)
 
-                    if min_eval < beta:
-                        beta = min_eval
+            break
 
-                    if alpha >= beta:
-                        break
+    if table is not None:
+        store_table(table, key, depth, min_eval,
+                    alpha, original_beta, first_best_move, chessboard.ply)
 
     return min_eval
 
@@ -1,5 +1,6 @@
-# import time
-from random import choice
+import atexit
+import os
+import time
 
 from flask import Flask, flash, redirect, render_template, request, session, url_for
 from flask_bcrypt import Bcrypt
@@ -9,16 +10,22 @@ from flask_session import Session
 from flask_socketio import SocketIO
 from flask_sqlalchemy import SQLAlchemy
 
-from ai import minimax
+from book import get_book
+from compute import create_pool, search_move
 from config import Config
 from forms import LoginForm, RegistrationForm
-from game import Game, Game_AI
+from game import ENGINES, Game, Game_AI
+from registry import DatabaseGameStore, GameRegistry
+from tablebase import missing_tables
 
 # creates the Flask instance. Passes the argument __name__ which is the name of the application's module. It needs to know this in order for flask to know where to look for resourses.
 app = Flask(__name__)
 
 app.config.from_object(Config)
 
+if not (app.config['SQLALCHEMY_DATABASE_URI'] or "").startswith("postgresql://"):
+    raise ValueError("Incorrectly formatted postgres URL")
+
 # creates the SQLAlchemy object
 db = SQLAlchemy(app)
 app.config['SESSION_SQLALCHEMY'] = db
@@ -39,9 +46,75 @@ login_manager = LoginManager(app)
 # adds Flask_SocketIO to the flask application
 socketio = SocketIO(app)
 
+
+class GameRecord(db.Model):
+    """Record of a game, see Game.to_record, written behind the moves by the game registry. The games of the
+    game_record table, pickled by earlier versions, are not read.
+    """
+    __tablename__ = "games"
+
+    id = db.Column(db.String(32), primary_key=True)
+    backend = db.Column(db.String(8), nullable=False)
+
+    # packed position the game started from, None for the initial layout, and the moves played from it
+    start = db.Column(db.LargeBinary, nullable=True)
+    start_ply = db.Column(db.Integer, nullable=False)
+    moves = db.Column(db.LargeBinary, nullable=False)
+
+    # packed current position, see position.pack
+    position = db.Column(db.LargeBinary, nullable=False)
+    ply = db.Column(db.Integer, nullable=False)
+
+    winner = db.Column(db.String(4), nullable=True)
+    checkmate = db.Column(db.Boolean, nullable=False)
+    draw = db.Column(db.Boolean, nullable=False)
+
+    # difficulty level and search engine of a game against the AI, None for a pass and play game
+    depth = db.Column(db.Integer, nullable=True)
+    engine = db.Column(db.String(16), nullable=True)
+
+
 # creates the initial database
 db.create_all()
 
+# games being played, kept in memory and written to the database in batches, the session only holds the game's id
+games = GameRegistry(DatabaseGameStore(db, GameRecord), app.config['GAME_REGISTRY_SIZE'],
+                     app.config['GAME_FLUSH_INTERVAL'], app.config['GAME_FLUSH_BATCH'])
+
+# the AI searches run in this pool, so the worker keeps serving the other sockets while the AI thinks
+compute_pool = create_pool(app.config['COMPUTE_POOL'], app.config['COMPUTE_WORKERS'])
+
+# memory mapped opening book, None if there is no book file
+opening_book = get_book(app.config['OPENING_BOOK'])
+
+# the AI only plays the endings of the tables it has exactly, see tablebase.py
+if missing_tables():
+    app.logger.warning("Tablebases without a file, generate them with python tablebase.py generate %s",
+                       " ".join(missing_tables()))
+
+# ids of the games whose AI move is being searched. A game's sockets are all served by this worker, see registry.py
+pending_searches = set()
+
+
+def flush_games():
+    """Writes the changed games to the database once their changes have waited long enough, so the games that
+    are no longer being played are written too
+    """
+    while True:
+        socketio.sleep(app.config['GAME_FLUSH_INTERVAL'] / 2)
+
+        with app.app_context():
+            games.flush_due()
+
+
+def flush_all_games():
+    with app.app_context():
+        games.flush()
+
+
+socketio.start_background_task(flush_games)
+atexit.register(flush_all_games)
+
 
 class User(UserMixin):
     # pylint: disable=W0622
@@ -96,10 +169,10 @@ def play():
 @app.route('/game-pass-and-play')
 def game_pass_and_play():
     """
-    GET: Create instance of a chess Game, store it in session and display game-pass-and-play page
+    GET: Create instance of a chess Game, store its id in session and display game-pass-and-play page
     """
     new_game = Game()
-    session['game'] = new_game
+    session['game_id'] = games.create(new_game)
 
     return render_template("game_pass_and_play.html")
 
@@ -107,7 +180,7 @@ def game_pass_and_play():
 @app.route('/game-ai')
 def game_ai():
     """
-    GET: Create instance of a chess Game, store it in session and display game-ai page
+    GET: Create instance of a chess Game, store its id in session and display game-ai page
     """
     # get the depth query parameter
     depth = request.args.get('depth')
@@ -115,8 +188,15 @@ def game_ai():
     if depth is None or not depth.isdigit or int(depth) not in [1, 2, 3]:
         return redirect(url_for('play'))
 
-    new_game = Game_AI(int(depth))
-    session['game'] = new_game
+    # the search engine can be chosen with the engine query parameter, otherwise it is AI_ENGINE
+    engine = request.args.get('engine', app.config['AI_ENGINE'])
+
+    if engine not in ENGINES:
+        return redirect(url_for('play'))
+
+    # the chessboard that searches the most nodes per second, see AI_BACKEND
+    new_game = Game_AI(int(depth), backend=app.config['AI_BACKEND'], engine=engine)
+    session['game_id'] = games.create(new_game)
 
     return render_template("game_ai.html")
 
@@ -209,49 +289,124 @@ def connect():
     # print('connected')
 
 
+def client_position(game, version):
+    """Gets the position the client shows, so the response only sends the squares that change from it
+
+    Args:
+        game (Game/Game_AI): the game
+        version (NoneType/int): version of the game the client shows, None if it has no position yet
+
+    Returns:
+        NoneType/tuple: None if the client needs a full snapshot, otherwise (version, position dictionary)
+    """
+    if not app.config['DELTA_PAYLOADS'] or version is None or version != game.version():
+        return None
+
+    return version, game.position_dictionary()
+
+
 @socketio.on('available_moves')
-def available_moves(move=None):
-    """Emits all the legal moves in dictionary format, position dictionary, and game information.
+def available_moves(move=None, version=None):
+    """Emits all the legal moves in dictionary format, the position or the squares that changed, and game information.
 
     Args:
         move (str): the starting coord, ending coord, and special moves type value joined together as a string. The coordiantes are in algebraic notation.
-        player_colour (tuple): player's colour as an integer.
+        version (int): version of the game the client shows, None to get a full snapshot of the position.
     """
     # print(move, player_colour)
-    game = session.get('game')
+    # the session only keeps the game's id, the game is in the registry
+    game_id = session.get('game_id')
+    game = games.get(game_id)
 
-    if move is None:
-        available_moves_dict = game.available_moves_dictionary()
-    else:
-        # executes move and returns available moves dictionary
-        available_moves_dict = game.next_move(move)
+    if game is None:
+        return
 
-        # print(game.chess)
+    since = client_position(game, version)
 
-    current_turn = game.current_turn
-    winner = game.winner
-    checkmate = game.is_checkmate
-    draw = game.is_draw
+    # no move is made while the AI is searching, the search would be of a position that is gone
+    if move is not None and game_id not in pending_searches:
+        # executes move
+        game.next_move(move)
+        games.save(game_id, game)
 
-    information = {'current_turn': current_turn,
-                   'winner': winner, 'checkmate': checkmate, 'draw': draw}
+        # print(game.chess)
 
-    socketio.emit('available_moves_response', {
-        'available_moves': available_moves_dict, 'position': game.position_dictionary(), 'information': information}, room=request.sid)
+    socketio.emit('available_moves_response', game.state_payload(since), room=request.sid)
 
 
 @socketio.on('ai_moves')
-def ai_moves(player_colour):
-    """AI makes next move and then emits all the legal moves in dictionary format, position dictionary, and game information.
+def ai_moves(player_colour, version=None, profile=False):
+    """AI makes next move and then emits all the legal moves in dictionary format, the position or the squares that changed, and game information.
 
     Args:
         player_colour (int): player's side colour
+        version (int): version of the game the client shows, None to get a full snapshot of the position.
+        profile (bool): whether to write the cProfile statistics of the search to AI_PROFILE_DIR, ignored if it is not set.
     """
-    game = session.get('game')
+    game_id = session.get('game_id')
+    game = games.get(game_id)
+
+    # the search already running answers the client
+    if game is None or game_id in pending_searches:
+        return
+
+    # a client that asks on the player's turn or after the game has ended is sent the position to catch up with
+    if game.winner is not None or game.current_turn != 1 - player_colour:
+        socketio.emit('available_moves_response', game.state_payload(), room=request.sid)
+        return
+
+    since = client_position(game, version)
+    searched_position = game.version(), game.chess.zobrist_key
+
+    # the opening book answers the first moves of a game without searching
+    ai_move = None if opening_book is None else opening_book.choose_move(game.chess)
+
+    if ai_move is None:
+        socketio.emit('ai_thinking', room=request.sid)
 
-    # before = time.time()
-    ai_move = choice(minimax(game.chess, game.depth, player_colour))
-    # print(f"Time: {time.time() - before}")
+        # only the hardest difficulty is given the extra processes
+        workers = app.config['AI_WORKERS'] if game.pruning and app.config['AI_WORKERS'] > 1 else None
+
+        profile_path = None
+
+        if profile and app.config['AI_PROFILE_DIR']:
+            profile_path = os.path.join(app.config['AI_PROFILE_DIR'], f"{game_id}-{game.chess.ply}.prof")
+
+        before = time.perf_counter()
+        pending_searches.add(game_id)
+
+        try:
+            future = compute_pool.submit(search_move, type(game.chess).__name__, game.chess.moves_played(), player_colour,
+                                         game.engine, game.time_budget, game.max_depth, game.pruning,
+                                         app.config['TRANSPOSITION_TABLE_MB'], workers, game.chess.start_position,
+                                         profile_path)
+
+            # sleeping lets gevent serve the other sockets until the search is done
+            while not future.done():
+                socketio.sleep(app.config['COMPUTE_POLL_INTERVAL'])
+
+            ai_move, stats = future.result()
+        finally:
+            pending_searches.discard(game_id)
+
+        # the time not spent searching was spent waiting for a free process of the pool and handing the job over
+        waited = time.perf_counter() - before
+        app.logger.info("AI move of game %s in %.3fs, %.3fs of it searching: %s", game_id, waited, stats.elapsed, stats)
+
+        if profile_path is not None:
+            app.logger.info("Profile of the search written to %s", profile_path)
+
+        # the game could have been evicted and loaded again while waiting, and the move is only played on the
+        # position it was searched from
+        game = games.get(game_id)
+
+        if game is None:
+            return
+
+        if (game.version(), game.chess.zobrist_key) != searched_position:
+            app.logger.warning("AI move of game %s dropped, the game changed during the search", game_id)
+            socketio.emit('available_moves_response', game.state_payload(since), room=request.sid)
+            return
 
     ai_source = game.chess.coord_to_notation(ai_move[0])
     ai_target = game.chess.coord_to_notation(ai_move[1][0])
@@ -262,21 +417,11 @@ def ai_moves(player_colour):
 
     # make that move
     game.next_move(ai_source + ai_target + ai_special_move)
+    games.save(game_id, game)
 
     # print(f"TURN: {game.current_turn}")
 
-    available_moves_dict = game.available_moves_dictionary()
-
-    current_turn = game.current_turn
-    winner = game.winner
-    checkmate = game.is_checkmate
-    draw = game.is_draw
-
-    information = {'current_turn': current_turn,
-                   'winner': winner, 'checkmate': checkmate, 'draw': draw}
-
-    socketio.emit('available_moves_response', {
-        'available_moves': available_moves_dict, 'position': game.position_dictionary(), 'information': information}, room=request.sid)
+    socketio.emit('available_moves_response', game.state_payload(since), room=request.sid)
 
     # print('available_moves')
 
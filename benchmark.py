@@ -0,0 +1,590 @@
+"""Benchmarks for the chessboard implementations and the AI search
+
+Usage:
+    python benchmark.py allocations
+    python benchmark.py backends
+    python benchmark.py ordering
+    python benchmark.py generation
+    python benchmark.py quiescence
+    python benchmark.py engines
+    python benchmark.py pruning
+    python benchmark.py aspiration
+    python benchmark.py parallel
+    python benchmark.py smp
+"""
+import argparse
+import math
+import random
+import time
+import tracemalloc
+
+import search
+from ai import MoveOrdering, SearchStats, iterative_deepening, maximise, minimax, minimise
+from game import BACKENDS
+from parallel import get_shared_table, shutdown_pools
+from transposition import TranspositionTable
+
+# Fixed positions to compare searches on, as (seed, plies) of a random line from the starting position
+POSITION_SUITE = [(0, 8), (1, 12), (2, 16), (3, 20),
+                  (4, 24), (5, 30), (6, 36), (7, 44)]
+
+# most (blocks, bytes) a made move can keep alive until it is undone. The undo records are reused and the values
+# they save are small ints, shared objects or machine integers in the key, material and unmoved stacks, so a move
+# should keep nothing alive
+ALLOCATION_LIMITS = (0.05, 2)
+
+
+def random_line(chessboard_class, plies, seed=0):
+    """Plays random legal moves from the starting position and returns them
+
+    Args:
+        chessboard_class (class): Chessboard or Bitboard
+        plies (int): maximum number of moves to play
+        seed (int, optional): seed of the random number generator. Defaults to 0.
+
+    Returns:
+        list of tuple: (start coord, end coord, special move) of every move played
+    """
+    rng = random.Random(seed)
+    chess = chessboard_class()
+    line = []
+
+    for _ in range(plies):
+        moves = chess.legal_moves()
+
+        if not moves:
+            break
+
+        coord, (end_coord, special_move) = rng.choice(moves)
+        chess.move_and_special_moves(coord, end_coord, special_move)
+        line.append((coord, end_coord, special_move))
+
+    return line
+
+
+def make_unmake(chessboard_class, line, repeats=200):
+    """Measures the memory blocks each move keeps alive until it is undone and the time of a make/unmake pair.
+    What a move keeps alive is what only its undo record refers to, so it is measured by emptying the undo records
+    after playing the line. The ints of the position itself are not counted, they do not grow with the moves.
+
+    Args:
+        chessboard_class (class): Chessboard or Bitboard
+        line (list of tuple): moves to play from the starting position
+        repeats (int, optional): number of times the line is played and undone for the timing. Defaults to 200.
+
+    Returns:
+        tuple of (float, float, float): blocks per move, bytes per move and microseconds per make/unmake pair
+    """
+    chess = chessboard_class()
+
+    def play_and_undo():
+        for move in line:
+            chess.move_and_special_moves(*move)
+
+        for _ in line:
+            chess.undo_move()
+
+    # warm up so anything that is reused between moves already exists
+    play_and_undo()
+
+    time_before = time.perf_counter()
+    for _ in range(repeats):
+        play_and_undo()
+    elapsed = time.perf_counter() - time_before
+
+    tracemalloc.start()
+
+    for move in line:
+        chess.move_and_special_moves(*move)
+
+    played = tracemalloc.take_snapshot()
+
+    # the chessboard can not undo the moves after this
+    for record in chess.history:
+        record[:] = [None] * len(record)
+
+    emptied = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    stats = played.filter_traces(ignore).compare_to(
+        emptied.filter_traces(ignore), 'filename')
+    blocks = sum(stat.count_diff for stat in stats)
+    size = sum(stat.size_diff for stat in stats)
+
+    pairs = repeats * len(line)
+
+    return blocks / len(line), size / len(line), elapsed / pairs * 1e6
+
+
+def allocations(args):
+    line = random_line(BACKENDS["mailbox"], args.plies)
+
+    print(f"{len(line)} moves")
+
+    for name, chessboard_class in BACKENDS.items():
+        blocks, size, micros = make_unmake(chessboard_class, line)
+        print(f"{name:>8}: {blocks:6.2f} blocks/move  {size:8.1f} bytes/move  {micros:6.2f} us per make/unmake")
+
+        # regression check: a move that copies objects into its undo record again goes over the limit
+        max_blocks, max_size = ALLOCATION_LIMITS
+        assert blocks <= max_blocks and size <= max_size, f"{name} keeps more memory alive per move than {ALLOCATION_LIMITS}"
+
+
+def backends(args):
+    # perft.py measures the move generation alone, the search also evaluates, orders and looks up positions
+    print(f"iterative deepening to depth {args.depth} on the position suite")
+
+    for engine in ("minimax", "negamax"):
+        for name, chessboard_class in BACKENDS.items():
+            nodes = 0
+            elapsed = 0.0
+
+            for seed, plies in POSITION_SUITE:
+                chess = suite_position(chessboard_class, seed, plies)
+                stats = SearchStats()
+
+                if engine == "minimax":
+                    iterative_deepening(chess, 1 - chess.turn, max_depth=args.depth, stats=stats)
+                else:
+                    search.iterative_deepening(chess, chess.turn, max_depth=args.depth, stats=stats)
+
+                nodes += stats.nodes + stats.quiescence_nodes
+                elapsed += stats.elapsed
+
+            print(f"{engine:>7} {name:>8}: {nodes:8} nodes  {elapsed:6.2f}s  {nodes / elapsed:8.0f} nodes/s")
+
+
+def suite_position(chessboard_class, seed, plies):
+    """Sets up a position of the fixed suite
+
+    Args:
+        chessboard_class (class): Chessboard or Bitboard
+        seed (int): seed of the random line
+        plies (int): number of moves of the random line
+
+    Returns:
+        object: the chessboard with the line played
+    """
+    chess = chessboard_class()
+
+    for move in random_line(chessboard_class, plies, seed):
+        chess.move_and_special_moves(*move)
+
+    return chess
+
+
+def ordering(args):
+    chessboard_class = BACKENDS[args.backend]
+    totals = {"scan order": [0, 0.0], "ordered": [0, 0.0]}
+
+    print(f"depth {args.depth}, {args.backend}")
+
+    for seed, plies in POSITION_SUITE:
+        chess = suite_position(chessboard_class, seed, plies)
+
+        # the AI is the side to move
+        player_colour = 1 - chess.turn
+        results = []
+
+        for name, move_ordering in (("scan order", None), ("ordered", MoveOrdering())):
+            stats = SearchStats()
+
+            time_before = time.perf_counter()
+            best_moves = minimax(chess, args.depth, player_colour,
+                                 ordering=move_ordering, stats=stats)
+            elapsed = time.perf_counter() - time_before
+
+            totals[name][0] += stats.nodes
+            totals[name][1] += elapsed
+            results.append(sorted(best_moves))
+
+            print(f"  position {seed} ({plies} plies) {name:>10}: {stats.nodes:7} nodes  {stats.cutoffs:6} cutoffs  "
+                  f"{stats.first_move_cutoff_rate:6.1%} on the first move  {elapsed:6.2f}s")
+
+        # ordering only changes how much of the tree is searched, not the result
+        assert results[0] == results[1], "ordering changed the best moves"
+
+    for name, (nodes, elapsed) in totals.items():
+        print(f"{name:>10}: {nodes:8} nodes  {elapsed:6.2f}s")
+
+
+def cutoff_generation(chessboard_class):
+    """Searches a node of the starting position that is cut off by its first move and counts the
+    calls to get_legal_moves. The first move is only as good as beta, so none of the other pieces
+    should have their legal moves generated.
+
+    Args:
+        chessboard_class (class): Chessboard or Bitboard
+
+    Returns:
+        int: number of calls to get_legal_moves
+    """
+    chess = chessboard_class()
+    stats = SearchStats()
+
+    # every move of the starting position evaluates to 0, so a window of (0, 0) cuts off after the first
+    minimise(chess, 1, 0, 0, 0, stats=stats)
+
+    assert stats.cutoffs == 1
+
+    return stats.legal_move_calls
+
+
+def generation(args):
+    # regression check: a cutoff leaves the whole node instead of only the current piece's moves
+    for name, chessboard_class in BACKENDS.items():
+        calls = cutoff_generation(chessboard_class)
+        print(f"{name:>8}: {calls} get_legal_moves call(s) for a node cut off by its first move (16 pieces)")
+        assert calls == 1, "the cutoff did not leave the node"
+
+    chessboard_class = BACKENDS[args.backend]
+
+    print(f"depth {args.depth}, {args.backend}")
+
+    for seed, plies in POSITION_SUITE:
+        chess = suite_position(chessboard_class, seed, plies)
+        stats = SearchStats()
+
+        minimax(chess, args.depth, 1 - chess.turn,
+                ordering=MoveOrdering(), stats=stats)
+
+        print(f"  position {seed} ({plies} plies): {stats.nodes:7} nodes  {stats.legal_move_calls:7} get_legal_moves calls  "
+              f"{stats.legal_move_calls / stats.nodes:5.2f} per node")
+
+
+def quiescence(args):
+    chessboard_class = BACKENDS[args.backend]
+    # (name, depth, quiescence): the quiescence search is compared against searching one more ply instead
+    searches = [("static", args.depth, False),
+                ("quiescence", args.depth, True),
+                ("one more ply", args.depth + 1, False)]
+    totals = {name: [0, 0, 0.0] for name, _, _ in searches}
+
+    print(f"depth {args.depth}, {args.backend}")
+
+    for seed, plies in POSITION_SUITE:
+        chess = suite_position(chessboard_class, seed, plies)
+
+        for name, depth, use_quiescence in searches:
+            stats = SearchStats()
+
+            time_before = time.perf_counter()
+            minimax(chess, depth, 1 - chess.turn, ordering=MoveOrdering(),
+                    stats=stats, quiescence=use_quiescence)
+            elapsed = time.perf_counter() - time_before
+
+            totals[name][0] += stats.nodes
+            totals[name][1] += stats.quiescence_nodes
+            totals[name][2] += elapsed
+
+            print(f"  position {seed} ({plies} plies) {name:>12}: {stats.nodes:7} nodes  "
+                  f"{stats.quiescence_nodes:7} quiescence nodes  {elapsed:6.2f}s")
+
+    static_nodes, _, static_time = totals["static"]
+
+    for name, (nodes, quiescence_nodes, elapsed) in totals.items():
+        print(f"{name:>12}: {nodes + quiescence_nodes:8} nodes ({quiescence_nodes} quiescence)  {elapsed:6.2f}s  "
+              f"node overhead {(nodes + quiescence_nodes) / static_nodes - 1:7.1%}  time overhead {elapsed / static_time - 1:7.1%}")
+
+
+def engines(args):
+    chessboard_class = BACKENDS[args.backend]
+    totals = {"minimax": [0, 0.0], "negamax": [0, 0.0]}
+
+    print(f"depth {args.depth}, {args.backend}")
+
+    for seed, plies in POSITION_SUITE:
+        chess = suite_position(chessboard_class, seed, plies)
+        colour = chess.turn
+        scores = {}
+
+        for name in totals:
+            stats = SearchStats()
+            table = TranspositionTable(args.table_mb)
+            table.new_search()
+
+            time_before = time.perf_counter()
+
+            if name == "minimax":
+                # the AI is the side to move, the player is the other colour
+                scores[name] = maximise(chess, args.depth, -math.inf, math.inf, 1 - colour, False,
+                                        table, None, MoveOrdering(), stats, True)
+            else:
+                _, scores[name], pv = search.search(chess, args.depth, colour, table=table,
+                                                    ordering=MoveOrdering(), stats=stats)
+
+            elapsed = time.perf_counter() - time_before
+
+            totals[name][0] += stats.nodes + stats.quiescence_nodes
+            totals[name][1] += elapsed
+
+            print(f"  position {seed} ({plies} plies) {name:>7}: {stats.nodes + stats.quiescence_nodes:7} nodes  "
+                  f"{elapsed:6.2f}s  score {scores[name]}")
+
+        print(f"    principal variation: {' '.join(chess.coord_to_notation(coord) + chess.coord_to_notation(move[0]) for coord, move in pv)}")
+
+        # both engines search the same tree, so they must agree on the score
+        assert scores["minimax"] == scores["negamax"], "the engines disagree"
+
+    for name, (nodes, elapsed) in totals.items():
+        print(f"{name:>7}: {nodes:8} nodes  {elapsed:6.2f}s")
+
+    # the game searches with iterative deepening, where negamax also uses aspiration windows
+    print(f"iterative deepening to depth {args.depth}")
+
+    for name in totals:
+        nodes = 0
+        elapsed = 0.0
+        searches = 0
+        researches = 0
+
+        for seed, plies in POSITION_SUITE:
+            chess = suite_position(chessboard_class, seed, plies)
+            stats = SearchStats()
+
+            time_before = time.perf_counter()
+
+            if name == "minimax":
+                iterative_deepening(chess, 1 - chess.turn,
+                                    max_depth=args.depth, stats=stats)
+            else:
+                search.iterative_deepening(
+                    chess, chess.turn, max_depth=args.depth, stats=stats)
+
+            elapsed += time.perf_counter() - time_before
+            nodes += stats.nodes + stats.quiescence_nodes
+            searches += stats.aspiration_searches
+            researches += stats.aspiration_researches
+
+        print(f"{name:>7}: {nodes:8} nodes  {elapsed:6.2f}s"
+              + (f"  aspiration re-searches {researches}/{searches}" if searches else ""))
+
+
+def pruning(args):
+    chessboard_class = BACKENDS[args.backend]
+
+    # (name, null move pruning, late move reductions)
+    searches = [("full width", False, False),
+                ("null move", True, False),
+                ("reductions", False, True),
+                ("both", True, True)]
+    totals = {name: [0, 0.0, 0] for name, _, _ in searches}
+
+    print(f"negamax iterative deepening to depth {args.depth}, {args.backend}")
+
+    for seed, plies in POSITION_SUITE:
+        chess = suite_position(chessboard_class, seed, plies)
+        full_width_move = None
+
+        for name, null_move, reductions in searches:
+            stats = SearchStats()
+
+            time_before = time.perf_counter()
+            best_move, score, _ = search.iterative_deepening(chess, chess.turn, max_depth=args.depth, stats=stats,
+                                                             null_move=null_move, reductions=reductions)
+            elapsed = time.perf_counter() - time_before
+
+            if full_width_move is None:
+                full_width_move = best_move
+
+            same_move = best_move == full_width_move
+
+            totals[name][0] += stats.nodes + stats.quiescence_nodes
+            totals[name][1] += elapsed
+            totals[name][2] += same_move
+
+            print(f"  position {seed} ({plies} plies) {name:>10}: {stats.nodes + stats.quiescence_nodes:7} nodes  {elapsed:6.2f}s  "
+                  f"score {score:4}  {'same move' if same_move else 'different move'}")
+
+    full_width_nodes, full_width_time, _ = totals["full width"]
+
+    for name, (nodes, elapsed, same_moves) in totals.items():
+        print(f"{name:>10}: {nodes:8} nodes ({nodes / full_width_nodes:6.1%})  {elapsed:6.2f}s ({elapsed / full_width_time:6.1%})  "
+              f"same move as full width in {same_moves}/{len(POSITION_SUITE)} positions")
+
+
+def aspiration(args):
+    chessboard_class = BACKENDS[args.backend]
+    default_window = search.ASPIRATION_WINDOW
+
+    print(f"negamax iterative deepening to depth {args.depth}, {args.backend}, default window {default_window}")
+
+    for window in args.windows:
+        # the window is read by every aspiration search, so it is swapped for the run
+        search.ASPIRATION_WINDOW = window
+        stats = SearchStats()
+
+        time_before = time.perf_counter()
+
+        for seed, plies in POSITION_SUITE:
+            chess = suite_position(chessboard_class, seed, plies)
+            search.iterative_deepening(chess, chess.turn, max_depth=args.depth, stats=stats,
+                                       null_move=True, reductions=True)
+
+        elapsed = time.perf_counter() - time_before
+
+        print(f"  window {window:3}: re-searched {stats.aspiration_researches:3}/{stats.aspiration_searches} depths "
+              f"({stats.aspiration_research_rate:6.1%})  {stats.nodes + stats.quiescence_nodes:8} nodes  {elapsed:6.2f}s")
+
+    search.ASPIRATION_WINDOW = default_window
+
+
+def parallel(args):
+    chessboard_class = BACKENDS[args.backend]
+    positions = [suite_position(chessboard_class, seed, plies)
+                 for seed, plies in POSITION_SUITE]
+
+    print(f"depth {args.depth}, {args.backend}")
+
+    time_before = time.perf_counter()
+    expected = [sorted(minimax(chess, args.depth, 1 - chess.turn, ordering=MoveOrdering(), quiescence=True))
+                for chess in positions]
+    sequential_time = time.perf_counter() - time_before
+
+    print(f"  sequential: {sequential_time:6.2f}s")
+
+    for workers in args.workers:
+        # starts the worker processes before timing
+        for chess in positions:
+            minimax(chess, 1, 1 - chess.turn, workers=workers)
+
+        time_before = time.perf_counter()
+        best_moves = [sorted(minimax(chess, args.depth, 1 - chess.turn, quiescence=True, workers=workers))
+                      for chess in positions]
+        elapsed = time.perf_counter() - time_before
+
+        # splitting the root moves only changes how fast the search is
+        assert best_moves == expected, "the root split search found different moves"
+
+        print(f"  {workers} worker(s): {elapsed:6.2f}s  speedup {sequential_time / elapsed:5.2f}x")
+
+    shutdown_pools()
+
+
+def smp(args):
+    chessboard_class = BACKENDS[args.backend]
+    positions = [suite_position(chessboard_class, seed, plies)
+                 for seed, plies in POSITION_SUITE]
+
+    def best_moves_of(chess, depth, workers, stats=None):
+        if args.engine == "negamax":
+            # the negamax engine is searched the way the game does, with iterative deepening
+            best_move, _, _ = search.iterative_deepening(chess, chess.turn, max_depth=depth, stats=stats,
+                                                         workers=workers)
+            return [best_move]
+
+        return sorted(minimax(chess, depth, 1 - chess.turn, ordering=MoveOrdering(), stats=stats,
+                              quiescence=True, workers=workers, lazy_smp=True))
+
+    print(f"depth {args.depth}, {args.backend}, {args.engine}")
+
+    expected = None
+
+    for workers in args.workers:
+        # starts the helper processes before timing, and starts every run with an empty shared table
+        for chess in positions:
+            best_moves_of(chess, 2, workers)
+
+        get_shared_table().clear()
+
+        stats = SearchStats()
+        time_before = time.perf_counter()
+        best_moves = [best_moves_of(chess, args.depth, workers, stats) for chess in positions]
+        elapsed = time.perf_counter() - time_before
+
+        if expected is None:
+            expected = best_moves
+            sequential_time = elapsed
+
+        # the helpers' deeper results can change the scores the main search finds, so the moves are compared, not asserted
+        same_moves = sum(moves == expected_moves
+                         for moves, expected_moves in zip(best_moves, expected))
+
+        print(f"  {workers} worker(s): {elapsed:6.2f}s  speedup {sequential_time / elapsed:5.2f}x  "
+              f"main search nodes {stats.nodes:7}  same moves as 1 worker in {same_moves}/{len(POSITION_SUITE)} positions")
+
+    shutdown_pools()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    parser_allocations = subparsers.add_parser(
+        "allocations", help="memory kept alive per move and make/unmake time")
+    parser_allocations.add_argument("--plies", type=int, default=80)
+    parser_allocations.set_defaults(run=allocations)
+
+    parser_backends = subparsers.add_parser(
+        "backends", help="search speed of each chessboard implementation on the position suite")
+    parser_backends.add_argument("--depth", type=int, default=3)
+    parser_backends.set_defaults(run=backends)
+
+    parser_ordering = subparsers.add_parser(
+        "ordering", help="nodes searched with and without move ordering on a fixed position suite")
+    parser_ordering.add_argument("--depth", type=int, default=3)
+    parser_ordering.add_argument(
+        "--backend", choices=BACKENDS, default="bitboard")
+    parser_ordering.set_defaults(run=ordering)
+
+    parser_generation = subparsers.add_parser(
+        "generation", help="calls to get_legal_moves, checking that a cutoff leaves the whole node")
+    parser_generation.add_argument("--depth", type=int, default=3)
+    parser_generation.add_argument(
+        "--backend", choices=BACKENDS, default="bitboard")
+    parser_generation.set_defaults(run=generation)
+
+    parser_quiescence = subparsers.add_parser(
+        "quiescence", help="node and time overhead of the quiescence search on the position suite, against one more ply")
+    parser_quiescence.add_argument("--depth", type=int, default=3)
+    parser_quiescence.add_argument(
+        "--backend", choices=BACKENDS, default="bitboard")
+    parser_quiescence.set_defaults(run=quiescence)
+
+    parser_engines = subparsers.add_parser(
+        "engines", help="minimax against the negamax principal variation search on the position suite")
+    parser_engines.add_argument("--depth", type=int, default=3)
+    parser_engines.add_argument(
+        "--backend", choices=BACKENDS, default="bitboard")
+    parser_engines.add_argument("--table-mb", type=float, default=1)
+    parser_engines.set_defaults(run=engines)
+
+    parser_pruning = subparsers.add_parser(
+        "pruning", help="null move pruning and late move reductions against the full width negamax search")
+    parser_pruning.add_argument("--depth", type=int, default=4)
+    parser_pruning.add_argument(
+        "--backend", choices=BACKENDS, default="bitboard")
+    parser_pruning.set_defaults(run=pruning)
+
+    parser_aspiration = subparsers.add_parser(
+        "aspiration", help="aspiration window re-search rate and nodes by window size")
+    parser_aspiration.add_argument("--depth", type=int, default=5)
+    parser_aspiration.add_argument(
+        "--windows", type=int, nargs="+", default=[1, 2, 3, 5])
+    parser_aspiration.add_argument(
+        "--backend", choices=BACKENDS, default="bitboard")
+    parser_aspiration.set_defaults(run=aspiration)
+
+    parser_parallel = subparsers.add_parser(
+        "parallel", help="scaling of the root split search with the number of worker processes")
+    parser_parallel.add_argument("--depth", type=int, default=3)
+    parser_parallel.add_argument(
+        "--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser_parallel.add_argument(
+        "--backend", choices=BACKENDS, default="bitboard")
+    parser_parallel.set_defaults(run=parallel)
+
+    parser_smp = subparsers.add_parser(
+        "smp", help="lazy SMP search with a shared transposition table by number of worker processes")
+    parser_smp.add_argument("--depth", type=int, default=3)
+    parser_smp.add_argument(
+        "--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser_smp.add_argument(
+        "--backend", choices=BACKENDS, default="bitboard")
+    parser_smp.add_argument(
+        "--engine", choices=["minimax", "negamax"], default="minimax")
+    parser_smp.set_defaults(run=smp)
+
+    arguments = parser.parse_args()
+    arguments.run(arguments)
@@ -0,0 +1,993 @@
+from array import array
+
+from board import Board
+from evaluation import PIECE_SQUARE_VALUES, material_balance
+from pieces import Bishop, King, Knight, Pawn, Queen, Rook
+from zobrist import BLACK_TO_MOVE_KEY, CASTLING_KEYS, CASTLING_RIGHTS_LOST, EN_PASSANT_KEYS, PIECE_KEYS, castling_rights
+
+# Piece type indices used to index the bitboards of each colour
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+
+# Colour encoding matches the Piece class (0 = white, 1 = black)
+WHITE, BLACK = 0, 1
+
+# Every square index (0 to 63) is y * 8 + x of its tuple coordinate, so index 0 is a8 and index 63 is h1
+SQUARE_COORDS = [(sq % 8, sq // 8) for sq in range(64)]
+
+ALL_SQUARES = (1 << 64) - 1
+
+# Directions a sliding piece can move in, as (x, y) translations
+STRAIGHT_DIRECTIONS = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+DIAGONAL_DIRECTIONS = [(1, 1), (1, -1), (-1, 1), (-1, -1)]
+
+
+def _piece_views(already_moved):
+    """Builds a piece object of every colour and piece type, indexed by piece code (colour * 6 + piece type)
+
+    Args:
+        already_moved (bool): the already_moved attribute of the pieces
+
+    Returns:
+        list of object: instances of the Piece subclasses
+    """
+    pieces = []
+
+    for colour in (WHITE, BLACK):
+        for piece_class in (Pawn, Knight, Bishop, Rook, Queen, King):
+            piece = piece_class(colour)
+            piece.already_moved = already_moved
+            pieces.append(piece)
+
+    return pieces
+
+
+# The piece objects get_square returns, indexed by [whether the piece has not moved][piece code]. The Bitboard keeps
+# its pieces as bits, so these only describe a square and are shared: they must not be changed.
+PIECE_VIEWS = [_piece_views(True), _piece_views(False)]
+
+# (end coord, special move) of a move to every square, by special move type, so generating a move creates no tuple
+MOVE_PAIRS = {special_move: [(coord, special_move) for coord in SQUARE_COORDS]
+              for special_move in (None, 1, 2, 3, 4, 5)}
+
+
+def _on_board(x, y):
+    return 0 <= x <= 7 and 0 <= y <= 7
+
+
+def _leaper_attacks(translations):
+    """Builds an attack table for a piece that jumps by a fixed set of translations
+
+    Args:
+        translations (list of tuple): (x, y) translations the piece can jump by
+
+    Returns:
+        list of int: bitboard of the attacked squares for each of the 64 squares
+    """
+    table = []
+
+    for x, y in SQUARE_COORDS:
+        attacks = 0
+
+        for dx, dy in translations:
+            if _on_board(x + dx, y + dy):
+                attacks |= 1 << ((y + dy) * 8 + x + dx)
+
+        table.append(attacks)
+
+    return table
+
+
+def _line_attacks(directions):
+    """Builds the attack tables of a sliding piece along a line through every square, such as the rank or a diagonal.
+    Only the squares of the line between the piece and the edges of the board can block it, so each square has one
+    entry for every way those squares can be occupied.
+
+    Args:
+        directions (list of tuple): the (x, y) translations of one step along the two halves of the line
+
+    Returns:
+        tuple: (list of int: bitboard of the squares that can block, list of dict: bitboard of the attacked squares
+            by the bitboard of the blocking squares that are occupied), for each of the 64 squares
+    """
+    blocker_masks = []
+    tables = []
+
+    for x, y in SQUARE_COORDS:
+        rays = []
+
+        for dx, dy in directions:
+            ray = []
+            ray_x, ray_y = x + dx, y + dy
+
+            while _on_board(ray_x, ray_y):
+                ray.append(ray_y * 8 + ray_x)
+                ray_x += dx
+                ray_y += dy
+
+            rays.append(ray)
+
+        # the last square of a ray is attacked whether it is occupied or not
+        blocker_mask = 0
+        for ray in rays:
+            for sq in ray[:-1]:
+                blocker_mask |= 1 << sq
+
+        table = {}
+        blockers = 0
+
+        # goes through every subset of the blocker mask
+        while True:
+            attacks = 0
+
+            for ray in rays:
+                for sq in ray:
+                    attacks |= 1 << sq
+
+                    if (blockers >> sq) & 1:
+                        break
+
+            table[blockers] = attacks
+            blockers = (blockers - blocker_mask) & blocker_mask
+
+            if not blockers:
+                break
+
+        blocker_masks.append(blocker_mask)
+        tables.append(table)
+
+    return blocker_masks, tables
+
+
+def _between():
+    """Builds the table of the squares strictly between two squares on the same line
+
+    Returns:
+        list of list of int: bitboard of the squares between, indexed by [square][square], 0 if the squares are not
+            on the same rank, file or diagonal
+    """
+    table = [[0] * 64 for _ in range(64)]
+
+    for sq, (x, y) in enumerate(SQUARE_COORDS):
+        for dx, dy in STRAIGHT_DIRECTIONS + DIAGONAL_DIRECTIONS:
+            between = 0
+            ray_x, ray_y = x + dx, y + dy
+
+            while _on_board(ray_x, ray_y):
+                table[sq][ray_y * 8 + ray_x] = between
+                between |= 1 << (ray_y * 8 + ray_x)
+                ray_x += dx
+                ray_y += dy
+
+    return table
+
+
+KNIGHT_ATTACKS = _leaper_attacks(
+    [(1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)])
+
+KING_ATTACKS = _leaper_attacks(
+    [(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)])
+
+# White pawns move towards y = 0 and black pawns towards y = 7
+PAWN_ATTACKS = [_leaper_attacks([(-1, -1), (1, -1)]),
+                _leaper_attacks([(-1, 1), (1, 1)])]
+
+RANK_BLOCKERS, RANK_ATTACKS = _line_attacks([(1, 0), (-1, 0)])
+FILE_BLOCKERS, FILE_ATTACKS = _line_attacks([(0, 1), (0, -1)])
+DIAGONAL_BLOCKERS, DIAGONAL_ATTACKS = _line_attacks([(1, 1), (-1, -1)])
+ANTI_DIAGONAL_BLOCKERS, ANTI_DIAGONAL_ATTACKS = _line_attacks([(1, -1), (-1, 1)])
+
+BETWEEN = _between()
+
+
+def bishop_attacks(sq, occupied):
+    """Gets the squares a bishop attacks, stopping each ray at the first occupied square
+
+    Args:
+        sq (int): square index of the bishop
+        occupied (int): bitboard of every occupied square
+
+    Returns:
+        int: bitboard of the attacked squares, including the blocking squares
+    """
+    return DIAGONAL_ATTACKS[sq][occupied & DIAGONAL_BLOCKERS[sq]] \
+        | ANTI_DIAGONAL_ATTACKS[sq][occupied & ANTI_DIAGONAL_BLOCKERS[sq]]
+
+
+def rook_attacks(sq, occupied):
+    """Gets the squares a rook attacks, stopping each ray at the first occupied square
+
+    Args:
+        sq (int): square index of the rook
+        occupied (int): bitboard of every occupied square
+
+    Returns:
+        int: bitboard of the attacked squares, including the blocking squares
+    """
+    return RANK_ATTACKS[sq][occupied & RANK_BLOCKERS[sq]] | FILE_ATTACKS[sq][occupied & FILE_BLOCKERS[sq]]
+
+
+def iterate_bits(bitboard):
+    """Yields the square index of every set bit in a bitboard
+
+    Args:
+        bitboard (int): the bitboard
+
+    Yields:
+        int: square index
+    """
+    while bitboard:
+        lowest_bit = bitboard & -bitboard
+        yield lowest_bit.bit_length() - 1
+        bitboard ^= lowest_bit
+
+
+class Bitboard(Board):
+    """Stores the position of a chessboard as one 64-bit integer per piece type and colour.
+    It provides the same interface as the Chessboard class so it can be used in its place.
+    """
+
+    UNDO_RECORD_SIZE = 9
+
+    def __init__(self):
+        # bitboards[colour][piece type]
+        self.bitboards = [[0] * 6, [0] * 6]
+        # all the squares occupied by each colour
+        self.occupancy = [0, 0]
+        # piece code on every square, None if the square is empty
+        self.squares = [None] * 64
+
+        back_row = [ROOK, KNIGHT, BISHOP, QUEEN, KING, BISHOP, KNIGHT, ROOK]
+
+        for x, piece_type in enumerate(back_row):
+            self.put_piece(x, BLACK, piece_type)
+            self.put_piece(8 + x, BLACK, PAWN)
+            self.put_piece(48 + x, WHITE, PAWN)
+            self.put_piece(56 + x, WHITE, piece_type)
+
+        # squares whose pieces have not moved yet during the game (the already_moved attribute of the Piece class)
+        self.unmoved = self.occupancy[WHITE] | self.occupancy[BLACK]
+
+        # undo records of the moves made: [start square, end square, special move, captured piece code,
+        # captured square, promoted, castling rights before the move, file of a pawn double step, turn before the move]
+        self.clear_history()
+
+        # colour of the side to move
+        self.turn = WHITE
+
+        # (colour, checkers, check mask, pins) of the current position, see pins_and_checks
+        self.move_masks = None
+
+        # castling right bits of the zobrist module
+        self.castling_rights = castling_rights(self.is_unmoved)
+
+        # 64-bit hash of the position, updated on every move and undo
+        self.zobrist_key = self.compute_zobrist_key()
+
+        # white's material minus black's, updated on every move and undo so the AI can evaluate a position in constant time
+        self.material = self.compute_material()
+
+        # number of pieces on the board, kings included, so the search can tell when the tablebase covers the position
+        self.piece_count = bin(self.occupancy[WHITE] | self.occupancy[BLACK]).count("1")
+
+        # packed position the chessboard was set up with by set_position, None for the initial layout
+        self.start_position = None
+        # number of undo records set_position made to set up the position, which are not moves played
+        self.setup_plies = 0
+        # number of moves played before the first undo record, for the fullmove number of a FEN string
+        self.first_ply = 0
+
+    def clear_history(self):
+        """Forgets the moves played
+        """
+        super().clear_history()
+
+        # the unmoved bitboard before each move by ply
+        self.unmoved_stack = array("Q")
+
+    def push_undo_record(self):
+        """Gets the next undo record from the history and marks it as in use, saving the zobrist key, the material
+        and the unmoved bitboard of the position
+
+        Returns:
+            list: the undo record to fill in
+        """
+        if self.ply == len(self.unmoved_stack):
+            self.unmoved_stack.append(0)
+
+        self.unmoved_stack[self.ply] = self.unmoved
+
+        return super().push_undo_record()
+
+    def put_piece(self, sq, colour, piece_type):
+        bit = 1 << sq
+        self.bitboards[colour][piece_type] |= bit
+        self.occupancy[colour] |= bit
+        self.squares[sq] = colour * 6 + piece_type
+
+    def remove_piece(self, sq):
+        code = self.squares[sq]
+        colour, piece_type = divmod(code, 6)
+        bit = 1 << sq
+        self.bitboards[colour][piece_type] ^= bit
+        self.occupancy[colour] ^= bit
+        self.squares[sq] = None
+
+        return code
+
+    def move_piece(self, start_sq, end_sq):
+        code = self.squares[start_sq]
+        colour, piece_type = divmod(code, 6)
+        bits = (1 << start_sq) | (1 << end_sq)
+        self.bitboards[colour][piece_type] ^= bits
+        self.occupancy[colour] ^= bits
+        self.squares[start_sq] = None
+        self.squares[end_sq] = code
+
+    def get_square(self, coord):
+        """Gets the element of the chessboad with the specific coordinate
+
+        Args:
+            coord (tuple of (int, int)): tuple containing two numbers representing the x and the y value respectively.
+
+        Returns:
+            int/object: 0 representing an empty square or an instance of a Piece subclass if the square contains a piece.
+        """
+        sq = coord[1] * 8 + coord[0]
+        code = self.squares[sq]
+
+        if code is None:
+            return 0
+
+        return PIECE_VIEWS[(self.unmoved >> sq) & 1][code]
+
+    @property
+    def chessboard(self):
+        """8x8 list of the squares in the same layout as Chessboard.chessboard"""
+        return [[self.get_square((x, y)) for x in range(8)] for y in range(8)]
+
+    def king_square(self, colour):
+        return self.bitboards[colour][KING].bit_length() - 1
+
+    def is_square_attacked(self, sq, by_colour, occupied=None, ignored=0):
+        """Checks whether any piece of by_colour attacks the square by looking outwards from the square
+
+        Args:
+            sq (int): square index
+            by_colour (int): colour of the attacking side
+            occupied (int, optional): bitboard of occupied squares to use. Defaults to the current occupancy.
+            ignored (int, optional): bitboard of attacking pieces to ignore, e.g. a piece that would be captured.
+
+        Returns:
+            bool: whether the square is attacked
+        """
+        if occupied is None:
+            occupied = self.occupancy[WHITE] | self.occupancy[BLACK]
+
+        attackers = self.bitboards[by_colour]
+        not_ignored = ~ignored
+
+        # a pawn of by_colour attacks sq if a pawn of the other colour on sq would attack it
+        if PAWN_ATTACKS[1 - by_colour][sq] & attackers[PAWN] & not_ignored:
+            return True
+
+        if KNIGHT_ATTACKS[sq] & attackers[KNIGHT] & not_ignored:
+            return True
+
+        if KING_ATTACKS[sq] & attackers[KING]:
+            return True
+
+        straight = (attackers[ROOK] | attackers[QUEEN]) & not_ignored
+        if straight and rook_attacks(sq, occupied) & straight:
+            return True
+
+        diagonal = (attackers[BISHOP] | attackers[QUEEN]) & not_ignored
+        if diagonal and bishop_attacks(sq, occupied) & diagonal:
+            return True
+
+        return False
+
+    def enpassant_target(self):
+        """Gets the square a pawn can capture en passant on, if the last move was a pawn double step
+
+        Returns:
+            NoneType/int: square index behind the pawn that double stepped
+        """
+        if self.ply:
+            record = self.history[self.ply - 1]
+
+            if record[7] is not None:
+                return (record[0] + record[1]) // 2
+
+        return None
+
+    def pins_and_checks(self, colour):
+        """Finds the pieces giving check to the king of a colour and the pieces pinned to it, which tells the squares
+        the other pieces of the colour can move to without leaving the king in check. Kept until the next move or undo.
+
+        Args:
+            colour (int): colour of the king
+
+        Returns:
+            tuple: (colour, bitboard of the pieces giving check, bitboard of the squares a piece other than the king
+                can move to: every square, the squares that block or capture the only piece giving check or none,
+                dictionary of the bitboard of the squares a pinned piece can move to by its square index)
+        """
+        masks = self.move_masks
+
+        if masks is not None and masks[0] == colour:
+            return masks
+
+        own = self.occupancy[colour]
+        enemy_occupancy = self.occupancy[1 - colour]
+        attackers = self.bitboards[1 - colour]
+        king_sq = self.bitboards[colour][KING].bit_length() - 1
+        between_king = BETWEEN[king_sq]
+
+        checkers = (PAWN_ATTACKS[colour][king_sq] & attackers[PAWN]) | (KNIGHT_ATTACKS[king_sq] & attackers[KNIGHT])
+        pins = {}
+
+        # the nearest enemy piece on every line from the king, seen through the king's own pieces. A sliding piece
+        # gives check if none of them are in between and pins the piece if only one is
+        sliders = (rook_attacks(king_sq, enemy_occupancy) & (attackers[ROOK] | attackers[QUEEN])) \
+            | (bishop_attacks(king_sq, enemy_occupancy) & (attackers[BISHOP] | attackers[QUEEN]))
+
+        while sliders:
+            slider = sliders & -sliders
+            sliders ^= slider
+            line = between_king[slider.bit_length() - 1]
+            blockers = line & own
+
+            if not blockers:
+                checkers |= slider
+            elif not blockers & (blockers - 1):
+                pins[blockers.bit_length() - 1] = line | slider
+
+        if not checkers:
+            check_mask = ALL_SQUARES
+        elif checkers & (checkers - 1):
+            # only the king can get out of a double check
+            check_mask = 0
+        else:
+            check_mask = checkers | between_king[checkers.bit_length() - 1]
+
+        masks = self.move_masks = (colour, checkers, check_mask, pins)
+
+        return masks
+
+    def piece_moves(self, sq, code, masks, targets=ALL_SQUARES):
+        """Gets the legal moves of a piece
+
+        Args:
+            sq (int): square index of the piece
+            code (int): piece code of the piece, colour * 6 + piece type
+            masks (tuple): pins_and_checks of the piece's colour
+            targets (int, optional): bitboard of the squares to keep the moves to, en passant captures are always
+                kept and castling only with every square. Defaults to ALL_SQUARES.
+
+        Returns:
+            list of tuple: (end coord, special move) of each legal move
+        """
+        colour, piece_type = divmod(code, 6)
+        _, checkers, check_mask, pins = masks
+        own = self.occupancy[colour]
+        occupied = own | self.occupancy[1 - colour]
+
+        if piece_type == KING:
+            return self.king_moves(sq, colour, checkers, occupied, targets)
+
+        targets &= check_mask & ~own
+
+        if sq in pins:
+            targets &= pins[sq]
+
+        if piece_type == PAWN:
+            return self.pawn_moves(sq, colour, targets, occupied)
+
+        if piece_type == KNIGHT:
+            targets &= KNIGHT_ATTACKS[sq]
+            pairs = MOVE_PAIRS[1]
+        else:
+            if piece_type == BISHOP:
+                targets &= bishop_attacks(sq, occupied)
+            elif piece_type == ROOK:
+                targets &= rook_attacks(sq, occupied)
+            else:
+                targets &= bishop_attacks(sq, occupied) | rook_attacks(sq, occupied)
+
+            pairs = MOVE_PAIRS[None]
+
+        moves = []
+
+        while targets:
+            end_bit = targets & -targets
+            moves.append(pairs[end_bit.bit_length() - 1])
+            targets ^= end_bit
+
+        return moves
+
+    def pawn_moves(self, sq, colour, targets, occupied):
+        """Gets the legal moves of a pawn
+
+        Args:
+            sq (int): square index of the pawn
+            colour (int): colour of the pawn
+            targets (int): bitboard of the squares the pawn can move to without leaving its king in check
+            occupied (int): bitboard of every occupied square
+
+        Returns:
+            list of tuple: (end coord, special move) of each legal move
+        """
+        moves = []
+        step = -8 if colour == WHITE else 8
+        forward = sq + step
+
+        if not (occupied >> forward) & 1:
+            if (targets >> forward) & 1:
+                moves.append(MOVE_PAIRS[1][forward])
+
+            double_step = forward + step
+            if (self.unmoved >> sq) & 1 and 0 <= double_step < 64 and (targets >> double_step) & 1 \
+                    and not (occupied >> double_step) & 1:
+                moves.append(MOVE_PAIRS[2][double_step])
+
+        captures = PAWN_ATTACKS[colour][sq] & self.occupancy[1 - colour] & targets
+
+        while captures:
+            end_bit = captures & -captures
+            moves.append(MOVE_PAIRS[3][end_bit.bit_length() - 1])
+            captures ^= end_bit
+
+        target = self.enpassant_target()
+        # the pawn that double stepped must be an opponent's pawn next to this one
+        if target is not None and (PAWN_ATTACKS[colour][sq] >> target) & 1 \
+                and self.squares[target - step] == (1 - colour) * 6 + PAWN and self.is_en_passant_legal(sq, target):
+            moves.append(MOVE_PAIRS[5][target])
+
+        return moves
+
+    def king_moves(self, sq, colour, checkers, occupied, targets=ALL_SQUARES):
+        """Gets the legal moves of a king
+
+        Args:
+            sq (int): square index of the king
+            colour (int): colour of the king
+            checkers (int): bitboard of the pieces giving check
+            occupied (int): bitboard of every occupied square
+            targets (int, optional): bitboard of the squares to keep the moves to, castling is only kept with every
+                square. Defaults to ALL_SQUARES.
+
+        Returns:
+            list of tuple: (end coord, special move) of each legal move
+        """
+        enemy = 1 - colour
+        # a sliding piece giving check also attacks the squares behind the king
+        without_king = occupied ^ (1 << sq)
+        moves = []
+
+        ends = KING_ATTACKS[sq] & ~self.occupancy[colour] & targets
+
+        while ends:
+            end_bit = ends & -ends
+            ends ^= end_bit
+            end_sq = end_bit.bit_length() - 1
+
+            if not self.is_square_attacked(end_sq, enemy, without_king, end_bit):
+                moves.append(MOVE_PAIRS[1][end_sq])
+
+        # the king can not castle out of, through or into check
+        if targets == ALL_SQUARES and not checkers and (self.unmoved >> sq) & 1:
+            row = sq - sq % 8
+            rook = colour * 6 + ROOK
+
+            # queenside: squares b to d empty and the a rook unmoved
+            if not occupied & (0b1110 << row) and (self.unmoved >> row) & 1 and self.squares[row] == rook \
+                    and not self.is_square_attacked(sq - 1, enemy) and not self.is_square_attacked(sq - 2, enemy):
+                moves.append(MOVE_PAIRS[4][sq - 2])
+
+            # kingside: squares f and g empty and the h rook unmoved
+            if not occupied & (0b1100000 << row) and (self.unmoved >> (row + 7)) & 1 and self.squares[row + 7] == rook \
+                    and not self.is_square_attacked(sq + 1, enemy) and not self.is_square_attacked(sq + 2, enemy):
+                moves.append(MOVE_PAIRS[4][sq + 2])
+
+        return moves
+
+    def is_en_passant_legal(self, sq, end_sq):
+        """Checks that an en passant capture does not leave the player's king attacked. Two pawns leave the row at
+        once, which the pins of pins_and_checks do not cover.
+
+        Args:
+            sq (int): square index the pawn moves from
+            end_sq (int): square index the pawn moves to
+
+        Returns:
+            bool: whether the capture is legal
+        """
+        colour = self.squares[sq] // 6
+
+        # the captured pawn is on the square behind the end square
+        captured = 1 << (end_sq + (8 if colour == WHITE else -8))
+        occupied = ((self.occupancy[WHITE] | self.occupancy[BLACK]) & ~(1 << sq) & ~captured) | (1 << end_sq)
+
+        return not self.is_square_attacked(self.king_square(colour), 1 - colour, occupied, captured)
+
+    def get_legal_moves(self, start_coord):
+        """Returns all the legal moves a piece can make and takes into consideration
+            self discovered checks
+
+        Args:
+            start_coord (tuple of (int, int)): the coordinate the piece is moving from
+
+        Returns:
+            list of tuple: containing the legal coordinates the piece can move to and their special move type
+        """
+        sq = start_coord[1] * 8 + start_coord[0]
+        code = self.squares[sq]
+
+        if code is None:
+            return []
+
+        return self.piece_moves(sq, code, self.pins_and_checks(code // 6))
+
+    def get_legal_captures(self, start_coord):
+        """Returns the legal captures and promotions of a piece, leaving out the other moves before
+            they are generated
+
+        Args:
+            start_coord (tuple of (int, int)): the coordinate the piece is moving from
+
+        Returns:
+            list of tuple: containing the legal coordinates the piece can capture on or promote on and their special move type
+        """
+        sq = start_coord[1] * 8 + start_coord[0]
+        code = self.squares[sq]
+
+        if code is None:
+            return []
+
+        colour, piece_type = divmod(code, 6)
+        targets = self.occupancy[1 - colour]
+
+        # squares a pawn promotes on
+        if piece_type == PAWN:
+            targets |= 0xFF | (0xFF << 56)
+
+        return self.piece_moves(sq, code, self.pins_and_checks(colour), targets)
+
+    def legal_moves(self):
+        """Gets the legal moves of the side to move
+
+        Returns:
+            list of tuple: (start coord, (end coord, special move)) of each legal move, in board scan order
+        """
+        masks = self.pins_and_checks(self.turn)
+        squares = self.squares
+        pieces = self.occupancy[self.turn]
+        moves = []
+
+        while pieces:
+            bit = pieces & -pieces
+            pieces ^= bit
+            sq = bit.bit_length() - 1
+            coord = SQUARE_COORDS[sq]
+
+            moves.extend([(coord, move) for move in self.piece_moves(sq, squares[sq], masks)])
+
+        return moves
+
+    def moves_played(self):
+        """Gets the moves played from the starting position, or the position the chessboard was set up with, which is
+        enough to set up the same position on another chessboard
+
+        Returns:
+            list of tuple: (start coord, end coord, special move) of each move
+        """
+        return [(SQUARE_COORDS[record[0]], SQUARE_COORDS[record[1]], record[2])
+                for record in self.history[self.setup_plies:self.ply]]
+
+    def move_and_special_moves(self, start_coord, end_coord, special_move):
+        """Moves a piece to a different square and takes into consideration
+            special moves such as enpassant and castling
+
+        Args:
+            start_coord (tuple of (int, int)): tuple coordinate of the square that be moved
+            end_coord (tuple of (int, int)): tuple coordinate of the square the piece will move to
+            special_move (int): the special move type
+        """
+        start_sq = start_coord[1] * 8 + start_coord[0]
+        end_sq = end_coord[1] * 8 + end_coord[0]
+        colour, piece_type = divmod(self.squares[start_sq], 6)
+
+        captured_sq = end_sq
+        if special_move == 5:
+            captured_sq = end_sq + (8 if colour == WHITE else -8)
+
+        key = self.zobrist_key
+        piece_keys = PIECE_KEYS[colour]
+        material = self.material
+        piece_values = PIECE_SQUARE_VALUES[colour]
+
+        # remove the en passant file of the previous move from the key
+        if self.ply and self.history[self.ply - 1][7] is not None:
+            key ^= EN_PASSANT_KEYS[self.history[self.ply - 1][7]]
+
+        record = self.push_undo_record()
+
+        captured = None
+        if self.squares[captured_sq] is not None:
+            captured = self.remove_piece(captured_sq)
+            self.piece_count -= 1
+            key ^= PIECE_KEYS[1 - colour][captured % 6][captured_sq]
+            material -= PIECE_SQUARE_VALUES[1 - colour][captured % 6][captured_sq]
+
+        self.move_piece(start_sq, end_sq)
+        key ^= piece_keys[piece_type][start_sq] ^ piece_keys[piece_type][end_sq]
+        material += piece_values[piece_type][end_sq] - \
+            piece_values[piece_type][start_sq]
+
+        moved_bits = (1 << start_sq) | (1 << end_sq)
+
+        # only create a new unmoved bitboard if it changes
+        if self.unmoved & moved_bits:
+            self.unmoved &= ~moved_bits
+
+        if special_move == 4:
+            row = end_sq - end_sq % 8
+
+            if end_sq % 8 < 4:
+                rook_start_sq, rook_end_sq = row, end_sq + 1
+            else:
+                rook_start_sq, rook_end_sq = row + 7, end_sq - 1
+
+            self.move_piece(rook_start_sq, rook_end_sq)
+            self.unmoved &= ~(1 << rook_start_sq)
+            key ^= piece_keys[ROOK][rook_start_sq] ^ piece_keys[ROOK][rook_end_sq]
+            material += piece_values[ROOK][rook_end_sq] - \
+                piece_values[ROOK][rook_start_sq]
+
+        # promotion - promote the pawn to a Queen
+        promoted = piece_type == PAWN and (end_sq < 8 or end_sq >= 56)
+        if promoted:
+            self.remove_piece(end_sq)
+            self.put_piece(end_sq, colour, QUEEN)
+            key ^= piece_keys[PAWN][end_sq] ^ piece_keys[QUEEN][end_sq]
+            material += piece_values[QUEEN][end_sq] - \
+                piece_values[PAWN][end_sq]
+
+        # a pawn double step allows an en passant capture on the next move
+        double_step_file = None
+        if piece_type == PAWN and (end_sq - start_sq == 16 or start_sq - end_sq == 16):
+            double_step_file = end_sq % 8
+            key ^= EN_PASSANT_KEYS[double_step_file]
+
+        # moving a king or a rook, or capturing a rook, loses castling rights
+        previous_rights = self.castling_rights
+        rights = previous_rights & ~(
+            CASTLING_RIGHTS_LOST[start_sq] | CASTLING_RIGHTS_LOST[end_sq])
+        if rights != previous_rights:
+            key ^= CASTLING_KEYS[previous_rights] ^ CASTLING_KEYS[rights]
+            self.castling_rights = rights
+
+        previous_turn = self.turn
+        if previous_turn == colour:
+            self.turn = 1 - colour
+            key ^= BLACK_TO_MOVE_KEY
+
+        record[0] = start_sq
+        record[1] = end_sq
+        record[2] = special_move
+        record[3] = captured
+        record[4] = captured_sq
+        record[5] = promoted
+        record[6] = previous_rights
+        record[7] = double_step_file
+        record[8] = previous_turn
+
+        self.zobrist_key = key
+        self.material = material
+        self.move_masks = None
+
+    def undo_move(self):
+        """Undos the last move
+        """
+        start_sq, end_sq, special_move, captured, captured_sq, promoted, self.castling_rights, _, self.turn = self.pop_undo_record()
+
+        self.move_masks = None
+
+        # a null move has nothing to put back
+        if start_sq is None:
+            return
+
+        if promoted:
+            colour = self.remove_piece(end_sq) // 6
+            self.put_piece(end_sq, colour, PAWN)
+
+        self.move_piece(end_sq, start_sq)
+
+        if special_move == 4:
+            row = end_sq - end_sq % 8
+
+            if end_sq % 8 < 4:
+                self.move_piece(end_sq + 1, row)
+            else:
+                self.move_piece(end_sq - 1, row + 7)
+
+        if captured is not None:
+            self.put_piece(captured_sq, *divmod(captured, 6))
+            self.piece_count += 1
+
+        self.unmoved = self.unmoved_stack[self.ply]
+
+    def make_null_move(self):
+        """Passes the turn to the other side without moving a piece, for the null move pruning of the search.
+        It is undone with undo_move.
+        """
+        key = self.zobrist_key
+
+        # a null move ends the chance to capture en passant
+        if self.ply and self.history[self.ply - 1][7] is not None:
+            key ^= EN_PASSANT_KEYS[self.history[self.ply - 1][7]]
+
+        # the undo record of a null move has no start or end square
+        record = self.push_undo_record()
+        record[0:6] = (None,) * 6
+        record[6] = self.castling_rights
+        record[7] = None
+        record[8] = self.turn
+
+        self.move_masks = None
+        self.turn = 1 - self.turn
+        self.zobrist_key = key ^ BLACK_TO_MOVE_KEY
+
+    def is_in_check(self, colour):
+        """Checks whether the king of a colour is attacked
+
+        Args:
+            colour (int): colour of the king
+
+        Returns:
+            bool: whether the king is in check
+        """
+        return self.is_square_attacked(self.king_square(colour), 1 - colour)
+
+    def has_non_pawn_material(self, colour):
+        """Checks whether a colour has any pieces other than its king and pawns. Without them, passing
+        the turn could be better than every move (zugzwang), so the search does not try null moves.
+
+        Args:
+            colour (int): the colour of the pieces
+
+        Returns:
+            bool: whether the colour has a knight, bishop, rook or queen
+        """
+        pieces = self.bitboards[colour]
+
+        return (pieces[KNIGHT] | pieces[BISHOP] | pieces[ROOK] | pieces[QUEEN]) != 0
+
+    def is_unmoved(self, sq, colour, piece_type):
+        """Checks whether an unmoved piece of a colour and type is on a square
+
+        Args:
+            sq (int): square index
+            colour (int): colour of the piece
+            piece_type (int): piece type index
+
+        Returns:
+            bool: whether the piece is on the square and has not moved
+        """
+        return self.squares[sq] == colour * 6 + piece_type and (self.unmoved >> sq) & 1 == 1
+
+    def compute_zobrist_key(self):
+        """Computes the zobrist key of the position from scratch
+
+        Returns:
+            int: 64-bit hash of the pieces, castling rights, en passant file and side to move
+        """
+        key = 0
+
+        for sq, code in enumerate(self.squares):
+            if code is not None:
+                key ^= PIECE_KEYS[code // 6][code % 6][sq]
+
+        key ^= CASTLING_KEYS[castling_rights(self.is_unmoved)]
+
+        # en passant is possible on the next move if the last move was a pawn double step
+        if self.ply and self.history[self.ply - 1][0] is not None:
+            start_sq, end_sq = self.history[self.ply - 1][0:2]
+
+            if self.squares[end_sq] % 6 == PAWN and abs(end_sq - start_sq) == 16:
+                key ^= EN_PASSANT_KEYS[end_sq % 8]
+
+        if self.turn == BLACK:
+            key ^= BLACK_TO_MOVE_KEY
+
+        return key
+
+    def compute_material(self):
+        """Computes the material balance of the position from scratch
+
+        Returns:
+            int: material of white minus the material of black
+        """
+        return material_balance((code // 6, code % 6, sq) for sq, code in enumerate(self.squares) if code is not None)
+
+    def get_position(self):
+        """Gets the position in the form of the position module
+
+        Returns:
+            tuple: (pieces, turn, castling rights, en passant file), pieces being (colour, piece type, square index)
+        """
+        pieces = [(code // 6, code % 6, sq) for sq, code in enumerate(self.squares) if code is not None]
+        en_passant_file = self.history[self.ply - 1][7] if self.ply else None
+
+        return pieces, self.turn, self.castling_rights, en_passant_file
+
+    def place_pieces(self, pieces, unmoved):
+        """Empties the chessboard and puts pieces on it, for set_position
+
+        Args:
+            pieces (list of tuple): (colour, piece type, square index) of every piece
+            unmoved (set of int): square indices of the pieces that have not moved yet
+        """
+        self.bitboards = [[0] * 6, [0] * 6]
+        self.occupancy = [0, 0]
+        self.squares = [None] * 64
+
+        for colour, piece_type, sq in pieces:
+            self.put_piece(sq, colour, piece_type)
+
+        self.unmoved = 0
+        for sq in unmoved:
+            self.unmoved |= 1 << sq
+
+        self.move_masks = None
+
+    def has_legal_moves(self, colour):
+        """Checks whether the player has at least one legal move
+
+        Args:
+            colour (int): the player's colour
+
+        Returns:
+            bool: whether there is a legal move
+        """
+        masks = self.pins_and_checks(colour)
+
+        for sq in iterate_bits(self.occupancy[colour]):
+            if self.piece_moves(sq, self.squares[sq], masks):
+                return True
+
+        return False
+
+    def is_checkmate_or_draw(self, turn):
+        """Checks whether the current player to move is in a checkmate or a draw
+
+        Args:
+            turn (int): 0 or 1 representing white or black side's turn respectively
+
+        Returns:
+            str: either 'checkmate' or 'draw'
+        """
+        if self.has_legal_moves(turn):
+            return False
+
+        if self.is_square_attacked(self.king_square(turn), 1 - turn):
+            return "checkmate"
+
+        return "draw"
+
+
+if __name__ == "__main__":
+    import time
+
+    from ai import minimax
+    from chessboard import Chessboard
+
+    # compares the time taken by each chessboard implementation to search the starting position
+    for chessboard_class in (Chessboard, Bitboard):
+        chess = chessboard_class()
+
+        for depth in range(1, 4):
+            time_before = time.time()
+            minimax(chess, depth, 0)
+            print(
+                f"{chessboard_class.__name__} depth {depth}: {time.time() - time_before}")
@@ -0,0 +1,233 @@
+"""Code shared by the chessboard implementations: the undo history, setting up a position from the position module's
+encodings, writing it back, whole position move generation and the coordinate notation.
+
+A subclass provides get_square, get_legal_moves, move_and_special_moves, is_in_check, place_pieces,
+get_position, is_unmoved, compute_zobrist_key and compute_material.
+"""
+from array import array
+
+from position import check_position, double_step_squares, format_fen, pack, parse_fen, unmoved_squares, unpack
+from zobrist import castling_rights
+
+# letters of the files by x value
+FILES = "abcdefgh"
+
+
+class Board:
+    """Base class of the Chessboard and Bitboard classes
+    """
+
+    # number of fields of an undo record, see the subclass's move_and_special_moves
+    UNDO_RECORD_SIZE = 0
+
+    def clear_history(self):
+        """Forgets the moves played
+        """
+        # undo records of the moves made. Only the first ply records are in use, the rest are kept to be reused.
+        self.history = []
+        self.ply = 0
+
+        # the zobrist key and the material before each move by ply, stored as machine integers so the value a move
+        # replaces is not kept alive as a Python int until the move is undone
+        self.key_stack = array("Q")
+        self.material_stack = array("i")
+
+    def push_undo_record(self):
+        """Gets the next undo record from the history and marks it as in use, saving the zobrist key and the material
+        of the position. Records are allocated once and then reused by later moves.
+
+        Returns:
+            list: the undo record to fill in
+        """
+        if self.ply == len(self.history):
+            self.history.append([None] * self.UNDO_RECORD_SIZE)
+            self.key_stack.append(0)
+            self.material_stack.append(0)
+
+        self.key_stack[self.ply] = self.zobrist_key
+        self.material_stack[self.ply] = self.material
+
+        record = self.history[self.ply]
+        self.ply += 1
+
+        return record
+
+    def pop_undo_record(self):
+        """Marks the last undo record as free again and puts back the zobrist key and the material it saved
+
+        Returns:
+            list: the undo record of the move being undone
+        """
+        self.ply -= 1
+        self.zobrist_key = self.key_stack[self.ply]
+        self.material = self.material_stack[self.ply]
+
+        return self.history[self.ply]
+
+    def set_position(self, pieces, turn, rights, en_passant_file=None, ply=0):
+        """Replaces the position on the chessboard, forgetting the moves played. The chessboard has no way to know
+        which pieces have moved, so a pawn on its starting row can double step and only the kings and rooks of the
+        castling rights count as unmoved.
+
+        Args:
+            pieces (list of tuple): (colour, piece type, square index) of every piece
+            turn (int): colour of the side to move
+            rights (int): castling right bits of the zobrist module
+            en_passant_file (NoneType/int, optional): file of a pawn that has just double stepped. Defaults to None.
+            ply (int, optional): number of moves played before the position. Defaults to 0.
+
+        Raises:
+            ValueError: if the position cannot be set up, the chessboard is then left in an unknown state
+        """
+        check_position(pieces, turn, rights, en_passant_file)
+        start_position = pack(pieces, turn, rights, en_passant_file)
+
+        # en passant depends on the last move, so the pawn is put on its starting square and double steps
+        setup_moves = []
+
+        if en_passant_file is not None:
+            start_sq, end_sq = double_step_squares(1 - turn, en_passant_file)
+            pieces = [(colour, piece_type, start_sq if sq == end_sq else sq) for colour, piece_type, sq in pieces]
+            setup_moves.append(((en_passant_file, start_sq // 8), (en_passant_file, end_sq // 8), 2))
+            turn = 1 - turn
+
+        self.place_pieces(pieces, unmoved_squares(pieces, rights))
+
+        self.clear_history()
+        self.turn = turn
+        self.castling_rights = castling_rights(self.is_unmoved)
+        self.zobrist_key = self.compute_zobrist_key()
+        self.material = self.compute_material()
+        self.piece_count = len(pieces)
+
+        for move in setup_moves:
+            self.move_and_special_moves(*move)
+
+        self.start_position = start_position
+        self.setup_plies = self.ply
+        self.first_ply = ply - self.ply
+
+        if self.is_in_check(1 - self.turn):
+            raise ValueError("The side that is not to move is in check.")
+
+    @classmethod
+    def from_fen(cls, fen):
+        """Sets up a chessboard from a FEN string
+
+        Args:
+            fen (str): the FEN string
+
+        Raises:
+            ValueError: if the string is not a FEN string of a position the chessboard can be set up with
+
+        Returns:
+            object: the chessboard
+        """
+        chessboard = cls()
+        chessboard.set_position(*parse_fen(fen))
+
+        return chessboard
+
+    def to_fen(self):
+        """Gets the FEN string of the position. The halfmove clock is always 0.
+
+        Returns:
+            str: the FEN string
+        """
+        return format_fen(*self.get_position(), self.first_ply + self.ply)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Sets up a chessboard from a packed position
+
+        Args:
+            data (bytes): the position packed by to_bytes
+
+        Raises:
+            ValueError: if the data is not a packed position
+
+        Returns:
+            object: the chessboard
+        """
+        chessboard = cls()
+        chessboard.set_position(*unpack(data))
+
+        return chessboard
+
+    def to_bytes(self):
+        """Packs the position into position.PACKED_SIZE bytes. Equal positions always have equal packed positions.
+
+        Returns:
+            bytes: the packed position
+        """
+        return pack(*self.get_position())
+
+    def legal_moves(self):
+        """Gets the legal moves of the side to move
+
+        Returns:
+            list of tuple: (start coord, (end coord, special move)) of each legal move, in board scan order
+        """
+        moves = []
+
+        for y in range(8):
+            for x in range(8):
+                square = self.get_square((x, y))
+
+                if square != 0 and square.colour == self.turn:
+                    coord = (x, y)
+                    moves.extend((coord, move) for move in self.get_legal_moves(coord))
+
+        return moves
+
+    def __str__(self):
+        """Returns the string representation of the chessboard
+        """
+
+        str_chessboard = ""
+        for y in range(8):
+            # y-axis
+            str_chessboard += f"{8-y}  "
+
+            for x in range(8):
+                piece_in_square = str(self.get_square((x, y)))
+
+                str_chessboard += f'{piece_in_square}{" "*(3-len(piece_in_square))}'
+
+            # add new line
+            str_chessboard += "\n"
+
+        # x-axis
+        str_chessboard += "   a  b  c  d  e  f  g  h\n"
+
+        return str_chessboard
+
+    @staticmethod
+    def notation_to_coord(notation):
+        """Converts algebraic notation to tuple coordinate format (e.g. from "a1" to (0,0))
+
+        Args:
+            notation (str): algebraic coordinate
+
+        Returns:
+            tuple of (int, int)): tuple coordinate
+        """
+
+        x, y = list(notation)
+
+        return (FILES.index(x), 8 - int(y))
+
+    @staticmethod
+    def coord_to_notation(coord):
+        """Converts tuple coordinate format to algebraic notation (e.g. from (0,0)  to "a1")
+
+        Args:
+            coord (tuple of (int, int)): tuple coordinate
+
+        Returns:
+            str: algebraic coordinate
+        """
+
+        x, y = coord
+
+        return FILES[x] + str(8 - y)
@@ -0,0 +1,424 @@
+"""Opening book: the moves to play in known positions, looked up by the zobrist key of the position so the AI can
+answer the first moves of a game without searching.
+
+A book file is a 16 byte header, the magic bytes and the number of entries, followed by 16 byte entries sorted by
+key. An entry is the key (8 bytes), the move (2 bytes), its weight (2 bytes) and 4 unused bytes. The move packs the
+start square, end square and special move type as start + end * 64 + special * 4096, square indices being y * 8 + x.
+The file is memory mapped and binary searched, so a lookup reads a few pages and the file is shared between processes.
+
+The shipped book is a sample: books/openings.pgn holds 25 main lines of common openings rather than played games, so
+books/openings.bin has about 240 entries and leaves the book after 10 to 16 plies. A book for real play is built from
+a corpus of played games, such as a month of rated games from https://database.lichess.org, without --lines.
+
+Usage:
+    python book.py build books/openings.bin games.pgn [more.pgn ...] [--plies 20]
+    python book.py build books/openings.bin books/openings.pgn --lines
+    python book.py show books/openings.bin [e4 e5 Nf3 ...]
+"""
+import argparse
+import mmap
+import os
+import random
+import re
+import struct
+import time
+
+from bitboard import Bitboard
+from transposition import SPECIAL_MOVES
+
+MAGIC = b"CHESSBK1"
+HEADER = struct.Struct(">8sQ")
+ENTRY = struct.Struct(">QHHI")
+
+# the largest weight an entry can have
+MAX_WEIGHT = 0xFFFF
+
+# books opened by this process, by path
+_books = {}
+
+# standard algebraic notation of a move that is not castling: piece letter, file and rank of the start
+# square when they are needed to tell two moves apart, capture, end square and promotion piece
+SAN_PATTERN = re.compile(r"^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$")
+
+PIECE_LETTERS = {"N": "Knight", "B": "Bishop",
+                 "R": "Rook", "Q": "Queen", "K": "King"}
+
+# the score of a game for white, by its result
+RESULTS = {"1-0": 2, "1/2-1/2": 1, "0-1": 0}
+
+# result of a game that is unfinished or whose result is unknown
+UNKNOWN_RESULT = "*"
+
+
+def encode_move(coord, move):
+    """Packs a move into the 16 bits stored in an entry
+
+    Args:
+        coord (tuple): start coordinate of the move
+        move (tuple): (end coord, special move)
+
+    Returns:
+        int: the packed move
+    """
+    (x1, y1), ((x2, y2), special_move) = coord, move
+
+    return y1 * 8 + x1 + (y2 * 8 + x2) * 64 + SPECIAL_MOVES.index(special_move) * 4096
+
+
+def decode_move(packed):
+    """Unpacks a move stored in an entry
+
+    Args:
+        packed (int): the packed move
+
+    Returns:
+        tuple: (start coord, (end coord, special move))
+    """
+    start_sq, end_sq, special_index = packed % 64, packed // 64 % 64, packed // 4096
+
+    return (start_sq % 8, start_sq // 8), ((end_sq % 8, end_sq // 8), SPECIAL_MOVES[special_index])
+
+
+def is_playable(chessboard, coord, move):
+    """Checks whether a book move is a legal move of the side to move
+
+    Args:
+        chessboard ('chessboard.Chessboard' object): instance of the Chessboard class
+        coord (tuple): start coord of the move
+        move (tuple): (end coord, special move)
+
+    Returns:
+        bool: whether the move can be played
+    """
+    square = chessboard.get_square(coord)
+
+    return square != 0 and square.colour == chessboard.turn and move in chessboard.get_legal_moves(coord)
+
+
+class OpeningBook:
+    """Read only view of a book file
+    """
+
+    def __init__(self, path):
+        """Maps the book file into memory
+
+        Args:
+            path (str): path of the book file
+        """
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.size = HEADER.unpack_from(self.map, 0)
+
+        if magic != MAGIC or HEADER.size + self.size * ENTRY.size != len(self.map):
+            self.close()
+            raise ValueError(f"{path} is not an opening book.")
+
+    def probe(self, key):
+        """Finds the book moves of a position
+
+        Args:
+            key (int): zobrist key of the position
+
+        Returns:
+            list of tuple: (start coord, (end coord, special move), weight) of each book move, the heaviest first
+        """
+        # binary search for the first entry of the key
+        low, high = 0, self.size
+
+        while low < high:
+            middle = (low + high) // 2
+
+            if ENTRY.unpack_from(self.map, HEADER.size + middle * ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        moves = []
+
+        for index in range(low, self.size):
+            entry_key, packed, weight, _ = ENTRY.unpack_from(
+                self.map, HEADER.size + index * ENTRY.size)
+
+            if entry_key != key:
+                break
+
+            moves.append((*decode_move(packed), weight))
+
+        return moves
+
+    def choose_move(self, chessboard, rng=random):
+        """Picks one of the book moves of the position at random, heavier moves being picked more often
+
+        Args:
+            chessboard ('chessboard.Chessboard' object): instance of the Chessboard class
+            rng ('random.Random' object, optional): random number generator. Defaults to the random module.
+
+        Returns:
+            NoneType/tuple: None if the position is not in the book, otherwise (start coord, (end coord, special move))
+        """
+        # a hash collision could give a move that is illegal in this position, or a move of the other side's piece,
+        # so the moves are checked
+        moves = [(coord, move, weight) for coord, move, weight in self.probe(chessboard.zobrist_key)
+                 if weight > 0 and is_playable(chessboard, coord, move)]
+
+        if not moves:
+            return None
+
+        coord, move, _ = rng.choices(moves, [weight for _, _, weight in moves])[0]
+
+        return coord, move
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+def get_book(path):
+    """Gets the opening book at a path, opening it the first time it is used in this process
+
+    Args:
+        path (str): path of the book file
+
+    Returns:
+        NoneType/OpeningBook: None if there is no book file at the path, otherwise the book
+    """
+    if path not in _books:
+        _books[path] = OpeningBook(path) if os.path.exists(path) else None
+
+    return _books[path]
+
+
+def parse_san(chessboard, san):
+    """Finds the move written in standard algebraic notation, such as "Nbd2", "exd5", "O-O" or "e8=Q+"
+
+    Args:
+        chessboard ('chessboard.Chessboard' object): instance of the Chessboard class
+        san (str): the move
+
+    Raises:
+        ValueError: if the notation does not match exactly one legal move, or promotes to a piece other than a queen
+
+    Returns:
+        tuple: (start coord, end coord, special move)
+    """
+    text = san.rstrip("+#!?")
+    colour = chessboard.turn
+
+    if text in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        piece_name, from_file, from_rank, promotion = "King", None, None, None
+        end_coord = (6 if len(text) == 3 else 2, 7 - colour * 7)
+    else:
+        match = SAN_PATTERN.match(text)
+
+        if match is None:
+            raise ValueError(f"{san!r} is not a move.")
+
+        letter, from_file, from_rank, end_square, promotion = match.groups()
+        piece_name = PIECE_LETTERS[letter] if letter else "Pawn"
+        end_coord = chessboard.notation_to_coord(end_square)
+
+    # the chessboards always promote to a queen
+    if promotion is not None and promotion != "Q":
+        raise ValueError(f"{san!r} promotes to a piece other than a queen.")
+
+    candidates = []
+
+    for y in range(8):
+        for x in range(8):
+            piece = chessboard.get_square((x, y))
+
+            if piece == 0 or piece.colour != colour or piece.name != piece_name:
+                continue
+
+            coord_notation = chessboard.coord_to_notation((x, y))
+
+            if (from_file and coord_notation[0] != from_file) or (from_rank and coord_notation[1] != from_rank):
+                continue
+
+            for move_end, special_move in chessboard.get_legal_moves((x, y)):
+                if move_end == end_coord:
+                    candidates.append(((x, y), move_end, special_move))
+
+    if len(candidates) != 1:
+        raise ValueError(f"{san!r} matches {len(candidates)} legal moves.")
+
+    return candidates[0]
+
+
+def read_pgn(path):
+    """Reads the games of a PGN file
+
+    Args:
+        path (str): path of the PGN file
+
+    Returns:
+        list of tuple: (list of moves in standard algebraic notation, result) of each game
+    """
+    games = []
+    movetext = []
+
+    with open(path, encoding="utf-8", errors="replace") as file:
+        lines = file.read().splitlines() + ["[End]"]
+
+    for line in lines:
+        line = line.strip()
+
+        # the tags of the next game end the movetext of the game before
+        if line.startswith("["):
+            if movetext:
+                games.append(parse_movetext(" ".join(movetext)))
+                movetext = []
+        elif line and not line.startswith("%"):
+            movetext.append(line.split(";")[0])
+
+    return games
+
+
+def parse_movetext(movetext):
+    """Splits the movetext of a game into its moves, leaving out the comments, variations, move numbers and annotations
+
+    Args:
+        movetext (str): the movetext
+
+    Returns:
+        tuple of (list of str, str): the moves and the result
+    """
+    movetext = re.sub(r"\{[^}]*\}", " ", movetext)
+
+    # variations can be nested, so the innermost ones are removed until none are left
+    while "(" in movetext:
+        stripped = re.sub(r"\([^()]*\)", " ", movetext)
+
+        if stripped == movetext:
+            break
+
+        movetext = stripped
+
+    moves = []
+    result = UNKNOWN_RESULT
+
+    for token in movetext.split():
+        token = re.sub(r"^\d+\.+", "", token)
+
+        if not token or token.startswith("$"):
+            continue
+
+        if token in RESULTS or token == UNKNOWN_RESULT:
+            result = token
+            break
+
+        moves.append(token)
+
+    return moves, result
+
+
+def build_book(pgn_paths, output_path, plies=20, lines=False):
+    """Builds a book file from the first moves of the games in PGN files. Each move is weighted by how well the
+    side that played it scored: 2 for a win, 1 for a draw and 0 for a loss. Games without a result are left out, as
+    counting them as draws would weight the moves of abandoned games like those of drawn ones.
+
+    Args:
+        pgn_paths (list of str): paths of the PGN files
+        output_path (str): path of the book file to write
+        plies (int, optional): number of moves of each game added to the book. Defaults to 20.
+        lines (bool, optional): whether the files hold opening lines instead of played games. Every move of a line
+            is weighted 1, whatever its result. Defaults to False.
+
+    Returns:
+        tuple of (int, int, int): number of games added, number of games left out for having no result and number
+            of entries written
+    """
+    weights = {}
+    games = 0
+    skipped = 0
+
+    for pgn_path in pgn_paths:
+        for moves, result in read_pgn(pgn_path):
+            if result == UNKNOWN_RESULT and not lines:
+                skipped += 1
+                continue
+
+            chessboard = Bitboard()
+            games += 1
+
+            for san in moves[:plies]:
+                try:
+                    coord, end_coord, special_move = parse_san(chessboard, san)
+                except ValueError as error:
+                    # the rest of the game cannot be followed
+                    print(f"{pgn_path}, game {games}: {error}")
+                    break
+
+                if lines:
+                    score = 1
+                else:
+                    score = RESULTS[result] if chessboard.turn == 0 else 2 - RESULTS[result]
+                item = (chessboard.zobrist_key, encode_move(coord, (end_coord, special_move)))
+                weights[item] = weights.get(item, 0) + score
+
+                chessboard.move_and_special_moves(coord, end_coord, special_move)
+
+    entries = sorted((key, packed, min(weight, MAX_WEIGHT))
+                     for (key, packed), weight in weights.items() if weight > 0)
+
+    with open(output_path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, len(entries)))
+
+        for key, packed, weight in entries:
+            file.write(ENTRY.pack(key, packed, weight, 0))
+
+    return games, skipped, len(entries)
+
+
+def show(args):
+    book = OpeningBook(args.book)
+    chessboard = Bitboard()
+
+    for san in args.moves:
+        chessboard.move_and_special_moves(*parse_san(chessboard, san))
+
+    moves = book.probe(chessboard.zobrist_key)
+
+    for coord, (end_coord, special_move), weight in sorted(moves, key=lambda item: -item[2]):
+        print(f"{chessboard.coord_to_notation(coord)}{chessboard.coord_to_notation(end_coord)}  weight {weight}")
+
+    # the lookup and choice the AI makes instead of searching
+    repeats = 1000
+    time_before = time.perf_counter()
+
+    for _ in range(repeats):
+        book.choose_move(chessboard)
+
+    print(f"{len(moves)} book moves, {(time.perf_counter() - time_before) / repeats * 1e6:.1f} microseconds per choice")
+
+    book.close()
+
+
+def build(args):
+    games, skipped, entries = build_book(args.pgn, args.book, args.plies, args.lines)
+
+    print(f"{games} games ({skipped} without a result left out), {entries} entries written to {args.book}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    parser_build = subparsers.add_parser(
+        "build", help="builds a book file from PGN files")
+    parser_build.add_argument("book")
+    parser_build.add_argument("pgn", nargs="+")
+    parser_build.add_argument("--plies", type=int, default=20)
+    parser_build.add_argument(
+        "--lines", action="store_true", help="the PGN files hold opening lines, every move is weighted 1")
+    parser_build.set_defaults(run=build)
+
+    parser_show = subparsers.add_parser(
+        "show", help="lists the book moves after a line of moves in standard algebraic notation")
+    parser_show.add_argument("book")
+    parser_show.add_argument("moves", nargs="*")
+    parser_show.set_defaults(run=show)
+
+    arguments = parser.parse_args()
+    arguments.run(arguments)
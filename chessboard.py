@@ -1,10 +1,75 @@
+from board import Board
+from evaluation import PIECE_SQUARE_VALUES, material_balance
 from pieces import Bishop, King, Knight, Pawn, Queen, Rook
+from zobrist import (BLACK_TO_MOVE_KEY, CASTLING_KEYS, CASTLING_RIGHTS_LOST, EN_PASSANT_KEYS, PIECE_KEYS,
+                     PIECE_TYPE_INDEX, castling_rights)
 
+# the coordinates the rook moves from and to for each square the king can castle to
+CASTLING_ROOK_MOVES = {(2, 7): ((0, 7), (3, 7)),
+                       (6, 7): ((7, 7), (5, 7)),
+                       (2, 0): ((0, 0), (3, 0)),
+                       (6, 0): ((7, 0), (5, 0))}
 
-class Chessboard:
+
+def _targets(translations):
+    """Builds the list of squares reached by each translation from every square of the chessboard
+
+    Args:
+        translations (list of tuple): (x, y) translations
+
+    Returns:
+        list of list of list of tuple: the squares reached from each square, indexed by [y][x]
+    """
+    return [[[(x + dx, y + dy) for dx, dy in translations if 0 <= x + dx <= 7 and 0 <= y + dy <= 7]
+             for x in range(8)] for y in range(8)]
+
+
+def _rays(directions):
+    """Builds the rays leaving every square of the chessboard in the given directions
+
+    Args:
+        directions (list of tuple): (x, y) translations of one step along each ray
+
+    Returns:
+        list of list of list of list of tuple: the squares on each non-empty ray ordered outwards from the square, indexed by [y][x]
+    """
+    rays = [[[] for _ in range(8)] for _ in range(8)]
+
+    for y in range(8):
+        for x in range(8):
+            for dx, dy in directions:
+                ray = []
+                ray_x, ray_y = x + dx, y + dy
+
+                while 0 <= ray_x <= 7 and 0 <= ray_y <= 7:
+                    ray.append((ray_x, ray_y))
+                    ray_x += dx
+                    ray_y += dy
+
+                if ray:
+                    rays[y][x].append(ray)
+
+    return rays
+
+
+KNIGHT_TARGETS = _targets(
+    [(1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)])
+KING_TARGETS = _targets(
+    [(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)])
+
+STRAIGHT_RAYS = _rays([(1, 0), (-1, 0), (0, 1), (0, -1)])
+DIAGONAL_RAYS = _rays([(1, 1), (1, -1), (-1, 1), (-1, -1)])
+
+# piece classes by the piece type indices of the zobrist module
+PIECE_CLASSES = [Pawn, Knight, Bishop, Rook, Queen, King]
+
+
+class Chessboard(Board):
     """Stores all the information for each instance of a chessboard
     """
 
+    UNDO_RECORD_SIZE = 10
+
     def __init__(self):
         # configuration of the chessboard
         self.chessboard = [
@@ -21,7 +86,36 @@ class Chessboard:
             [Rook(0), Knight(0), Bishop(0), Queen(0),
              King(0), Bishop(0), Knight(0), Rook(0)]]
 
-        self.history = []
+        # undo records of the moves made, see move_and_special_moves
+        self.clear_history()
+
+        # coordinates of the white and black kings
+        self.king_coords = [(4, 7), (4, 0)]
+
+        # (colour, checks, pins) of the current position, see get_checks_and_pins
+        self.checks_and_pins = None
+
+        # colour of the side to move
+        self.turn = 0
+
+        # castling right bits of the zobrist module, derived from the already_moved attribute of the kings and rooks
+        self.castling_rights = castling_rights(self.is_unmoved)
+
+        # 64-bit hash of the position, updated on every move and undo
+        self.zobrist_key = self.compute_zobrist_key()
+
+        # white's material minus black's, updated on every move and undo so the AI can evaluate a position in constant time
+        self.material = self.compute_material()
+
+        # number of pieces on the board, kings included, so the search can tell when the tablebase covers the position
+        self.piece_count = sum(square != 0 for row in self.chessboard for square in row)
+
+        # packed position the chessboard was set up with by set_position, None for the initial layout
+        self.start_position = None
+        # number of undo records set_position made to set up the position, which are not moves played
+        self.setup_plies = 0
+        # number of moves played before the first undo record, for the fullmove number of a FEN string
+        self.first_ply = 0
 
     def get_square(self, coord):
         """Gets the element of the chessboad with the specific coordinate
@@ -43,23 +137,40 @@ class Chessboard:
         """
         self.chessboard[coord[1]][coord[0]] = new_value
 
-    def append_history(self, previous_square, new_square, piece_attributes, captured_piece, pawn_enpassant, rook_castling_move):
-        """Appends data about the last move executed to the history list attribute
+    def last_move(self):
+        """Gets the undo record of the last move executed
 
-        Args:
-            previous_square (tuple of (int, int)): tuple coordinate of the square that will be moved
-            new_square (tuple of (int, int)): tuple coordinate of the square the piece will move to
-            piece_attributes (dict): dictioanary containing attributes of the object
-            captured_piece (int/class): 0 or instance of a Piece type class
-            pawn_enpassant (NoneType/tuple of (tuple, class)): containing the coordinate and object of the pawn that was removed
-            rook_castling_move (NoneType/tuple): containing the coordinate of the square the rook moved from
+        Returns:
+            NoneType/list: None if no moves have been made or the undo record of the last move
         """
-        self.history.append((previous_square,
-                             new_square,
-                             piece_attributes,
-                             captured_piece,
-                             pawn_enpassant,
-                             rook_castling_move))
+        if self.ply == 0:
+            return None
+
+        return self.history[self.ply - 1]
+
+    def moves_played(self):
+        """Gets the moves played from the starting position, or the position the chessboard was set up with, which is
+        enough to set up the same position on another chessboard
+
+        Returns:
+            list of tuple: (start coord, end coord, special move) of each move. Only castling (4), en passant (5) and
+                pawn double steps (2) keep their special move type, the others change nothing when the move is made.
+        """
+        moves = []
+
+        for record in self.history[self.setup_plies:self.ply]:
+            if record[5] is not None:
+                special_move = 4
+            elif record[4] is not None:
+                special_move = 5
+            elif record[7] is not None:
+                special_move = 2
+            else:
+                special_move = None
+
+            moves.append((record[0], record[1], special_move))
+
+        return moves
 
     def move(self, previous_square, new_square):
         """Moves a piece from one square to another and sets the initial square to empty (0)
@@ -69,42 +180,55 @@ class Chessboard:
             new_square (tuple of (int, int)): tuple coordinate of the square the piece will move to
 
         Returns:
-            tuple of (dict, str/class): tuple containing dictionary of attributes of the piece object and the object itself.
+            int/class: 0 or the piece that was on new_square
         """
-        captured_piece = self.get_square(new_square)
-
-        piece = self.get_square(previous_square)
+        captured_piece = self.chessboard[new_square[1]][new_square[0]]
 
-        # Creates a copy of the attributes of the piece and stores it into a variable
-        moved_piece_attr = dict(piece.__dict__)
+        self.chessboard[new_square[1]][new_square[0]
+                                       ] = self.chessboard[previous_square[1]][previous_square[0]]
+        self.chessboard[previous_square[1]][previous_square[0]] = 0
 
-        self.set_square(new_square, piece)
-        self.set_square(previous_square, 0)
-
-        return moved_piece_attr, captured_piece
+        return captured_piece
 
     def undo_move(self):
         """Undos the last move
         """
-        old_square, current_square, piece_attributes, captured_piece, pawn_enpassant, rook_castling_move = self.history.pop()
+        old_square, current_square, already_moved, captured_piece, pawn_enpassant_coord, rook_castling_move, promoted_pawn, _, self.castling_rights, self.turn = self.pop_undo_record()
+
+        self.checks_and_pins = None
+
+        # a null move has nothing to put back
+        if old_square is None:
+            return
+
+        if promoted_pawn is None:
+            piece = self.get_square(current_square)
+        else:
+            # put the pawn back instead of the queen it was promoted to
+            piece = promoted_pawn
 
-        self.move(current_square, old_square)
+        self.set_square(old_square, piece)
 
-        # set the square the piece moved to back to its original value
-        self.set_square(current_square, captured_piece)
+        if piece.name == "King":
+            self.king_coords[piece.colour] = old_square
 
-        if pawn_enpassant is not None:
+        if captured_piece != 0:
+            self.piece_count += 1
+
+        if pawn_enpassant_coord is None:
+            # set the square the piece moved to back to its original value
+            self.set_square(current_square, captured_piece)
+        else:
             # Place back the captured enemy pawn
-            self.set_square(pawn_enpassant[0], pawn_enpassant[1])
+            self.set_square(current_square, 0)
+            self.set_square(pawn_enpassant_coord, captured_piece)
+
+        piece.already_moved = already_moved
 
-        elif rook_castling_move is not None:
+        if rook_castling_move is not None:
             # Move the rook back to its previous position
             self.move(rook_castling_move[1], rook_castling_move[0])
-            self.chessboard[rook_castling_move[0][1]
-                            ][rook_castling_move[0][0]].already_moved = False
-
-        # set attributes of the moved piece back to its previous state
-        self.get_square(old_square).__dict__ = piece_attributes
+            self.get_square(rook_castling_move[0]).already_moved = False
 
     def move_and_special_moves(self, start_coord, end_coord, special_move):
         """Moves a piece to a different square and takes into consideration
@@ -115,57 +239,250 @@ class Chessboard:
             end_coord (tuple of (int, int)): tuple coordinate of the square the piece will move to
             special_move (int): the special move type
         """
+        piece = self.get_square(start_coord)
+        colour = piece.colour
+        piece_type = PIECE_TYPE_INDEX[piece.name]
+        self.checks_and_pins = None
 
-        colour = self.get_square(start_coord).colour
-
-        piece_attributes, captured_piece = self.move(start_coord, end_coord)
+        if piece_type == 5:
+            self.king_coords[colour] = end_coord
 
+        x1, y1 = start_coord
         x2, y2 = end_coord
-
-        self.chessboard[y2][x2].already_moved = True
-
-        pawn_enpassant = None
-        rook_castling_move = None
+        start_sq = y1 * 8 + x1
+        end_sq = y2 * 8 + x2
+
+        key = self.zobrist_key
+        piece_keys = PIECE_KEYS[colour]
+        material = self.material
+        piece_values = PIECE_SQUARE_VALUES[colour]
+
+        # remove the en passant file of the previous move from the key
+        last_move = self.last_move()
+        if last_move is not None and last_move[7] is not None:
+            key ^= EN_PASSANT_KEYS[last_move[7]]
+
+        # undo record: [start coord, end coord, already_moved before the move, captured piece,
+        # coordinate of the pawn captured en passant, rook castling move, pawn that was promoted,
+        # file of a pawn double step, castling rights and turn before the move]
+        record = self.push_undo_record()
+        record[0] = start_coord
+        record[1] = end_coord
+        record[2] = piece.already_moved
+        record[3] = captured_piece = self.move(start_coord, end_coord)
+        record[4] = None
+        record[5] = None
+        record[6] = None
+        record[7] = None
+        record[8] = self.castling_rights
+        record[9] = self.turn
+
+        piece.already_moved = True
+
+        key ^= piece_keys[piece_type][start_sq] ^ piece_keys[piece_type][end_sq]
+        material += piece_values[piece_type][end_sq] - \
+            piece_values[piece_type][start_sq]
+
+        if captured_piece != 0:
+            self.piece_count -= 1
+            captured_type = PIECE_TYPE_INDEX[captured_piece.name]
+            key ^= PIECE_KEYS[1 - colour][captured_type][end_sq]
+            material -= PIECE_SQUARE_VALUES[1 - colour][captured_type][end_sq]
 
         # en passant
         if special_move == 5:
             if colour == 0:
                 pawn_enpassant_coord = (x2, y2+1)
-                # pawn_enpassant = (coord, pawn object)
-                pawn_enpassant = (pawn_enpassant_coord,
-                                  self.get_square((x2, y2+1)))
-                self.set_square(pawn_enpassant_coord, 0)
-
-            elif colour == 1:
+            else:
                 pawn_enpassant_coord = (x2, y2-1)
-                # pawn_enpassant = (coord, pawn object)
-                pawn_enpassant = (
-                    pawn_enpassant_coord, self.get_square((x2, y2-1)))
-                self.set_square(pawn_enpassant_coord, 0)
+
+            record[3] = self.get_square(pawn_enpassant_coord)
+            record[4] = pawn_enpassant_coord
+            self.set_square(pawn_enpassant_coord, 0)
+            self.piece_count -= 1
+
+            pawn_enpassant_sq = pawn_enpassant_coord[1] * 8 + x2
+            key ^= PIECE_KEYS[1 - colour][0][pawn_enpassant_sq]
+            material -= PIECE_SQUARE_VALUES[1 - colour][0][pawn_enpassant_sq]
 
         # castling
         elif special_move == 4:
-            if x2 < 4:
-                rook_castling_move = ((0, y2), (x2+1, y2))
-                self.move(rook_castling_move[0], rook_castling_move[1])
+            rook_castling_move = CASTLING_ROOK_MOVES[end_coord]
+            record[5] = rook_castling_move
+            self.move(rook_castling_move[0], rook_castling_move[1])
+            self.get_square(rook_castling_move[1]).already_moved = True
+
+            (rook_x1, rook_y1), (rook_x2, rook_y2) = rook_castling_move
+            rook_start_sq = rook_y1 * 8 + rook_x1
+            rook_end_sq = rook_y2 * 8 + rook_x2
+            key ^= piece_keys[3][rook_start_sq] ^ piece_keys[3][rook_end_sq]
+            material += piece_values[3][rook_end_sq] - \
+                piece_values[3][rook_start_sq]
+
+        if piece_type == 0:
+            # promotion - promote the pawn to a Queen
+            if y2 == 0 or y2 == 7:
+                record[6] = piece
+
+                queen = Queen(colour)
+                queen.already_moved = True
+                self.set_square(end_coord, queen)
+
+                key ^= piece_keys[0][end_sq] ^ piece_keys[4][end_sq]
+                material += piece_values[4][end_sq] - piece_values[0][end_sq]
+
+            # a pawn double step allows an en passant capture on the next move
+            elif y2 - y1 == 2 or y1 - y2 == 2:
+                record[7] = x2
+                key ^= EN_PASSANT_KEYS[x2]
+
+        # moving a king or a rook, or capturing a rook, loses castling rights
+        rights = self.castling_rights & ~(
+            CASTLING_RIGHTS_LOST[start_sq] | CASTLING_RIGHTS_LOST[end_sq])
+        if rights != self.castling_rights:
+            key ^= CASTLING_KEYS[self.castling_rights] ^ CASTLING_KEYS[rights]
+            self.castling_rights = rights
+
+        if self.turn == colour:
+            self.turn = 1 - colour
+            key ^= BLACK_TO_MOVE_KEY
+
+        self.zobrist_key = key
+        self.material = material
+
+    def make_null_move(self):
+        """Passes the turn to the other side without moving a piece, for the null move pruning of the search.
+        It is undone with undo_move.
+        """
+        key = self.zobrist_key
 
-            else:
-                rook_castling_move = ((7, y2), (x2-1, y2))
-                self.move(rook_castling_move[0], rook_castling_move[1])
+        # a null move ends the chance to capture en passant
+        last_move = self.last_move()
+        if last_move is not None and last_move[7] is not None:
+            key ^= EN_PASSANT_KEYS[last_move[7]]
+
+        # the undo record of a null move has no start or end coordinate
+        record = self.push_undo_record()
+        record[0:8] = (None,) * 8
+        record[8] = self.castling_rights
+        record[9] = self.turn
+
+        self.checks_and_pins = None
+        self.turn = 1 - self.turn
+        self.zobrist_key = key ^ BLACK_TO_MOVE_KEY
+
+    def is_in_check(self, colour):
+        """Checks whether the king of a colour is attacked
+
+        Args:
+            colour (int): colour of the king
+
+        Returns:
+            bool: whether the king is in check
+        """
+        return self.is_square_attacked(self.king_coords[colour], 1 - colour)
+
+    def has_non_pawn_material(self, colour):
+        """Checks whether a colour has any pieces other than its king and pawns. Without them, passing
+        the turn could be better than every move (zugzwang), so the search does not try null moves.
+
+        Args:
+            colour (int): the colour of the pieces
+
+        Returns:
+            bool: whether the colour has a knight, bishop, rook or queen
+        """
+        for row in self.chessboard:
+            for square in row:
+                if square != 0 and square.colour == colour and square.name not in ("Pawn", "King"):
+                    return True
+
+        return False
+
+    def is_unmoved(self, sq, colour, piece_type):
+        """Checks whether an unmoved piece of a colour and type is on a square
+
+        Args:
+            sq (int): square index, y * 8 + x
+            colour (int): colour of the piece
+            piece_type (int): piece type index of the zobrist module
+
+        Returns:
+            bool: whether the piece is on the square and has not moved
+        """
+        square = self.chessboard[sq // 8][sq % 8]
+
+        return square != 0 and square.colour == colour and PIECE_TYPE_INDEX[square.name] == piece_type and not square.already_moved
+
+    def compute_zobrist_key(self):
+        """Computes the zobrist key of the position from scratch
+
+        Returns:
+            int: 64-bit hash of the pieces, castling rights, en passant file and side to move
+        """
+        key = 0
+
+        for y, row in enumerate(self.chessboard):
+            for x, square in enumerate(row):
+                if square != 0:
+                    key ^= PIECE_KEYS[square.colour][PIECE_TYPE_INDEX[square.name]][y * 8 + x]
+
+        key ^= CASTLING_KEYS[castling_rights(self.is_unmoved)]
+
+        # en passant is possible on the next move if the last move was a pawn double step
+        last_move = self.last_move()
+        if last_move is not None and last_move[0] is not None:
+            (_, y1), (x2, y2) = last_move[0:2]
+            last_moved_piece = self.get_square(last_move[1])
+
+            if last_moved_piece != 0 and last_moved_piece.name == "Pawn" and abs(y2 - y1) == 2:
+                key ^= EN_PASSANT_KEYS[x2]
+
+        if self.turn == 1:
+            key ^= BLACK_TO_MOVE_KEY
+
+        return key
+
+    def compute_material(self):
+        """Computes the material balance of the position from scratch
+
+        Returns:
+            int: material of white minus the material of black
+        """
+        return material_balance((square.colour, PIECE_TYPE_INDEX[square.name], y * 8 + x)
+                                for y, row in enumerate(self.chessboard)
+                                for x, square in enumerate(row) if square != 0)
+
+    def get_position(self):
+        """Gets the position in the form of the position module
+
+        Returns:
+            tuple: (pieces, turn, castling rights, en passant file), pieces being (colour, piece type, square index)
+        """
+        pieces = [(square.colour, PIECE_TYPE_INDEX[square.name], y * 8 + x)
+                  for y, row in enumerate(self.chessboard) for x, square in enumerate(row) if square != 0]
+        en_passant_file = self.history[self.ply - 1][7] if self.ply else None
+
+        return pieces, self.turn, self.castling_rights, en_passant_file
+
+    def place_pieces(self, pieces, unmoved):
+        """Empties the chessboard and puts pieces on it, for set_position
 
-        # promotion - promote the pawn to a Queen
-        if self.get_square(end_coord) != 0 and self.get_square(end_coord).name == "Pawn":
-            if colour == 0 and y2 == 0:
-                self.set_square(end_coord, Queen(0))
-                self.chessboard[y2][x2].already_moved = True
+        Args:
+            pieces (list of tuple): (colour, piece type, square index) of every piece
+            unmoved (set of int): square indices of the pieces that have not moved yet
+        """
+        self.chessboard = [[0] * 8 for _ in range(8)]
+        self.king_coords = [None, None]
+        self.checks_and_pins = None
 
-            elif colour == 1 and y2 == 7:
-                self.set_square(end_coord, Queen(1))
-                self.chessboard[y2][x2].already_moved = True
+        for colour, piece_type, sq in pieces:
+            piece = PIECE_CLASSES[piece_type](colour)
+            piece.already_moved = sq not in unmoved
+            self.chessboard[sq // 8][sq % 8] = piece
 
-        # add latest move and other information required for undo to history list
-        self.append_history(start_coord, end_coord, piece_attributes,
-                            captured_piece, pawn_enpassant, rook_castling_move)
+            if piece_type == 5:
+                self.king_coords[colour] = (sq % 8, sq // 8)
 
     def get_directional_moves(self, start_coord):
         """Gets all the possible directional moves a piece can make.
@@ -374,7 +691,6 @@ class Chessboard:
         Returns:
             bool: whether the move is legal or not
         """
-        history = self.history
         colour = start_square.colour
         x, y = end_coord
 
@@ -383,15 +699,11 @@ class Chessboard:
         else:
             i = -1
 
-        last_move = (history or [None])[-1]
-
-        if last_move is not None:
-            # pylint: disable=E1136
-            last_move = last_move[0:2]
+        last_move = self.last_move()
 
         # checks if the last move in history was the opponent's pawn
         # double step move
-        if last_move != ((x, y-i), (x, y+i)):
+        if last_move is None or last_move[0] != (x, y-i) or last_move[1] != (x, y+i):
             return False
 
         # square under the opponent pawn (from the player's perspective)
@@ -443,6 +755,114 @@ class Chessboard:
                     return True
         return False
 
+    def is_square_attacked(self, coord, by_colour):
+        """Checks whether a square is attacked by any piece of a colour by looking outwards from the square
+
+        Args:
+            coord (tuple of (int, int)): tuple coordinate of the square
+            by_colour (int): colour of the attacking side
+
+        Returns:
+            bool: whether the square is attacked
+        """
+        x, y = coord
+        chessboard = self.chessboard
+
+        # pawns attack diagonally forwards and white pawns move towards y = 0
+        pawn_y = y + 1 if by_colour == 0 else y - 1
+
+        if 0 <= pawn_y <= 7:
+            for pawn_x in (x - 1, x + 1):
+                if 0 <= pawn_x <= 7:
+                    square = chessboard[pawn_y][pawn_x]
+                    if square != 0 and square.colour == by_colour and square.name == "Pawn":
+                        return True
+
+        for name, targets in (("Knight", KNIGHT_TARGETS), ("King", KING_TARGETS)):
+            for target_x, target_y in targets[y][x]:
+                square = chessboard[target_y][target_x]
+                if square != 0 and square.colour == by_colour and square.name == name:
+                    return True
+
+        for rays, attribute in ((STRAIGHT_RAYS, "straight"), (DIAGONAL_RAYS, "diagonal")):
+            for ray in rays[y][x]:
+                for ray_x, ray_y in ray:
+                    square = chessboard[ray_y][ray_x]
+
+                    if square != 0:
+                        # the first piece on the ray attacks the square if it can slide in that direction
+                        if square.colour == by_colour and getattr(square, attribute):
+                            return True
+
+                        break
+
+        return False
+
+    def get_checks_and_pins(self, colour):
+        """Finds the pieces checking the king and the pieces pinned to it. It is computed once per position
+            and kept until the next move or undo.
+
+        Args:
+            colour (int): colour of the king
+
+        Returns:
+            tuple of (list, dict): for each checking piece the list of squares that capture it or block its check,
+                and a dictionary from the coordinate of every pinned piece to the (x, y) direction of its pin
+        """
+        if self.checks_and_pins is not None and self.checks_and_pins[0] == colour:
+            return self.checks_and_pins[1], self.checks_and_pins[2]
+
+        chessboard = self.chessboard
+        king_x, king_y = self.king_coords[colour]
+        checks = []
+        pins = {}
+
+        for rays, attribute in ((STRAIGHT_RAYS, "straight"), (DIAGONAL_RAYS, "diagonal")):
+            for ray in rays[king_y][king_x]:
+                pinned = None
+
+                for num_square, (ray_x, ray_y) in enumerate(ray):
+                    square = chessboard[ray_y][ray_x]
+
+                    if square == 0:
+                        continue
+
+                    if square.colour == colour:
+                        # a second piece of the king's colour on the ray means there is no pin
+                        if pinned is not None:
+                            break
+
+                        pinned = (ray_x, ray_y)
+
+                    else:
+                        if getattr(square, attribute):
+                            if pinned is None:
+                                # capturing the piece or blocking any square up to it stops the check
+                                checks.append(ray[:num_square + 1])
+                            else:
+                                pins[pinned] = (ray_x - king_x, ray_y - king_y)
+
+                        break
+
+        for target_x, target_y in KNIGHT_TARGETS[king_y][king_x]:
+            square = chessboard[target_y][target_x]
+            if square != 0 and square.colour != colour and square.name == "Knight":
+                checks.append([(target_x, target_y)])
+
+        # opposing pawns are on the row in front of the king from the king's side
+        pawn_y = king_y - 1 if colour == 0 else king_y + 1
+
+        if 0 <= pawn_y <= 7:
+            for pawn_x in (king_x - 1, king_x + 1):
+                if 0 <= pawn_x <= 7:
+                    square = chessboard[pawn_y][pawn_x]
+                    if square != 0 and square.colour != colour and square.name == "Pawn":
+                        checks.append([(pawn_x, pawn_y)])
+
+        self.checks_and_pins = (colour, checks, pins)
+
+        return checks, pins
+
     def remove_checks(self, start_coord, possible_moves):
         """Removes the moves that would lead to a self discovered check
 
@@ -454,69 +874,67 @@ class Chessboard:
             list of tuple: containing the filtered coordinates the piece can move to and the special move type
         """
         start_square = self.get_square(start_coord)
+        colour = start_square.colour
+        opponent_colour = 1 - colour
 
-        # used later when finding the king's coordinate
-        if start_square.colour == 0:
-            initial = "w"
-        else:
-            initial = "b"
+        checks, pins = self.get_checks_and_pins(colour)
 
         legal_moves = []
 
-        for end_coord, special_move in possible_moves:
-            attacked_squares = []
-
-            self.move_and_special_moves(start_coord, end_coord, special_move)
-
-            # get all the possible moves the opponent can make
-            for y, row in enumerate(self.chessboard):
-                for x, square in enumerate(row):
-                    if square != 0 and square.colour != start_square.colour:
-                        attacked_squares.extend(
-                            self.get_specific_moves((x, y)))
-                        attacked_squares.extend(
-                            self.get_directional_moves((x, y)))
-
-            # removes repeated elements
-            attacked_squares = set(attacked_squares)
-
-            # Check if squares for castling are not attacked
-            if special_move == 4:
-                can_castle = True
-                x2, y2 = end_coord
-
-                # check if the squares the king would move through and to are attacked by opposing pieces
-                if x2 == 2:
-                    for i in range(2, 5):
-                        if (i, y2) in [attacked_square[0] for attacked_square in attacked_squares]:
-                            can_castle = False
-
-                elif x2 == 6:
-                    for i in range(4, 7):
-                        if (i, y2) in [attacked_square[0] for attacked_square in attacked_squares]:
-                            # print(f"CASTLING: {(i, y2)}")
-                            can_castle = False
-
-                if can_castle:
-                    legal_moves.append((end_coord, special_move))
+        if start_square.name == "King":
+            # take the king off the board so the squares behind it on a checking piece's ray are attacked
+            self.set_square(start_coord, 0)
 
-            else:
-                # get the coordinate of the player's king
-                for y, row in enumerate(self.chessboard):
-                    for x, square in enumerate(row):
-                        if str(square) == initial+"K":
-                            king_coordinate = (x, y)
-                            break
-                    else:  # no break
+            for end_coord, special_move in possible_moves:
+                if special_move == 4:
+                    # the king can not castle out of, through or into check
+                    if checks:
                         continue
 
-                    break
+                    x1, y1 = start_coord
+                    passing_coord = ((x1 + end_coord[0]) // 2, y1)
+
+                    if self.is_square_attacked(passing_coord, opponent_colour):
+                        continue
+
+                if not self.is_square_attacked(end_coord, opponent_colour):
+                    legal_moves.append((end_coord, special_move))
+
+            self.set_square(start_coord, start_square)
+
+            return legal_moves
+
+        # when in double check only the king can move
+        if len(checks) > 1:
+            return legal_moves
 
-                if king_coordinate not in [attacked_square[0] for attacked_square in attacked_squares]:
+        pin = pins.get(start_coord)
+        king_x, king_y = self.king_coords[colour]
+
+        for end_coord, special_move in possible_moves:
+            if special_move == 5:
+                # en passant removes two pieces from the chessboard so the move is played to check it
+                self.move_and_special_moves(
+                    start_coord, end_coord, special_move)
+                in_check = self.is_square_attacked(
+                    self.king_coords[colour], opponent_colour)
+                self.undo_move()
+
+                if not in_check:
                     legal_moves.append((end_coord, special_move))
 
-            # revert the chessboard back to its previous state
-            self.undo_move()
+                continue
+
+            if pin is not None:
+                # a pinned piece can only move along the line between the king and the pinning piece
+                if (end_coord[0] - king_x) * pin[1] != (end_coord[1] - king_y) * pin[0]:
+                    continue
+
+            # when in check the piece has to capture the checking piece or block the check
+            if checks and end_coord not in checks[0]:
+                continue
+
+            legal_moves.append((end_coord, special_move))
 
         return legal_moves
 
@@ -543,6 +961,30 @@ class Chessboard:
 
         return legal_moves
 
+    def get_legal_captures(self, start_coord):
+        """Returns the legal captures and promotions of a piece. The other moves are left out
+            before they are checked for self discovered checks, which is the expensive part.
+
+        Args:
+            start_coord (tuple of (int, int)): the coordinate the piece is moving from
+
+        Returns:
+            list of tuple: containing the legal coordinates the piece can capture on or promote on and their special move type
+        """
+        start_square = self.get_square(start_coord)
+
+        if start_square == 0:
+            return []
+
+        possible_moves = self.get_specific_moves(start_coord)
+        possible_moves.extend(self.get_directional_moves(start_coord))
+
+        is_pawn = start_square.name == "Pawn"
+        captures = [(end_coord, special_move) for end_coord, special_move in possible_moves
+                    if self.get_square(end_coord) != 0 or special_move == 5 or (is_pawn and end_coord[1] in (0, 7))]
+
+        return self.remove_checks(start_coord, captures)
+
     def is_checkmate_or_draw(self, turn):
         """Checks whether the current player to move is in a checkmate or a draw
 
@@ -569,33 +1011,8 @@ class Chessboard:
 
         # Determines whether it is a checkmate or a stalemate
         if len(legal_moves) == 0:
-            attacked_squares = []
-
-            # get all the squares the opponent's pieces are attacking
-            for y, row in enumerate(self.chessboard):
-                for x, square in enumerate(row):
-                    if square != 0 and square.colour != turn:
-                        attacked_squares.extend(
-                            self.get_specific_moves((x, y)))
-                        attacked_squares.extend(
-                            self.get_directional_moves((x, y)))
-
-            # removing repeated values in the list by converting it into a set
-            attacked_squares = set(attacked_squares)
-
-            # find the coordinate of the king in the chessboard
-            for y, row in enumerate(self.chessboard):
-                for x, square in enumerate(row):
-                    if square != 0 and square.colour == turn and str(square)[1] == "K":
-                        king_coordinate = (x, y)
-                        break
-                else:  # no break
-                    continue
-
-                break
-
             # if king is attacked then it is checkmate
-            if king_coordinate in [attacked_square[0] for attacked_square in attacked_squares]:
+            if self.is_square_attacked(self.king_coords[turn], 1 - turn):
                 return "checkmate"
 
             # if king is not attacked then it is a stalemate
@@ -603,65 +1020,6 @@ class Chessboard:
 
         return False
 
-    def __str__(self):
-        """Returns the string representation of the chessboard
-        """
-
-        str_chessboard = ""
-        for x in range(8):
-            # y-axis
-            str_chessboard += f"{8-x}  "
-
-            for y in range(8):
-                piece_in_square = str(self.chessboard[x][y])
-
-                str_chessboard += f'{piece_in_square}{" "*(3-len(piece_in_square))}'
-
-            # add new line
-            str_chessboard += "\n"
-
-        # x-axis
-        str_chessboard += "   a  b  c  d  e  f  g  h\n"
-
-        return str_chessboard
-
-    @staticmethod
-    def notation_to_coord(notation):
-        """Converts algebraic notation to tuple coordinate format (e.g. from "a1" to (0,0))
-
-        Args:
-            notation (str): algebraic coordinate
-
-        Returns:
-            tuple of (int, int)): tuple coordinate
-        """
-
-        x, y = list(notation)
-
-        x_axis = {"a": 0, "b": 1, "c": 2, "d": 3,
-                  "e": 4, "f": 5, "g": 6, "h": 7}
-
-        return (x_axis[x], 8 - int(y))
-
-    @staticmethod
-    def coord_to_notation(coord):
-        """Converts tuple coordinate format to algebraic notation (e.g. from (0,0)  to "a1")
-
-        Args:
-            coord (tuple of (int, int)): tuple coordinate
-
-        Returns:
-            str: algebraic coordinate
-        """
-
-        # pylint: disable=unbalanced-tuple-unpacking
-        x, y = list(coord)
-
-        x_axis = {0: "a", 1: "b", 2: "c", 3: "d",
-                  4: "e", 5: "f", 6: "g", 7: "h"}
-
-        return x_axis[x] + str(8 - y)
-
 
 if __name__ == "__main__":
 
@@ -0,0 +1,197 @@
+"""Pools the AI searches run in, so a search does not hold up the gevent worker serving every socket.
+
+A search is a job sent to the pool with the moves played from the starting position, or from the packed position
+the game was set up with, the same hand-off the parallel module uses. The socket handler waits for the job's future by sleeping cooperatively, so the other
+sockets are served while the AI thinks.
+"""
+import cProfile
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from random import choice
+
+import search
+from ai import SearchStats, iterative_deepening
+from parallel import set_up_position
+from transposition import TranspositionTable
+
+# transposition table kept by each process that runs searches, so a game's searches reuse the results of earlier moves
+_search_table = None
+
+
+class LocalComputePool:
+    """Runs each job in this process as soon as it is submitted. A stand-in for the process pool when developing,
+    the worker is blocked while the job runs like it was before searches were offloaded.
+    """
+
+    def submit(self, function, *args):
+        """Runs a job
+
+        Args:
+            function (function): the job
+            *args: arguments of the job
+
+        Returns:
+            'concurrent.futures.Future' object: the finished job
+        """
+        future = Future()
+
+        try:
+            future.set_result(function(*args))
+        except Exception as error:
+            future.set_exception(error)
+
+        return future
+
+    def shutdown(self):
+        pass
+
+
+class ProcessComputePool:
+    """Runs the jobs in worker processes, so they do not take the CPU time of the process serving the sockets.
+
+    The processes are started when the first job is submitted, not when the web worker imports the app, and with
+    spawn rather than fork: a child forked from a worker that gevent has patched can hang on the copied locks.
+    """
+
+    def __init__(self, workers):
+        """
+        Args:
+            workers (int): number of worker processes, the number of searches that can run at the same time
+        """
+        self.workers = workers
+        self.executor = None
+
+    def submit(self, function, *args):
+        """Sends a job to the worker processes
+
+        Args:
+            function (function): the job, which must be defined at the top level of a module so it can be pickled
+            *args: arguments of the job
+
+        Returns:
+            'concurrent.futures.Future' object: the job's future
+        """
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+        return self.executor.submit(function, *args)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+
+
+def create_pool(kind, workers=1):
+    """Creates a compute pool
+
+    Args:
+        kind (str): "process" or "local"
+        workers (int, optional): number of worker processes of a process pool. Defaults to 1.
+
+    Returns:
+        ProcessComputePool/LocalComputePool: the pool
+    """
+    if kind == "process":
+        return ProcessComputePool(workers)
+
+    if kind == "local":
+        return LocalComputePool()
+
+    raise ValueError(f"Unknown compute pool {kind!r}, expected 'process' or 'local'.")
+
+
+def search_move(chessboard_class_name, moves, player_colour, engine, time_budget, max_depth, pruning, table_mb, workers=None,
+                start_position=None, profile_path=None):
+    """Finds the AI's move, the job the socket handlers send to the compute pool
+
+    Args:
+        chessboard_class_name (str): name of the chessboard class
+        moves (list of tuple): (start coord, end coord, special move) of each move from the starting position
+        player_colour (int): player's side colour, the AI plays the other side
+        engine (str): "minimax" or "negamax"
+        time_budget (float): seconds the search can take
+        max_depth (NoneType/int): the deepest depth to search to
+        pruning (bool): whether the negamax engine uses null move pruning and late move reductions
+        table_mb (float): memory budget of the transposition table in megabytes
+        workers (int, optional): number of processes the search uses with lazy SMP. Defaults to None.
+        start_position (NoneType/bytes, optional): packed position the moves are played from, the start_position
+            attribute of the chessboard. Defaults to None (the initial layout).
+        profile_path (NoneType/str, optional): file the cProfile statistics of the search are written to, which
+            pstats can read. Only the process running the job is profiled, not the lazy SMP workers. Defaults to None
+            (not profiled).
+
+    Returns:
+        tuple of (tuple, 'ai.SearchStats' object): (start coord, (end coord, special move)) of the AI's move, and the
+            counters of the search
+    """
+    global _search_table
+
+    chessboard = set_up_position(chessboard_class_name, moves, start_position)
+
+    if _search_table is None:
+        _search_table = TranspositionTable(table_mb)
+
+    stats = SearchStats()
+
+    def run_search():
+        if engine == "negamax":
+            # the AI is the side to move
+            ai_move, _, _ = search.iterative_deepening(chessboard, 1 - player_colour, time_budget, max_depth,
+                                                       table=_search_table, stats=stats, null_move=pruning,
+                                                       reductions=pruning, workers=workers)
+            return ai_move
+
+        return choice(iterative_deepening(chessboard, player_colour, time_budget,
+                      max_depth, table=_search_table, stats=stats, workers=workers))
+
+    if profile_path is None:
+        return run_search(), stats
+
+    profile = cProfile.Profile()
+    ai_move = profile.runcall(run_search)
+    profile.dump_stats(profile_path)
+
+    return ai_move, stats
+
+
+if __name__ == "__main__":
+    import time
+
+    from game import Game_AI
+
+    # checks both pools find a legal move for a game, and that the process pool returns while the search runs
+    game = Game_AI(3, backend="bitboard")
+
+    for kind in ("local", "process"):
+        pool = create_pool(kind)
+
+        time_before = time.perf_counter()
+        future = pool.submit(search_move, type(game.chess).__name__, game.chess.moves_played(), 1, "negamax",
+                             game.time_budget, game.max_depth, game.pruning, 1)
+        submit_time = time.perf_counter() - time_before
+
+        ai_move, stats = future.result()
+        coord, (end_coord, special_move) = ai_move
+        assert (end_coord, special_move) in game.chess.get_legal_moves(coord), ai_move
+        assert stats.depth >= 1 and 0 < stats.elapsed <= time.perf_counter() - time_before
+
+        print(f"{kind}: submit returned after {submit_time:.3f}s, move {ai_move} after {time.perf_counter() - time_before:.3f}s")
+        print(f"  {stats}")
+
+        pool.shutdown()
+
+    # checks the profile of a search of each engine is written and can be read by pstats
+    import os
+    import pstats
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as directory:
+        for engine in ("minimax", "negamax"):
+            profile_path = os.path.join(directory, f"{engine}.prof")
+            ai_move, stats = search_move(type(game.chess).__name__, game.chess.moves_played(), 1, engine,
+                                         game.time_budget, game.max_depth, game.pruning, 1, None, None, profile_path)
+
+            profile_stats = pstats.Stats(profile_path)
+            assert stats.nodes > 0 and stats.leaf_evaluations > 0 and stats.legal_move_calls > 0
+
+            print(f"{engine}: {profile_stats.total_calls} calls profiled in {profile_stats.total_tt:.3f}s, {stats}")
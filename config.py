@@ -8,13 +8,12 @@ class Config:
     # specifies which type of session interface to use
     SESSION_TYPE = os.environ.get("SESSION_TYPE")
 
-    # the database URI that should be used for the connection
+    # the database URI that should be used for the connection. It is checked by app.py, so the modules that only read
+    # the AI settings can import the config without a database
     uri = os.environ.get('DATABASE_URL')
     if uri and uri.startswith("postgres://"):
         uri = uri.replace("postgres://", "postgresql://", 1)
-        SQLALCHEMY_DATABASE_URI = uri
-    else:
-        raise ValueError("Incorrectly formatted postgres URL")
+    SQLALCHEMY_DATABASE_URI = uri
 
     # Flask-SQLAlchemy will not track modification of objects and emit signals
     SQLALCHEMY_TRACK_MODIFICATIONS = False
@@ -24,3 +23,50 @@ class Config:
     MYSQL_USER = os.environ.get("MYSQL_USER")
     MYSQL_PASSWORD = os.environ.get("MYSQL_PASSWORD")
     MYSQL_DB = os.environ.get("MYSQL_DB")
+
+    # chessboard implementation of the games against the AI, "bitboard" or "mailbox". The bitboard generates moves about
+    # three times as fast (python perft.py suite) and searches about twice as many nodes per second
+    # (python benchmark.py backends)
+    AI_BACKEND = os.environ.get("AI_BACKEND", "bitboard")
+
+    # search engine of the games against the AI when none is chosen, one of game.ENGINES. The negamax engine searches
+    # about twice as many nodes per second as minimax (python benchmark.py engines)
+    AI_ENGINE = os.environ.get("AI_ENGINE", "negamax")
+
+    # memory budget in megabytes of the transposition table of each process that runs AI searches
+    TRANSPOSITION_TABLE_MB = float(
+        os.environ.get("TRANSPOSITION_TABLE_MB", 16))
+
+    # number of processes either engine searches with on the hardest difficulty, using lazy SMP when above 1
+    AI_WORKERS = int(os.environ.get("AI_WORKERS", 1))
+
+    # where the AI searches run: "process" for a pool of worker processes, "local" to run them in the web worker, which
+    # then serves no other socket until the search ends. Under the Procfile's gevent worker with 4 AI games searching,
+    # loadtest.py measured a median reply of 17-20ms to the other sockets with the process pool and 8.6s with local
+    COMPUTE_POOL = os.environ.get("COMPUTE_POOL", "process")
+
+    # number of AI searches that can run at the same time in the process pool
+    COMPUTE_WORKERS = int(os.environ.get("COMPUTE_WORKERS", 2))
+
+    # directory the cProfile statistics of an AI search are written to when its request asks for them, see
+    # compute.search_move. Empty turns profiling off
+    AI_PROFILE_DIR = os.environ.get("AI_PROFILE_DIR", "")
+
+    # seconds between checks of whether an AI search has finished
+    COMPUTE_POLL_INTERVAL = float(os.environ.get("COMPUTE_POLL_INTERVAL", 0.05))
+
+    # book file the AI plays its first moves from without searching, see book.py. Set to an empty path to turn it off
+    OPENING_BOOK = os.environ.get("OPENING_BOOK", os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "books", "openings.bin"))
+
+    # number of games each web worker keeps in memory, see registry.py
+    GAME_REGISTRY_SIZE = int(os.environ.get("GAME_REGISTRY_SIZE", 1000))
+
+    # seconds a changed game can wait before it is written to the database
+    GAME_FLUSH_INTERVAL = float(os.environ.get("GAME_FLUSH_INTERVAL", 5.0))
+
+    # number of changed games that are written to the database together
+    GAME_FLUSH_BATCH = int(os.environ.get("GAME_FLUSH_BATCH", 64))
+
+    # whether a response to a client that is up to date only sends the squares that changed instead of the whole position
+    DELTA_PAYLOADS = os.environ.get("DELTA_PAYLOADS", "1") == "1"
@@ -0,0 +1,46 @@
+# Piece values, indexed by the piece type indices of the zobrist and bitboard modules
+# (pawn, knight, bishop, rook, queen, king)
+PIECE_VALUES = [1, 3, 3, 5, 9, 1000]
+
+# PIECE_SQUARE_VALUES[colour][piece type][square index]: what a piece on a square adds to the material
+# balance, positive for white and negative for black. The chessboards keep the balance as a running total,
+# so every square has the piece's value for now and positional terms only need to be added to this table.
+PIECE_SQUARE_VALUES = [[[value * sign] * 64 for value in PIECE_VALUES]
+                       for sign in (1, -1)]
+
+
+def material_balance(pieces):
+    """Adds up the material balance of a position from scratch
+
+    Args:
+        pieces (iterable of tuple): (colour, piece type index, square index) of every piece on the chessboard
+
+    Returns:
+        int: material of white minus the material of black
+    """
+    return sum(PIECE_SQUARE_VALUES[colour][piece_type][sq] for colour, piece_type, sq in pieces)
+
+
+if __name__ == "__main__":
+    from benchmark import random_line
+    from game import BACKENDS
+
+    # checks the running material balance against the balance computed from scratch,
+    # and that both chessboard implementations agree
+    for seed in range(10):
+        line = random_line(BACKENDS["bitboard"], 200, seed)
+        boards = [chessboard_class() for chessboard_class in BACKENDS.values()]
+
+        for move in line:
+            for chess in boards:
+                chess.move_and_special_moves(*move)
+                assert chess.material == chess.compute_material()
+
+            assert len({chess.material for chess in boards}) == 1
+
+        for _ in line:
+            for chess in boards:
+                chess.undo_move()
+                assert chess.material == chess.compute_material()
+
+        print(f"game {seed}: {len(line)} moves, material balances match")
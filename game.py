@@ -1,4 +1,44 @@
+from bitboard import Bitboard
 from chessboard import Chessboard
+from config import Config
+from position import pack_moves, unpack, unpack_moves
+
+# chessboard implementations a game can be played on
+BACKENDS = {"mailbox": Chessboard, "bitboard": Bitboard}
+
+# (time budget in seconds, maximum depth, pruning) of the AI's search for each difficulty level.
+# With pruning, the negamax engine uses null move pruning and late move reductions to search deeper in the same time.
+DIFFICULTY_LEVELS = {1: (0.25, 1, False), 2: (1.0, 2, False), 3: (3.0, None, True)}
+
+# search engines the AI can use: the minimax search of the ai module, or the negamax search of the search module
+ENGINES = ("minimax", "negamax")
+
+# algebraic notation of every square by square index, y * 8 + x
+SQUARE_NAMES = [Chessboard.coord_to_notation((sq % 8, sq // 8)) for sq in range(64)]
+
+# string of each legal move (end coord, special move) in the available moves dictionary, e.g. "a42" or "e8"
+MOVE_STRINGS = {((sq % 8, sq // 8), special_move): SQUARE_NAMES[sq] + str(special_move or '')
+                for sq in range(64) for special_move in (None, 1, 2, 3, 4, 5)}
+
+
+def position_hash(position):
+    """Hashes a position dictionary the same way the client does after applying a delta, so the client can tell
+    whether its board shows the game's position. It is the 32-bit FNV-1a hash of each square and its piece followed
+    by ";", in square name order, e.g. "a1wR;a2wP;".
+
+    Args:
+        position (dict): piece on each occupied square, see Game.position_dictionary
+
+    Returns:
+        str: the hash as 8 hexadecimal digits
+    """
+    value = 0x811C9DC5
+
+    for square in sorted(position):
+        for char in f"{square}{position[square]};":
+            value = (value ^ ord(char)) * 0x01000193 & 0xFFFFFFFF
+
+    return format(value, "08x")
 
 
 class Game:
@@ -6,14 +46,75 @@ class Game:
     Can be considered as an offline multiplayer game
     """
 
-    def __init__(self):
-        self.chess = Chessboard()
+    def __init__(self, backend=None):
+        if backend is None:
+            backend = "mailbox"
+
+        self.backend = backend
+        self.chess = BACKENDS[backend]()
         # colour of the current turn (0 = white, 1 = black)
         self.current_turn = 0
         self.winner = None  # colour of winner or "draw"
         self.is_checkmate = False
         self.is_draw = False
 
+        # (zobrist key, legal moves by coordinate, available moves dictionary, position dictionary) of the position
+        # they were generated in, so the moves of a position are generated once however many methods need them
+        self.position_cache = None
+
+    def cached_position(self):
+        """Gets the legal moves of the side to move and the pieces of the current position, generating them if the
+        position changed since they were last generated. A move or an undo changes the zobrist key, which
+        invalidates the cache.
+
+        Returns:
+            tuple: (zobrist key, legal moves by coordinate, available moves dictionary, position dictionary).
+                The dictionaries are shared by every call for the position, so they must not be changed.
+        """
+        if self.position_cache is None or self.position_cache[0] != self.chess.zobrist_key:
+            legal_moves = {}
+            all_legal_moves = {}  # {"a1": [], "a2": ["a31", "a42"], ...}
+            positions = {}
+
+            for num_row in range(8):
+                for num_column in range(8):
+                    coord = (num_column, num_row)
+                    square = self.chess.get_square(coord)
+
+                    # if square is not empty
+                    if square != 0:
+                        notation = SQUARE_NAMES[num_row * 8 + num_column]
+                        positions[notation] = str(square)
+
+                        # only the side to move can play, so the other side's moves are not generated
+                        if square.colour == self.current_turn:
+                            legal_moves[coord] = self.chess.get_legal_moves(coord)
+
+                            # the move strings are the end square followed by the special move type number
+                            all_legal_moves[notation] = [MOVE_STRINGS[legal_move] for legal_move in legal_moves[coord]]
+
+            self.position_cache = (self.chess.zobrist_key,
+                                   legal_moves, all_legal_moves, positions)
+
+        return self.position_cache
+
+    def checkmate_or_draw(self):
+        """Checks whether the side to move is in a checkmate or a draw, the same as the chessboard's
+        is_checkmate_or_draw but with the cached legal moves
+
+        Returns:
+            bool/str: False, 'checkmate' or 'draw'
+        """
+        _, legal_moves, _, _ = self.cached_position()
+
+        if any(legal_moves.values()):
+            return False
+
+        if self.chess.is_in_check(self.current_turn):
+            return "checkmate"
+
+        return "draw"
+
     def change_current_turn(self):
         if self.current_turn == 0:
             self.current_turn = 1
@@ -61,7 +162,7 @@ class Game:
             special_move = int(move[-1])
 
         # If the move is legal, make the move, and add it to the history of moves
-        if end_coord in [legal_move[0] for legal_move in self.chess.get_legal_moves(start_coord)]:
+        if end_coord in [legal_move[0] for legal_move in self.cached_position()[1].get(start_coord, [])]:
             self.chess.move_and_special_moves(
                 start_coord, end_coord, special_move)
             # once move is executed, change the turn
@@ -70,8 +171,7 @@ class Game:
             return None
 
         # checks the opposing side if they have any legal_moves to make. If they don't then its end game.
-        is_checkmate_or_draw = self.chess.is_checkmate_or_draw(
-            self.current_turn)
+        is_checkmate_or_draw = self.checkmate_or_draw()
 
         # print(self.current_turn, str(is_checkmate_or_draw))
 
@@ -93,63 +193,141 @@ class Game:
         return self.available_moves_dictionary()
 
     def available_moves_dictionary(self):
-        """Returns a dictionary containing the start and end coordinates of all legal moves
+        """Returns a dictionary containing the start and end coordinates of all legal moves of the side to move.
+        The other side's pieces have no entry, the front end only lets the side to move pick up its pieces.
 
         Returns:
             dict: dictionary containing the from and to coordinates of all legal moves
         """
+        return self.cached_position()[2]
 
-        all_legal_moves = {}  # {"a1": [], "a2": ["a31", "a42"], ...}
-
-        for num_row, row in enumerate(self.chess.chessboard):
-            for num_column, _ in enumerate(row):
-                coord = (num_column, num_row)
-                square = self.chess.get_square(coord)
-
-                # if square is not empty
-                if square != 0:
+    def position_dictionary(self):
+        """Generates a dictionary the algebraic coordinate of where each piece is
 
-                    legal_moves = self.chess.get_legal_moves(
-                        coord)
+        Returns:
+            dict: dictionary where the keys are the algebriac coorindates and the values are the corresponding piece name and colours initials on that square
+        """
+        return self.cached_position()[3]
 
-                    # converts each legal move to string format and adds the special move type number to the end of the string
-                    legal_moves_string = [
-                        self.chess.coord_to_notation(coord) + str((special_move or '')) for coord, special_move in legal_moves
-                    ]
+    def version(self):
+        """Gets the number of moves played in the game, which tells the client whether a delta applies to the
+        position it shows
 
-                    all_legal_moves[self.chess.coord_to_notation(
-                        coord)] = legal_moves_string
+        Returns:
+            int: the version of the game
+        """
+        return self.chess.first_ply + self.chess.ply
 
-        return all_legal_moves
+    def state_payload(self, since=None):
+        """Gets the payload of an available_moves_response: the legal moves, the game information and either the
+        whole position or only the squares that changed since a position the client already shows
 
-    def position_dictionary(self):
-        """Generates a dictionary the algebraic coordinate of where each piece is
+        Args:
+            since (tuple, optional): (version, position dictionary) of the position the client shows.
+                Defaults to None, a full snapshot of the position.
 
         Returns:
-            dict: dictionary where the keys are the algebriac coorindates and the values are the corresponding piece name and colours initials on that square
+            dict: the payload. A snapshot has the 'position', a delta has the 'base' version it applies to and the
+                'changes', the piece on each changed square or None for a square that was emptied. Both have the
+                'version' and the 'hash' of the new position, see position_hash.
         """
+        information = {'current_turn': self.current_turn,
+                       'winner': self.winner, 'checkmate': self.is_checkmate, 'draw': self.is_draw}
+
+        position = self.position_dictionary()
 
-        positions = {}
+        payload = {'available_moves': self.available_moves_dictionary(), 'information': information,
+                   'version': self.version(), 'hash': position_hash(position)}
 
-        for num_row, row in enumerate(self.chess.chessboard):
-            for num_column, _ in enumerate(row):
-                coord = (num_column, num_row)
-                square = self.chess.get_square(coord)
+        if since is None:
+            payload['position'] = position
+        else:
+            base_version, base_position = since
 
-                if square != 0:
-                    positions[self.chess.coord_to_notation(
-                        coord)] = str(square)
+            payload['base'] = base_version
+            payload['changes'] = {square: position.get(square) for square in base_position.keys() | position.keys()
+                                  if base_position.get(square) != position.get(square)}
 
-        return positions
+        return payload
+
+    def to_record(self):
+        """Gets the record of the game stored in the database. It holds the packed position the game started from,
+        None for the initial layout, and the moves played from it at 2 bytes a move, so a loaded game can undo its
+        moves and has the keys of its earlier positions. The packed current position is kept too, to check the
+        moves against.
+
+        Returns:
+            dict: the record, see load_game
+        """
+        return {'backend': self.backend, 'start': self.chess.start_position,
+                'start_ply': self.chess.first_ply + self.chess.setup_plies, 'moves': pack_moves(self.chess.moves_played()),
+                'position': self.chess.to_bytes(), 'ply': self.chess.first_ply + self.chess.ply, 'winner': self.winner,
+                'checkmate': self.is_checkmate, 'draw': self.is_draw}
 
 
 class Game_AI(Game):
-    def __init__(self, depth):
+    def __init__(self, depth, backend=None, engine=None):
         # initialises the attributes of the superclass
-        super().__init__()
+        super().__init__(backend)
+
+        if engine is None:
+            engine = Config.AI_ENGINE
 
+        # difficulty level
         self.depth = depth
 
+        # search engine of the AI, one of ENGINES
+        self.engine = engine
+
+        # the AI searches deeper until the time budget runs out
+        self.time_budget, self.max_depth, self.pruning = DIFFICULTY_LEVELS[depth]
+
+    def to_record(self):
+        """Gets the record of the game stored in the session, see Game.to_record
+
+        Returns:
+            dict: the record, see load_game
+        """
+        record = super().to_record()
+        record['depth'] = self.depth
+        record['engine'] = self.engine
+
+        return record
+
+
+def load_game(record):
+    """Sets up the game a record was made from
+
+    Args:
+        record (dict): the record made by to_record
+
+    Raises:
+        ValueError: if the moves of the record do not lead to its position
+
+    Returns:
+        Game/Game_AI: the game, a Game_AI if the record has a difficulty level
+    """
+    if 'depth' in record:
+        game = Game_AI(record['depth'], record['backend'], record['engine'])
+    else:
+        game = Game(record['backend'])
+
+    if record['start'] is not None:
+        game.chess.set_position(*unpack(record['start']), record['start_ply'])
+
+    for move in unpack_moves(record['moves']):
+        game.chess.move_and_special_moves(*move)
+
+    if game.chess.to_bytes() != record['position'] or game.chess.first_ply + game.chess.ply != record['ply']:
+        raise ValueError("The moves of the record do not lead to its position.")
+
+    game.current_turn = game.chess.turn
+    game.winner = record['winner']
+    game.is_checkmate = record['checkmate']
+    game.is_draw = record['draw']
+
+    return game
+
 
 if __name__ == "__main__":
     game = Game()
@@ -164,3 +342,107 @@ if __name__ == "__main__":
     print(game.winner, game.is_checkmate)
     game.end_game(2, 'draw')
     print(game.winner, game.is_draw)
+
+    import pickle
+    import random
+
+    # plays random games, storing and loading the record after every move like the socket handlers do, and checks
+    # the loaded game always matches a game that was never stored
+    rng = random.Random(0)
+
+    for backend in BACKENDS:
+        played = Game_AI(3, backend=backend, engine="negamax")
+        record = played.to_record()
+        sizes = []
+
+        for _ in range(150):
+            stored = load_game(record)
+            moves = played.available_moves_dictionary()
+
+            assert stored.available_moves_dictionary() == moves
+            assert stored.position_dictionary() == played.position_dictionary()
+            assert stored.chess.zobrist_key == played.chess.zobrist_key
+            assert stored.chess.to_fen() == played.chess.to_fen()
+            assert stored.chess.moves_played() == played.chess.moves_played()
+            assert stored.chess.key_stack[:stored.chess.ply] == played.chess.key_stack[:played.chess.ply]
+
+            if played.winner is not None:
+                break
+
+            move = rng.choice([source + target for source, targets in moves.items() for target in targets
+                               if played.chess.get_square(played.chess.notation_to_coord(source)).colour == played.current_turn])
+            played.next_move(move)
+            stored.next_move(move)
+
+            record = stored.to_record()
+            sizes.append((len(pickle.dumps(record)), len(pickle.dumps(played))))
+
+        print(f"{backend}: {len(sizes)} moves, pickled record {sizes[0][0]} to {max(size for size, _ in sizes)} bytes, "
+              f"pickled game {sizes[0][1]} to {sizes[-1][1]} bytes")
+
+        # a loaded game can take back its moves back to the start
+        stored = load_game(record)
+
+        while stored.chess.ply:
+            stored.chess.undo_move()
+            played.chess.undo_move()
+            assert stored.chess.to_bytes() == played.chess.to_bytes()
+
+    # a game set up from a position keeps it as its start, with the moves played after it
+    game = Game(backend="bitboard")
+    game.chess.set_position(*unpack(game.chess.to_bytes()), 10)
+    game.next_move("e2e42")
+    stored = load_game(game.to_record())
+    assert stored.chess.to_fen() == game.chess.to_fen() and stored.chess.moves_played() == game.chess.moves_played()
+    stored.chess.undo_move()
+    assert stored.chess.to_bytes() == game.chess.start_position
+
+    # checks a move and the dictionaries sent back after it generate the legal moves once per piece of the side to move
+    game = Game()
+    game.available_moves_dictionary()
+    calls = []
+    get_legal_moves = game.chess.get_legal_moves
+    game.chess.get_legal_moves = lambda coord: calls.append(coord) or get_legal_moves(coord)
+
+    for move in ("e2e42", "e7e52", "g1f3", "b8c6", "f1b5"):
+        calls.clear()
+        game.next_move(move)
+        game.available_moves_dictionary()
+        game.position_dictionary()
+
+        assert len(calls) == len(set(calls)) == len(game.available_moves_dictionary()) == 16, (move, len(calls))
+
+    print(f"{len(calls)} calls to get_legal_moves for a move with {len(game.position_dictionary())} pieces on the board")
+
+    import json
+
+    # applies the delta payloads of a random game the way the client does, checking the client's position stays the
+    # same as the game's, and compares their size with full snapshots
+    game = Game_AI(3, backend="bitboard")
+    client_position = game.state_payload()['position']
+    client_version = game.version()
+    full_bytes = delta_bytes = 0
+
+    for _ in range(100):
+        since = (client_version, game.position_dictionary())
+        moves = game.available_moves_dictionary()
+        options = [source + target for source, targets in moves.items() for target in targets]
+
+        if not options:
+            break
+
+        game.next_move(rng.choice(options))
+        payload = game.state_payload(since)
+
+        assert payload['base'] == client_version
+        client_position = {square: piece for square, piece in {**client_position, **payload['changes']}.items()
+                           if piece is not None}
+        client_version = payload['version']
+
+        assert client_position == game.position_dictionary()
+        assert position_hash(client_position) == payload['hash']
+
+        delta_bytes += len(json.dumps(payload))
+        full_bytes += len(json.dumps(game.state_payload()))
+
+    print(f"delta payloads {delta_bytes} bytes, full snapshots {full_bytes} bytes")
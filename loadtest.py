@@ -0,0 +1,174 @@
+"""Load test of a running server: measures how long other sessions wait for a reply while AI searches run.
+
+Probe sessions play pass and play games and time the round trip of each available_moves event. AI sessions play
+against the hardest AI, answering each AI move with a random legal move. The probes are timed on their own first,
+then while the AI sessions search. With the searches in the compute pool the probe latency stays flat, with
+COMPUTE_POOL=local each probe waits for the searches running in the web worker.
+
+The socket.io client's dependencies are in requirements.txt.
+
+Usage:
+    python loadtest.py --url http://localhost:5000 --ai-sessions 4 --probes 4 --seconds 20
+
+Measured against the Procfile's command on one CPU with the default settings, the probe round trips were:
+
+    COMPUTE_POOL   probes alone   probes during AI load
+    process        median 6.6ms   median 16.9-19.7ms, p95 35-37ms, max 92ms
+    local          median 6.6ms   median 8569ms, p95 8913ms, and only 16 replies in 20 seconds
+"""
+import argparse
+import random
+import statistics
+import threading
+import time
+
+import requests
+import socketio
+
+
+class Session:
+    """Browser session: a cookie from the game page and a socket.io connection using it
+    """
+
+    def __init__(self, url, path):
+        self.http = requests.Session()
+        self.http.get(url + path).raise_for_status()
+
+        self.socket = socketio.Client(http_session=self.http)
+        self.replies = threading.Event()
+        self.response = None
+
+        self.socket.on('available_moves_response', self.on_response)
+
+        self.socket.connect(url)
+
+    def on_response(self, response):
+        self.response = response
+        self.replies.set()
+
+    def disconnect(self):
+        self.socket.disconnect()
+
+
+def probe(url, stop, latencies):
+    """Plays a pass and play game, timing the reply to each request for the legal moves
+
+    Args:
+        url (str): address of the server
+        stop ('threading.Event' object): set to end the probe
+        latencies (list of float): the round trip times in seconds are added to it
+    """
+    session = Session(url, '/game-pass-and-play')
+
+    while not stop.is_set():
+        session.replies.clear()
+
+        time_before = time.perf_counter()
+        session.socket.emit('available_moves')
+
+        if session.replies.wait(60):
+            latencies.append(time.perf_counter() - time_before)
+
+        time.sleep(0.1)
+
+    session.disconnect()
+
+
+def ai_game(url, stop, ai_moves):
+    """Plays against the hardest AI with random moves until the game ends or the test stops
+
+    Args:
+        url (str): address of the server
+        stop ('threading.Event' object): set to end the game
+        ai_moves (list of float): the time each AI move took in seconds is added to it
+    """
+    # the player is black, so the AI moves first
+    player_colour = 1
+    session = Session(url, '/game-ai?depth=3')
+
+    while not stop.is_set():
+        session.replies.clear()
+
+        time_before = time.perf_counter()
+        session.socket.emit('ai_moves', player_colour)
+
+        if not session.replies.wait(60):
+            break
+
+        ai_moves.append(time.perf_counter() - time_before)
+
+        information = session.response['information']
+
+        if information['checkmate'] or information['draw']:
+            break
+
+        # a random legal move of one of the player's pieces
+        position = session.response['position']
+        moves = [source + move for source, source_moves in session.response['available_moves'].items()
+                 for move in source_moves if position.get(source, '').startswith('b')]
+
+        session.replies.clear()
+        session.socket.emit('available_moves', random.choice(moves))
+
+        if not session.replies.wait(60):
+            break
+
+    session.disconnect()
+
+
+def run(url, probes, ai_sessions, seconds):
+    """Runs the probe sessions, and the AI sessions if there are any, for a number of seconds
+
+    Args:
+        url (str): address of the server
+        probes (int): number of probe sessions
+        ai_sessions (int): number of AI sessions
+        seconds (float): length of the run
+
+    Returns:
+        tuple of (list of float, list of float): the probe latencies and the AI move times
+    """
+    stop = threading.Event()
+    latencies = []
+    ai_moves = []
+
+    threads = [threading.Thread(target=probe, args=(url, stop, latencies)) for _ in range(probes)]
+    threads += [threading.Thread(target=ai_game, args=(url, stop, ai_moves)) for _ in range(ai_sessions)]
+
+    for thread in threads:
+        thread.start()
+
+    time.sleep(seconds)
+    stop.set()
+
+    for thread in threads:
+        thread.join()
+
+    return latencies, ai_moves
+
+
+def summary(times):
+    if not times:
+        return "no replies"
+
+    times = sorted(times)
+    p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+
+    return (f"{len(times):5} replies  median {statistics.median(times) * 1000:8.1f}ms  "
+            f"p95 {p95 * 1000:8.1f}ms  max {times[-1] * 1000:8.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--probes", type=int, default=4)
+    parser.add_argument("--ai-sessions", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=20)
+    arguments = parser.parse_args()
+
+    latencies, _ = run(arguments.url, arguments.probes, 0, arguments.seconds)
+    print(f"probes alone:          {summary(latencies)}")
+
+    latencies, ai_moves = run(arguments.url, arguments.probes, arguments.ai_sessions, arguments.seconds)
+    print(f"probes during AI load: {summary(latencies)}")
+    print(f"AI moves:              {summary(ai_moves)}")
@@ -0,0 +1,443 @@
+"""Parallel searches using a pool of worker processes.
+
+Root splitting spreads the root moves of the minimax search across the workers. Lazy SMP has every worker search the
+whole position with a slightly different move order, sharing what they find through a transposition table in shared
+memory, with either search engine.
+
+Each task sends the worker the chessboard class name and the moves played from the starting position instead of
+the pickled chessboard. A worker keeps its chessboard between tasks, so it only undoes and plays the moves that differ.
+"""
+import atexit
+import math
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+
+import search
+from ai import MoveOrdering, SearchLimits, SearchTimeout, maximise, minimise, staged_moves
+from bitboard import Bitboard
+from chessboard import Chessboard
+from transposition import SharedTranspositionTable, TranspositionTable
+
+# chessboard classes a worker can set up, by class name
+CHESSBOARD_CLASSES = {chessboard_class.__name__: chessboard_class
+                      for chessboard_class in (Chessboard, Bitboard)}
+
+# memory budget of the transposition table of each worker process in megabytes
+WORKER_TABLE_MB = 4
+
+# number of tasks each worker is given on average, more tasks balance the work better but share the bound less often
+TASKS_PER_WORKER = 4
+
+# memory budget of the transposition table shared by the lazy SMP search in megabytes
+SHARED_TABLE_MB = 16
+
+# process pools by number of workers, created once per process as starting the worker processes is slow
+_pools = {}
+
+# transposition table shared with the lazy SMP helpers, and the byte set to stop them, created once per process
+_shared_table = None
+_stop_flag = None
+
+# chessboard and transposition table of a worker process
+_worker_chessboard = None
+_worker_table = None
+
+# the shared table and stop flag a worker process is attached to
+_worker_shared_table = None
+_worker_stop_flag = None
+
+
+def get_pool(workers):
+    """Gets the process pool with a number of workers, creating it the first time
+
+    Args:
+        workers (int): number of worker processes
+
+    Returns:
+        'concurrent.futures.ProcessPoolExecutor' object: the process pool
+    """
+    # spawned rather than forked, the search can run in a web worker that gevent has patched, see compute.py
+    if workers not in _pools:
+        _pools[workers] = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+
+    return _pools[workers]
+
+
+def shutdown_pools():
+    """Stops the worker processes of every pool
+    """
+    global _shared_table, _stop_flag
+
+    for pool in _pools.values():
+        pool.shutdown()
+
+    _pools.clear()
+
+    # the workers have exited, so the shared memory can be freed
+    if _shared_table is not None:
+        _shared_table.close()
+        _shared_table.unlink()
+        _stop_flag.close()
+        _stop_flag.unlink()
+
+        _shared_table = None
+        _stop_flag = None
+
+
+def set_up_position(chessboard_class_name, moves, start_position=None):
+    """Sets up the worker's chessboard with the moves played from the starting position. The moves the chessboard
+    already shares with the position are kept.
+
+    Args:
+        chessboard_class_name (str): name of the chessboard class
+        moves (list of tuple): (start coord, end coord, special move) of each move from the starting position
+        start_position (NoneType/bytes, optional): packed position the moves are played from, the start_position
+            attribute of the chessboard. Defaults to None (the initial layout).
+
+    Returns:
+        object: the worker's chessboard
+    """
+    global _worker_chessboard, _worker_table
+
+    chessboard_class = CHESSBOARD_CLASSES[chessboard_class_name]
+
+    if type(_worker_chessboard) is not chessboard_class:
+        _worker_chessboard = chessboard_class()
+        _worker_table = TranspositionTable(WORKER_TABLE_MB)
+
+    # a game set up from another position shares none of its moves with the worker's chessboard
+    if _worker_chessboard.start_position != start_position:
+        if start_position is None:
+            _worker_chessboard = chessboard_class()
+        else:
+            _worker_chessboard = chessboard_class.from_bytes(start_position)
+
+    chessboard = _worker_chessboard
+    played = chessboard.moves_played()
+
+    shared = 0
+    while shared < len(played) and shared < len(moves) and played[shared][:2] == tuple(moves[shared][:2]):
+        shared += 1
+
+    for _ in range(len(played) - shared):
+        chessboard.undo_move()
+
+    for move in moves[shared:]:
+        chessboard.move_and_special_moves(*move)
+
+    return chessboard
+
+
+def search_root_moves(chessboard_class_name, moves, root_moves, depth, player_colour, alpha, quiescence, start_position=None):
+    """Searches some of the root moves in a worker process
+
+    Args:
+        chessboard_class_name (str): name of the chessboard class
+        moves (list of tuple): (start coord, end coord, special move) of each move from the starting position
+        root_moves (list of tuple): (start coord, (end coord, special move)) of the root moves to search
+        depth (int): depth of the root
+        player_colour (int): player's side colour
+        alpha (int/inf): the best evaluation found by earlier tasks, less one so equally good moves are searched exactly
+        quiescence (bool): whether to search captures past the depth limit
+        start_position (NoneType/bytes, optional): packed position the moves are played from. Defaults to None.
+
+    Returns:
+        list of tuple: (root move, score) of each root move. A score no greater than alpha is only an upper bound.
+    """
+    chessboard = set_up_position(chessboard_class_name, moves, start_position)
+    _worker_table.new_search()
+    ordering = MoveOrdering()
+    results = []
+
+    for coord, move in root_moves:
+        chessboard.move_and_special_moves(coord, move[0], move[1])
+        score = minimise(chessboard, depth - 1, alpha, math.inf, player_colour,
+                         _worker_table, None, ordering, None, quiescence)
+        chessboard.undo_move()
+
+        results.append(((coord, move), score))
+
+        # a better move raises the bound of the moves after it
+        alpha = max(alpha, score - 1)
+
+    return results
+
+
+def root_split_minimax(chessboard, depth, player_colour, workers, quiescence=False):
+    """Searches the root moves of the minimax search in a pool of worker processes. The first move is searched on its
+    own to find a bound, then the other moves are handed out in batches, each batch with the best bound found so far.
+
+    Args:
+        chessboard ('chessboard.Chessboard' object): instance of the Chessboard class
+        depth (int): the maximum depth to traverse the tree
+        player_colour (int): player's side colour
+        workers (int): number of worker processes
+        quiescence (bool, optional): whether to search captures past the depth limit. Defaults to False.
+
+    Returns:
+        list of tuple: every move with the best evaluation, the same as ai.minimax
+    """
+    pool = get_pool(workers)
+    chessboard_class_name = type(chessboard).__name__
+    moves = chessboard.moves_played()
+
+    # the root moves in the order the search would try them
+    root_moves = list(staged_moves(chessboard, 1 - player_colour, None, MoveOrdering()))
+
+    if not root_moves:
+        return []
+
+    batch_size = max(1, math.ceil(
+        (len(root_moves) - 1) / (workers * TASKS_PER_WORKER)))
+    batches = [root_moves[index:index + batch_size]
+               for index in range(1, len(root_moves), batch_size)]
+
+    results = pool.submit(search_root_moves, chessboard_class_name, moves, root_moves[:1],
+                          depth, player_colour, -math.inf, quiescence, chessboard.start_position).result()
+    best_score = results[0][1]
+
+    running = set()
+
+    while batches or running:
+        # keep every worker busy, each new batch searching with the best bound so far
+        while batches and len(running) < workers:
+            running.add(pool.submit(search_root_moves, chessboard_class_name, moves, batches.pop(0),
+                                    depth, player_colour, best_score - 1, quiescence, chessboard.start_position))
+
+        done, running = wait(running, return_when=FIRST_COMPLETED)
+
+        for future in done:
+            for root_move, score in future.result():
+                results.append((root_move, score))
+                best_score = max(best_score, score)
+
+    return [root_move for root_move, score in results if score == best_score]
+
+
+class StopFlagLimits(SearchLimits):
+    """Search limits of a lazy SMP helper, which searches until the main search sets the stop flag
+    """
+
+    def __init__(self, stop_flag):
+        super().__init__()
+
+        self.stop_flag = stop_flag
+
+    def count_node(self):
+        self.nodes += 1
+
+        if self.stop_flag.buf[0]:
+            raise SearchTimeout
+
+
+def get_shared_table():
+    """Gets the transposition table shared with the lazy SMP helpers, creating it and the stop flag the first time
+
+    Returns:
+        'transposition.SharedTranspositionTable' object: the shared table
+    """
+    global _shared_table, _stop_flag
+
+    if _shared_table is None:
+        _shared_table = SharedTranspositionTable(SHARED_TABLE_MB)
+        _stop_flag = shared_memory.SharedMemory(create=True, size=1)
+
+    return _shared_table
+
+
+def attach_shared_table(table_name, stop_flag_name):
+    """Attaches a worker process to the shared table and stop flag, reusing the attachment of earlier tasks
+
+    Args:
+        table_name (str): name of the shared memory of the table
+        stop_flag_name (str): name of the shared memory of the stop flag
+
+    Returns:
+        tuple: the shared table and the stop flag
+    """
+    global _worker_shared_table, _worker_stop_flag
+
+    if _worker_shared_table is None or _worker_shared_table.name != table_name:
+        if _worker_shared_table is None:
+            # a spawned worker runs the finalizers on exit, which cannot close memory the table still has a view of
+            atexit.register(close_worker_shared_table)
+        else:
+            close_worker_shared_table()
+
+        _worker_shared_table = SharedTranspositionTable(name=table_name)
+        _worker_stop_flag = shared_memory.SharedMemory(name=stop_flag_name)
+
+    return _worker_shared_table, _worker_stop_flag
+
+
+def close_worker_shared_table():
+    """Detaches a worker process from the shared table and stop flag
+    """
+    global _worker_shared_table, _worker_stop_flag
+
+    if _worker_shared_table is not None:
+        _worker_shared_table.close()
+        _worker_stop_flag.close()
+
+        _worker_shared_table = None
+        _worker_stop_flag = None
+
+
+def lazy_smp_helper(chessboard_class_name, moves, depth, player_colour, helper, table_name, stop_flag_name, generation, quiescence,
+                    start_position=None, engine="minimax", null_move=False, reductions=False):
+    """Searches the position in a worker process, only to fill the shared table, until the stop flag is set.
+    Each helper orders its quiet moves differently and odd helpers search one ply deeper, so the helpers
+    and the main search work on different parts of the tree.
+
+    Args:
+        chessboard_class_name (str): name of the chessboard class
+        moves (list of tuple): (start coord, end coord, special move) of each move from the starting position
+        depth (int): depth of the main search
+        player_colour (int): player's side colour, or the side to move for the negamax engine
+        helper (int): number of the helper, from 1
+        table_name (str): name of the shared memory of the table
+        stop_flag_name (str): name of the shared memory of the stop flag
+        generation (int): generation of the main search's entries in the shared table
+        quiescence (bool): whether to search captures past the depth limit
+        start_position (NoneType/bytes, optional): packed position the moves are played from. Defaults to None.
+        engine (str, optional): "minimax" or "negamax", the engine of the main search. Defaults to "minimax".
+        null_move (bool, optional): whether the negamax engine uses null move pruning. Defaults to False.
+        reductions (bool, optional): whether the negamax engine uses late move reductions. Defaults to False.
+
+    Returns:
+        int: number of nodes the helper searched
+    """
+    chessboard = set_up_position(chessboard_class_name, moves, start_position)
+    table, stop_flag = attach_shared_table(table_name, stop_flag_name)
+    table.generation = generation
+
+    start_ply = chessboard.ply
+    limits = StopFlagLimits(stop_flag)
+    ordering = MoveOrdering(helper)
+
+    try:
+        for helper_depth in range(1, depth + helper % 2 + 1):
+            if engine == "negamax":
+                search.negamax(chessboard, helper_depth, -math.inf, math.inf, player_colour, [], 0,
+                               table, limits, ordering, None, quiescence, null_move, reductions)
+            else:
+                maximise(chessboard, helper_depth, -math.inf, math.inf, player_colour, False,
+                         table, limits, ordering, None, quiescence)
+    except SearchTimeout:
+        # undo the moves of the unfinished search
+        while chessboard.ply > start_ply:
+            chessboard.undo_move()
+
+    return limits.nodes
+
+
+def lazy_smp_minimax(chessboard, depth, player_colour, workers, limits=None, ordering=None, stats=None, quiescence=False):
+    """Searches the position in this process while workers - 1 helper processes search it too, all sharing one
+    transposition table. The helpers fill the table with results the main search then finds instead of searching.
+    The result is the main search's, so it is the same as a search on its own would find.
+
+    Args:
+        chessboard ('chessboard.Chessboard' object): instance of the Chessboard class
+        depth (int): the maximum depth to traverse the tree
+        player_colour (int): player's side colour
+        workers (int): number of processes searching, including this one
+        limits ('ai.SearchLimits' object, optional): budget of the main search, the helpers stop with it. Defaults to None.
+        ordering ('ai.MoveOrdering' object, optional): move ordering of the main search. Defaults to None.
+        stats ('ai.SearchStats' object, optional): counters of the main search. Defaults to None.
+        quiescence (bool, optional): whether to search captures past the depth limit. Defaults to False.
+
+    Returns:
+        list of tuple: every move with the best evaluation, the same as ai.minimax
+    """
+    table = get_shared_table()
+    table.new_search()
+
+    helpers = start_helpers(chessboard, depth, player_colour, workers, table.generation, quiescence)
+
+    try:
+        return maximise(chessboard, depth, -math.inf, math.inf, player_colour, True,
+                        table, limits, ordering, stats, quiescence)
+    finally:
+        # the helpers are stopped even if the main search runs out of time
+        stop_helpers(helpers)
+
+
+def lazy_smp_search(chessboard, depth, colour, previous_score, workers, limits=None, ordering=None, stats=None,
+                    quiescence=True, null_move=False, reductions=False):
+    """Searches the position with the negamax engine's aspiration window in this process while workers - 1 helper
+    processes search it too, all sharing one transposition table, the same as lazy_smp_minimax
+
+    Args:
+        chessboard ('chessboard.Chessboard' object): instance of the Chessboard class
+        depth (int): the maximum depth to traverse the tree
+        colour (int): the side to move
+        previous_score (int): score of the search one ply shallower, that the aspiration window is centred on
+        workers (int): number of processes searching, including this one
+        limits ('ai.SearchLimits' object, optional): budget of the main search, the helpers stop with it. Defaults to None.
+        ordering ('ai.MoveOrdering' object, optional): move ordering of the main search. Defaults to None.
+        stats ('ai.SearchStats' object, optional): counters of the main search. Defaults to None.
+        quiescence (bool, optional): whether to search captures past the depth limit. Defaults to True.
+        null_move (bool, optional): whether to use null move pruning. Defaults to False.
+        reductions (bool, optional): whether to use late move reductions. Defaults to False.
+
+    Returns:
+        tuple of (NoneType/tuple, int, list): the best move, its score and the principal variation, the same as
+            search.aspiration_search
+    """
+    table = get_shared_table()
+
+    # one generation for the main search, all of its aspiration windows, and the helpers
+    table.new_search()
+
+    helpers = start_helpers(chessboard, depth, colour, workers, table.generation, quiescence, "negamax",
+                            null_move, reductions)
+
+    try:
+        return search.aspiration_search(chessboard, depth, colour, previous_score, table, limits, ordering, stats,
+                                        quiescence, null_move, reductions)
+    finally:
+        stop_helpers(helpers)
+
+
+def start_helpers(chessboard, depth, player_colour, workers, generation, quiescence, engine="minimax", null_move=False,
+                  reductions=False):
+    """Starts the lazy SMP helpers searching the position
+
+    Args:
+        chessboard ('chessboard.Chessboard' object): instance of the Chessboard class
+        depth (int): depth of the main search
+        player_colour (int): player's side colour, or the side to move for the negamax engine
+        workers (int): number of processes searching, including this one
+        generation (int): generation of the main search's entries in the shared table
+        quiescence (bool): whether to search captures past the depth limit
+        engine (str, optional): "minimax" or "negamax". Defaults to "minimax".
+        null_move (bool, optional): whether the negamax engine uses null move pruning. Defaults to False.
+        reductions (bool, optional): whether the negamax engine uses late move reductions. Defaults to False.
+
+    Returns:
+        list of 'concurrent.futures.Future' object: the helpers' tasks
+    """
+    if workers <= 1:
+        return []
+
+    pool = get_pool(workers - 1)
+    chessboard_class_name = type(chessboard).__name__
+    moves = chessboard.moves_played()
+    _stop_flag.buf[0] = 0
+
+    return [pool.submit(lazy_smp_helper, chessboard_class_name, moves, depth, player_colour, helper, _shared_table.name,
+                        _stop_flag.name, generation, quiescence, chessboard.start_position, engine, null_move,
+                        reductions)
+            for helper in range(1, workers)]
+
+
+def stop_helpers(helpers):
+    """Sets the stop flag and waits for the helpers to stop
+
+    Args:
+        helpers (list of 'concurrent.futures.Future' object): the helpers' tasks
+    """
+    if helpers:
+        _stop_flag.buf[0] = 1
+        wait(helpers)
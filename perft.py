@@ -0,0 +1,185 @@
+"""Perft: counts the leaf nodes of the tree of legal moves to a fixed depth, to check the move generation of the
+chessboards against the published counts and to measure its speed.
+
+The chessboards always promote to a queen, while the published counts have four moves for each promotion. With
+standard=True a promotion on the last ply is counted as four leaf nodes, which gives the published count as long as
+no promotion happens before the last ply. The suite only asserts the counts of those depths.
+
+Usage:
+    python perft.py perft 4 [--fen FEN] [--backend bitboard]
+    python perft.py divide 3 [--fen FEN] [--backend bitboard]
+    python perft.py suite [--backend bitboard] [--max-nodes 100000]
+"""
+import argparse
+import time
+
+from game import BACKENDS
+from position import STARTING_FEN
+
+# (name, FEN, {depth: published leaf node count}) of the standard perft positions, the depths being those where
+# promotions only happen on the last ply
+SUITE = [
+    ("start", STARTING_FEN,
+     {1: 20, 2: 400, 3: 8902, 4: 197281}),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     {1: 48, 2: 2039, 3: 97862}),
+    ("endgame", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624}),
+    ("position 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     {1: 6, 2: 264}),
+    ("position 5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     {1: 44}),
+    ("position 6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     {1: 46, 2: 2079, 3: 89890}),
+]
+
+
+def is_promotion(chessboard, coord, move):
+    """Checks whether a move promotes a pawn
+
+    Args:
+        chessboard ('chessboard.Chessboard' object): instance of the Chessboard class
+        coord (tuple): start coordinate of the move
+        move (tuple): (end coord, special move)
+
+    Returns:
+        bool: whether the move is a pawn reaching the last row
+    """
+    return move[0][1] in (0, 7) and chessboard.get_square(coord).name == "Pawn"
+
+
+def perft(chessboard, depth, standard=False):
+    """Counts the leaf nodes of the tree of legal moves
+
+    Args:
+        chessboard ('chessboard.Chessboard' object): instance of the Chessboard class
+        depth (int): number of plies
+        standard (bool, optional): whether a promotion on the last ply counts as four nodes, one for each piece it
+            could promote to. Defaults to False.
+
+    Returns:
+        int: number of leaf nodes
+    """
+    if depth == 0:
+        return 1
+
+    moves = chessboard.legal_moves()
+
+    # the moves of the last ply are counted without being made
+    if depth == 1:
+        if standard:
+            return len(moves) + 3 * sum(is_promotion(chessboard, coord, move) for coord, move in moves)
+
+        return len(moves)
+
+    nodes = 0
+
+    for coord, move in moves:
+        chessboard.move_and_special_moves(coord, *move)
+        nodes += perft(chessboard, depth - 1, standard)
+        chessboard.undo_move()
+
+    return nodes
+
+
+def divide(chessboard, depth, standard=False):
+    """Counts the leaf nodes under each move of the side to move, to find the move a wrong count comes from
+
+    Args:
+        chessboard ('chessboard.Chessboard' object): instance of the Chessboard class
+        depth (int): number of plies, including the move
+        standard (bool, optional): see perft. Defaults to False.
+
+    Returns:
+        list of tuple: (move in coordinate notation, e.g. "e2e4", number of leaf nodes)
+    """
+    results = []
+
+    for coord, move in chessboard.legal_moves():
+        notation = chessboard.coord_to_notation(coord) + chessboard.coord_to_notation(move[0])
+
+        if depth == 1:
+            nodes = 4 if standard and is_promotion(chessboard, coord, move) else 1
+        else:
+            chessboard.move_and_special_moves(coord, *move)
+            nodes = perft(chessboard, depth - 1, standard)
+            chessboard.undo_move()
+
+        results.append((notation, nodes))
+
+    return results
+
+
+def run_perft(args):
+    chessboard = BACKENDS[args.backend].from_fen(args.fen)
+
+    time_before = time.perf_counter()
+    nodes = perft(chessboard, args.depth, args.standard)
+    elapsed = time.perf_counter() - time_before
+
+    print(f"{nodes} nodes in {elapsed:.2f}s, {nodes / elapsed:.0f} nodes per second")
+
+
+def run_divide(args):
+    chessboard = BACKENDS[args.backend].from_fen(args.fen)
+    results = divide(chessboard, args.depth, args.standard)
+
+    for notation, nodes in sorted(results):
+        print(f"{notation}: {nodes}")
+
+    print(f"{len(results)} moves, {sum(nodes for _, nodes in results)} nodes")
+
+
+def run_suite(args):
+    backends = list(BACKENDS) if args.backend == "all" else [args.backend]
+
+    for backend in backends:
+        total_nodes = 0
+        total_time = 0
+
+        for name, fen, counts in SUITE:
+            for depth, expected in sorted(counts.items()):
+                if expected > args.max_nodes:
+                    break
+
+                chessboard = BACKENDS[backend].from_fen(fen)
+
+                time_before = time.perf_counter()
+                nodes = perft(chessboard, depth, standard=True)
+                elapsed = time.perf_counter() - time_before
+
+                assert nodes == expected, f"{backend} {name} depth {depth}: {nodes} nodes, expected {expected}"
+                assert chessboard.to_fen().split()[:4] == fen.split()[:4], "the moves were not all undone"
+
+                total_nodes += nodes
+                total_time += elapsed
+
+                print(f"{backend:8} {name:10} depth {depth}  {nodes:8} nodes  {elapsed:7.2f}s  "
+                      f"{nodes / elapsed:8.0f} nodes/s")
+
+        print(f"{backend}: {total_nodes} nodes in {total_time:.2f}s, {total_nodes / total_time:.0f} nodes per second\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    for command, run, help_text in (("perft", run_perft, "counts the leaf nodes to a depth"),
+                                     ("divide", run_divide, "counts the leaf nodes under each move")):
+        subparser = subparsers.add_parser(command, help=help_text)
+        subparser.add_argument("depth", type=int)
+        subparser.add_argument("--fen", default=STARTING_FEN)
+        subparser.add_argument("--backend", choices=list(BACKENDS), default="bitboard")
+        subparser.add_argument("--standard", action="store_true",
+                               help="count a promotion on the last ply as four nodes, like the published counts")
+        subparser.set_defaults(run=run)
+
+    parser_suite = subparsers.add_parser(
+        "suite", help="checks the published counts of the standard positions and reports nodes per second")
+    parser_suite.add_argument("--backend", choices=list(BACKENDS) + ["all"], default="all")
+    parser_suite.add_argument("--max-nodes", type=int, default=100000,
+                              help="skips the depths with more leaf nodes than this")
+    parser_suite.set_defaults(run=run_suite)
+
+    arguments = parser.parse_args()
+    arguments.run(arguments)
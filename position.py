@@ -0,0 +1,401 @@
+"""Positions as data: FEN strings and a fixed size binary encoding, so a position can be stored in a session, used as
+a key or handed to another process without the chessboard objects.
+
+A position is (pieces, turn, castling rights, en passant file). Pieces are (colour, piece type, square index) with
+the piece type indices of the zobrist module and square indices y * 8 + x, so index 0 is a8. The en passant file is
+the file of a pawn that has just double stepped, or None, the same as the chessboards keep in their undo records.
+
+The packed encoding is PACKED_SIZE bytes: the occupied squares as a 64-bit bitboard, the piece code
+(colour * 6 + piece type) of each occupied square in square order as 4-bit values, a byte with the turn in bit 0 and
+the castling rights above it, and a byte with the en passant file (NO_EN_PASSANT if there is none). A position has at
+most 32 pieces, so the codes always fit in 16 bytes. The move counters of a FEN string are not part of the encoding.
+
+A list of moves, (start coord, end coord, special move) as the chessboards' moves_played gives them, packs into
+2 bytes a move: start square + end square * 64 + special move type * 4096, the same as the opening book's moves.
+"""
+import struct
+
+from zobrist import CASTLING_SQUARES
+
+PACKED = struct.Struct(">Q16sBB")
+PACKED_SIZE = PACKED.size
+
+NO_EN_PASSANT = 0xFF
+
+# a packed move, and the largest special move type
+PACKED_MOVE = struct.Struct(">H")
+MAX_SPECIAL_MOVE = 5
+
+PAWN, KING = 0, 5
+
+# FEN letters of the white pieces by piece type, black's are the lower case letters
+PIECE_LETTERS = "PNBRQK"
+
+# castling rights in the order they are written in a FEN string
+CASTLING_LETTERS = [(right, "KQkq"[index]) for index, (right, _, _, _) in enumerate(CASTLING_SQUARES)]
+
+STARTING_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+
+def double_step_squares(colour, en_passant_file):
+    """Gets the squares of the pawn double step a position's en passant file comes from
+
+    Args:
+        colour (int): colour of the pawn that double stepped
+        en_passant_file (int): file (x value) of the pawn
+
+    Returns:
+        tuple of (int, int): start and end square indices of the double step
+    """
+    if colour == 0:
+        return 48 + en_passant_file, 32 + en_passant_file
+
+    return 8 + en_passant_file, 24 + en_passant_file
+
+
+def unmoved_squares(pieces, castling_rights):
+    """Finds the pieces a chessboard has to treat as not having moved yet: pawns on their starting row, so they can
+    double step, and the kings and rooks that can still castle
+
+    Args:
+        pieces (list of tuple): (colour, piece type, square index) of every piece
+        castling_rights (int): castling right bits of the zobrist module
+
+    Returns:
+        set of int: square indices of the unmoved pieces
+    """
+    unmoved = {sq for colour, piece_type, sq in pieces if piece_type == PAWN and sq // 8 == (6 if colour == 0 else 1)}
+
+    for right, _, king_sq, rook_sq in CASTLING_SQUARES:
+        if castling_rights & right:
+            unmoved.update((king_sq, rook_sq))
+
+    return unmoved
+
+
+def check_position(pieces, turn, castling_rights, en_passant_file):
+    """Checks a position can be set up on a chessboard
+
+    Args:
+        pieces (list of tuple): (colour, piece type, square index) of every piece
+        turn (int): colour of the side to move
+        castling_rights (int): castling right bits of the zobrist module
+        en_passant_file (NoneType/int): file of a pawn that has just double stepped
+
+    Raises:
+        ValueError: if the position cannot be set up
+    """
+    squares = {sq: (colour, piece_type) for colour, piece_type, sq in pieces}
+
+    if len(squares) != len(pieces):
+        raise ValueError("Two pieces are on the same square.")
+
+    if len(pieces) > 32:
+        raise ValueError(f"{len(pieces)} pieces, a position has at most 32.")
+
+    for colour in (0, 1):
+        if sum(piece == (colour, KING) for piece in squares.values()) != 1:
+            raise ValueError(f"{'White' if colour == 0 else 'Black'} does not have exactly one king.")
+
+    if any(piece_type == PAWN and (sq < 8 or sq >= 56) for _, piece_type, sq in pieces):
+        raise ValueError("A pawn is on the first or last row.")
+
+    if turn not in (0, 1):
+        raise ValueError(f"{turn!r} is not a colour.")
+
+    for right, colour, king_sq, rook_sq in CASTLING_SQUARES:
+        if castling_rights & right and (squares.get(king_sq) != (colour, KING) or squares.get(rook_sq) != (colour, 3)):
+            raise ValueError("A side can castle without its king and rook on their starting squares.")
+
+    if en_passant_file is not None:
+        start_sq, end_sq = double_step_squares(1 - turn, en_passant_file)
+
+        if squares.get(end_sq) != (1 - turn, PAWN) or start_sq in squares or (start_sq + end_sq) // 2 in squares:
+            raise ValueError("The en passant square does not follow a pawn double step.")
+
+
+def parse_fen(fen):
+    """Reads a position from a FEN string
+
+    Args:
+        fen (str): the FEN string. The halfmove clock and fullmove number can be left out.
+
+    Raises:
+        ValueError: if the string is not a FEN string
+
+    Returns:
+        tuple: (pieces, turn, castling rights, en passant file, ply) where ply is the number of moves played
+            before the position, counted from the fullmove number
+    """
+    fields = fen.split()
+
+    if len(fields) not in (4, 6):
+        raise ValueError(f"{fen!r} does not have 4 or 6 fields.")
+
+    placement, turn_field, castling_field, en_passant_field = fields[:4]
+    rows = placement.split("/")
+
+    if len(rows) != 8:
+        raise ValueError(f"{placement!r} does not have 8 rows.")
+
+    pieces = []
+
+    for y, row in enumerate(rows):
+        x = 0
+
+        for char in row:
+            if char in "12345678":
+                x += int(char)
+            elif char.upper() in PIECE_LETTERS and x < 8:
+                pieces.append((int(char.islower()), PIECE_LETTERS.index(char.upper()), y * 8 + x))
+                x += 1
+            else:
+                raise ValueError(f"{row!r} is not a row.")
+
+        if x != 8:
+            raise ValueError(f"{row!r} is not a row.")
+
+    if turn_field not in ("w", "b"):
+        raise ValueError(f"{turn_field!r} is not a side to move.")
+
+    turn = 0 if turn_field == "w" else 1
+
+    castling_rights = 0
+
+    if castling_field != "-":
+        for char in castling_field:
+            rights = [right for right, letter in CASTLING_LETTERS if letter == char]
+
+            if not rights:
+                raise ValueError(f"{castling_field!r} is not a castling field.")
+
+            castling_rights |= rights[0]
+
+    en_passant_file = None
+
+    if en_passant_field != "-":
+        # the square behind the pawn, on the sixth row for the side to move
+        if len(en_passant_field) != 2 or en_passant_field[0] not in "abcdefgh" \
+                or en_passant_field[1] != ("6" if turn == 0 else "3"):
+            raise ValueError(f"{en_passant_field!r} is not an en passant square.")
+
+        en_passant_file = "abcdefgh".index(en_passant_field[0])
+
+    fullmove = 1
+
+    if len(fields) == 6:
+        try:
+            int(fields[4])
+            fullmove = int(fields[5])
+        except ValueError:
+            raise ValueError(f"{fields[4]!r} {fields[5]!r} are not move counters.") from None
+
+    check_position(pieces, turn, castling_rights, en_passant_file)
+
+    return pieces, turn, castling_rights, en_passant_file, max(0, 2 * (fullmove - 1) + turn)
+
+
+def format_fen(pieces, turn, castling_rights, en_passant_file, ply=0):
+    """Writes a position as a FEN string. The chessboards do not keep a halfmove clock, so it is always 0.
+
+    Args:
+        pieces (list of tuple): (colour, piece type, square index) of every piece
+        turn (int): colour of the side to move
+        castling_rights (int): castling right bits of the zobrist module
+        en_passant_file (NoneType/int): file of a pawn that has just double stepped
+        ply (int, optional): number of moves played before the position. Defaults to 0.
+
+    Returns:
+        str: the FEN string
+    """
+    squares = [None] * 64
+
+    for colour, piece_type, sq in pieces:
+        letter = PIECE_LETTERS[piece_type]
+        squares[sq] = letter.lower() if colour == 1 else letter
+
+    rows = []
+
+    for y in range(8):
+        row = ""
+        empty = 0
+
+        for letter in squares[y * 8:y * 8 + 8]:
+            if letter is None:
+                empty += 1
+            else:
+                row += (str(empty) if empty else "") + letter
+                empty = 0
+
+        rows.append(row + (str(empty) if empty else ""))
+
+    castling_field = "".join(letter for right, letter in CASTLING_LETTERS if castling_rights & right) or "-"
+
+    en_passant_field = "-"
+    if en_passant_file is not None:
+        en_passant_field = "abcdefgh"[en_passant_file] + ("6" if turn == 0 else "3")
+
+    return f"{'/'.join(rows)} {'wb'[turn]} {castling_field} {en_passant_field} 0 {ply // 2 + 1}"
+
+
+def pack(pieces, turn, castling_rights, en_passant_file):
+    """Encodes a position in PACKED_SIZE bytes. Equal positions always have equal encodings.
+
+    Args:
+        pieces (list of tuple): (colour, piece type, square index) of every piece
+        turn (int): colour of the side to move
+        castling_rights (int): castling right bits of the zobrist module
+        en_passant_file (NoneType/int): file of a pawn that has just double stepped
+
+    Returns:
+        bytes: the encoding
+    """
+    occupied = 0
+    codes = [None] * 64
+
+    for colour, piece_type, sq in pieces:
+        occupied |= 1 << sq
+        codes[sq] = colour * 6 + piece_type
+
+    nibbles = [code for code in codes if code is not None]
+    nibbles += [0] * (32 - len(nibbles))
+
+    packed_codes = bytes(nibbles[index] << 4 | nibbles[index + 1] for index in range(0, 32, 2))
+
+    return PACKED.pack(occupied, packed_codes, turn | castling_rights << 1,
+                       NO_EN_PASSANT if en_passant_file is None else en_passant_file)
+
+
+def unpack(data):
+    """Decodes a position encoded by pack
+
+    Args:
+        data (bytes): the encoding
+
+    Raises:
+        ValueError: if the data is not an encoded position
+
+    Returns:
+        tuple: (pieces, turn, castling rights, en passant file)
+    """
+    if len(data) != PACKED_SIZE:
+        raise ValueError(f"{len(data)} bytes, an encoded position is {PACKED_SIZE} bytes.")
+
+    occupied, packed_codes, flags, en_passant_byte = PACKED.unpack(data)
+    nibbles = [nibble for byte in packed_codes for nibble in (byte >> 4, byte & 15)]
+    squares = [sq for sq in range(64) if occupied >> sq & 1]
+
+    if len(squares) > 32 or any(nibble >= 12 for nibble in nibbles) or any(nibbles[len(squares):]) \
+            or flags >> 5 or (en_passant_byte > 7 and en_passant_byte != NO_EN_PASSANT):
+        raise ValueError("The data is not an encoded position.")
+
+    pieces = [(code // 6, code % 6, sq) for sq, code in zip(squares, nibbles)]
+    turn = flags & 1
+    castling_rights = flags >> 1
+    en_passant_file = None if en_passant_byte == NO_EN_PASSANT else en_passant_byte
+
+    check_position(pieces, turn, castling_rights, en_passant_file)
+
+    return pieces, turn, castling_rights, en_passant_file
+
+
+def pack_moves(moves):
+    """Encodes a list of moves in 2 bytes a move
+
+    Args:
+        moves (list of tuple): (start coord, end coord, special move) of each move
+
+    Returns:
+        bytes: the encoding
+    """
+    return b"".join(PACKED_MOVE.pack(y1 * 8 + x1 + (y2 * 8 + x2) * 64 + (special_move or 0) * 4096)
+                    for (x1, y1), (x2, y2), special_move in moves)
+
+
+def unpack_moves(data):
+    """Decodes a list of moves encoded by pack_moves
+
+    Args:
+        data (bytes): the encoding
+
+    Raises:
+        ValueError: if the data is not a list of encoded moves
+
+    Returns:
+        list of tuple: (start coord, end coord, special move) of each move
+    """
+    if len(data) % PACKED_MOVE.size:
+        raise ValueError(f"{len(data)} bytes is not a whole number of moves.")
+
+    moves = []
+
+    for (packed,) in PACKED_MOVE.iter_unpack(data):
+        start_sq, end_sq, special_move = packed % 64, packed // 64 % 64, packed // 4096
+
+        if special_move > MAX_SPECIAL_MOVE:
+            raise ValueError("The data is not a list of encoded moves.")
+
+        moves.append(((start_sq % 8, start_sq // 8), (end_sq % 8, end_sq // 8), special_move or None))
+
+    return moves
+
+
+if __name__ == "__main__":
+    import random
+
+    from benchmark import random_line
+    from game import BACKENDS
+
+    # checks every position along random lines comes back the same through FEN strings and the packed encoding,
+    # on both chessboards, and that the chessboards set up from them agree on the legal moves and the keys
+    for chessboard_class in BACKENDS.values():
+        assert chessboard_class.from_fen(STARTING_FEN).to_fen() == STARTING_FEN
+        assert chessboard_class.from_fen(STARTING_FEN).zobrist_key == chessboard_class().zobrist_key
+
+    positions = 0
+
+    for seed in range(20):
+        moves = random_line(BACKENDS["bitboard"], random.Random(seed).randrange(1, 120), seed)
+        assert unpack_moves(pack_moves(moves)) == [tuple(move) for move in moves]
+        assert len(pack_moves(moves)) == 2 * len(moves)
+
+        for chessboard_class in BACKENDS.values():
+            chessboard = chessboard_class()
+
+            for move in moves:
+                chessboard.move_and_special_moves(*move)
+
+                fen = chessboard.to_fen()
+                data = chessboard.to_bytes()
+                assert len(data) == PACKED_SIZE
+
+                legal_moves = {(x, y): chessboard.get_legal_moves((x, y)) for y in range(8) for x in range(8)
+                               if chessboard.get_square((x, y)) != 0}
+
+                for other_class in BACKENDS.values():
+                    assert other_class.from_fen(fen).to_fen() == fen
+
+                    for copy in (other_class.from_fen(fen), other_class.from_bytes(data)):
+                        # the packed position has no move counters
+                        assert copy.to_fen().split()[:4] == fen.split()[:4], (fen, copy.to_fen())
+                        assert copy.to_bytes() == data
+                        assert copy.zobrist_key == chessboard.zobrist_key
+                        assert copy.material == chessboard.material
+                        assert copy.castling_rights == chessboard.castling_rights
+                        assert copy.piece_count == chessboard.piece_count
+
+                        for coord, coord_moves in legal_moves.items():
+                            assert sorted(copy.get_legal_moves(coord), key=str) == sorted(coord_moves, key=str), fen
+
+                positions += 1
+
+    for bad_fen in ("8/8/8/8/8/8/8/8 w - - 0 1", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq e3 0 1",
+                    "4k3/8/8/8/8/8/8/4K2R w Q - 0 1", "4k3/8/8/8/8/8/8/4K3 x - - 0 1"):
+        try:
+            parse_fen(bad_fen)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(bad_fen)
+
+    print(f"{positions} positions round tripped, {PACKED_SIZE} bytes each packed")
@@ -0,0 +1,320 @@
+"""Registry of the games being played, kept in the memory of the web worker so a move does not read and write the
+session database. The session only holds the game's id.
+
+A new game is written to the store as soon as it is created, so a worker other than the one that served the page can
+load it. Changed games are written back behind the moves: all of them at once when batch_size games have changed
+or when the oldest change is flush_interval seconds old, and a changed game straight away when it is evicted to keep
+the registry within its capacity. A game that is not in memory, after an eviction or a restart of the worker, is
+loaded from the store. A crash loses at most the last flush_interval seconds of moves.
+
+Every socket of a game has to be served by the same worker, which Flask-SocketIO already needs (sticky sessions).
+"""
+import time
+from collections import OrderedDict
+from uuid import uuid4
+
+from game import load_game
+
+
+class MemoryGameStore:
+    """Store of game records kept in a dictionary, for development and the checks of this module. The records are
+    lost when the process exits.
+    """
+
+    def __init__(self):
+        self.records = {}
+        # number of save_many calls, each one a round trip to a real store
+        self.writes = 0
+
+    def load(self, game_id):
+        """Gets the record of a game
+
+        Args:
+            game_id (str): id of the game
+
+        Returns:
+            NoneType/dict: None if the game is not stored, otherwise its record
+        """
+        return self.records.get(game_id)
+
+    def save_many(self, records):
+        """Stores the records of several games at once
+
+        Args:
+            records (dict): record of each game, by game id
+        """
+        self.records.update(records)
+        self.writes += 1
+
+
+class DatabaseGameStore:
+    """Store of game records in a table of the SQLAlchemy database, one row per game and a column per key of the
+    record. The positions and moves are stored as bytes, the winner as "0", "1" or "draw".
+    """
+
+    # keys of a record stored as bytes, and the keys only the records of games against the AI have
+    BINARY_KEYS = ("start", "moves", "position")
+    AI_KEYS = ("depth", "engine")
+
+    def __init__(self, db, model):
+        """
+        Args:
+            db ('flask_sqlalchemy.SQLAlchemy' object): the database
+            model (class): model of the table, with an id column and a column for each key of a Game_AI record
+        """
+        self.db = db
+        self.model = model
+
+    def load(self, game_id):
+        """Gets the record of a game
+
+        Args:
+            game_id (str): id of the game
+
+        Returns:
+            NoneType/dict: None if the game is not stored, otherwise its record
+        """
+        row = self.db.session.get(self.model, game_id)
+
+        if row is None:
+            return None
+
+        record = {column.name: getattr(row, column.name) for column in self.model.__table__.columns if column.name != "id"}
+
+        # the database driver can give the binary columns back as memoryviews
+        for key in self.BINARY_KEYS:
+            if record[key] is not None:
+                record[key] = bytes(record[key])
+
+        if record["winner"] is not None and record["winner"] != "draw":
+            record["winner"] = int(record["winner"])
+
+        if record["depth"] is None:
+            for key in self.AI_KEYS:
+                del record[key]
+
+        return record
+
+    def save_many(self, records):
+        """Stores the records of several games in one transaction
+
+        Args:
+            records (dict): record of each game, by game id
+        """
+        for game_id, record in records.items():
+            winner = None if record["winner"] is None else str(record["winner"])
+            self.db.session.merge(self.model(id=game_id, **dict(record, winner=winner)))
+
+        self.db.session.commit()
+
+
+class GameRegistry:
+    """Games of this worker by id, the least recently used being evicted first
+    """
+
+    def __init__(self, store, capacity=1000, flush_interval=5.0, batch_size=64, clock=time.monotonic):
+        """
+        Args:
+            store (MemoryGameStore/DatabaseGameStore): where the games are written back to
+            capacity (int, optional): number of games kept in memory. Defaults to 1000.
+            flush_interval (float, optional): seconds a change can wait before it is written. Defaults to 5.0.
+            batch_size (int, optional): number of changed games that are written together. Defaults to 64.
+            clock (function, optional): gives the time in seconds. Defaults to time.monotonic.
+        """
+        self.store = store
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.clock = clock
+
+        # game by id, the least recently used first
+        self.games = OrderedDict()
+        # time of the first change not yet written, by id of the changed game
+        self.dirty = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.flushes = 0
+
+    def create(self, game):
+        """Adds a new game
+
+        Args:
+            game (Game/Game_AI): the game
+
+        Returns:
+            str: id of the game
+        """
+        game_id = uuid4().hex
+
+        # written through, the page that creates the game and its sockets can be served by different workers
+        self.store.save_many({game_id: game.to_record()})
+        self.games[game_id] = game
+        self.evict()
+
+        return game_id
+
+    def get(self, game_id):
+        """Gets a game, loading it from the store if it is not in memory
+
+        Args:
+            game_id (str): id of the game
+
+        Returns:
+            NoneType/Game/Game_AI: None if there is no such game, otherwise the game
+        """
+        game = self.games.get(game_id)
+
+        if game is not None:
+            self.games.move_to_end(game_id)
+            self.hits += 1
+            return game
+
+        self.misses += 1
+
+        record = None if game_id is None else self.store.load(game_id)
+
+        if record is None:
+            return None
+
+        game = load_game(record)
+        self.games[game_id] = game
+        self.evict()
+
+        return game
+
+    def save(self, game_id, game):
+        """Marks a game as changed so it is written back to the store
+
+        Args:
+            game_id (str): id of the game
+            game (Game/Game_AI): the game
+        """
+        # the game could have been evicted while its move was being made
+        self.games[game_id] = game
+        self.games.move_to_end(game_id)
+        self.dirty.setdefault(game_id, self.clock())
+
+        self.evict()
+
+        if len(self.dirty) >= self.batch_size:
+            self.flush()
+
+    def evict(self):
+        """Removes the least recently used games until the registry is within its capacity
+        """
+        while len(self.games) > self.capacity:
+            game_id, game = self.games.popitem(last=False)
+
+            # the store is the only copy left of an evicted game, so its changes are written straight away
+            if game_id in self.dirty:
+                try:
+                    self.store.save_many({game_id: game.to_record()})
+                except Exception:
+                    self.games[game_id] = game
+                    self.games.move_to_end(game_id, last=False)
+                    raise
+
+                del self.dirty[game_id]
+
+    def flush(self):
+        """Writes every changed game to the store in one batch
+
+        Returns:
+            int: number of games written
+        """
+        if not self.dirty:
+            return 0
+
+        # games changed while the batch is written are marked again
+        dirty, self.dirty = self.dirty, {}
+
+        try:
+            self.store.save_many({game_id: self.games[game_id].to_record() for game_id in dirty})
+        except Exception:
+            for game_id, changed in dirty.items():
+                self.dirty[game_id] = min(changed, self.dirty.get(game_id, changed))
+            raise
+
+        self.flushes += 1
+
+        return len(dirty)
+
+    def flush_due(self):
+        """Writes the changed games if the oldest change has waited flush_interval seconds, called regularly so the
+        changes of idle games are written too
+
+        Returns:
+            int: number of games written
+        """
+        if self.dirty and self.clock() - min(self.dirty.values()) >= self.flush_interval:
+            return self.flush()
+
+        return 0
+
+    def __str__(self):
+        return f"GameRegistry(games={len(self.games)}, dirty={len(self.dirty)}, hits={self.hits}, misses={self.misses}, flushes={self.flushes})"
+
+
+if __name__ == "__main__":
+    import random
+
+    from game import Game, Game_AI
+
+    # plays random moves in many games through a small registry, checking evicted games come back from the store
+    # the same, that a new registry recovers every game from the store after a flush, and counting the writes
+    rng = random.Random(0)
+    now = [0.0]
+    store = MemoryGameStore()
+    registry = GameRegistry(store, capacity=20, flush_interval=5.0, batch_size=16, clock=lambda: now[0])
+
+    games = [Game() if index % 2 else Game_AI(index % 3 + 1, backend="bitboard") for index in range(50)]
+    fens = {}
+    ids = []
+
+    for game in games:
+        game_id = registry.create(game)
+        ids.append(game_id)
+        fens[game_id] = game.chess.to_fen()
+
+        # another worker finds the new game in the store before any flush
+        assert GameRegistry(store).get(game_id).chess.to_fen() == fens[game_id]
+
+    moves = 0
+    time_before = time.perf_counter()
+
+    for _ in range(1000):
+        now[0] += rng.random() * 0.05
+        game_id = rng.choice(ids)
+        game = registry.get(game_id)
+
+        assert game.chess.to_fen() == fens[game_id]
+        assert len(registry.games) <= registry.capacity
+
+        if game.winner is not None:
+            continue
+
+        options = [source + target for source, targets in game.available_moves_dictionary().items() for target in targets
+                   if game.chess.get_square(game.chess.notation_to_coord(source)).colour == game.current_turn]
+        game.next_move(rng.choice(options))
+        registry.save(game_id, game)
+        registry.flush_due()
+
+        fens[game_id] = game.chess.to_fen()
+        moves += 1
+
+    elapsed = time.perf_counter() - time_before
+
+    print(registry)
+    print(f"{moves} moves, {store.writes} writes to the store, {elapsed / moves * 1000:.2f}ms per move")
+
+    # a restart: the worker's memory is gone, the store has everything up to the last flush
+    registry.flush()
+    restarted = GameRegistry(store, capacity=20)
+
+    for game_id in ids:
+        assert restarted.get(game_id).chess.to_fen() == fens[game_id]
+
+    assert restarted.get(uuid4().hex) is None
+
+    print(f"{len(ids)} games recovered after a restart")
@@ -0,0 +1,504 @@
+"""Negamax search engine with principal variation search, aspiration windows and principal variation extraction.
+It uses the same move ordering, quiescence search and transposition table as the minimax search of the ai module,
+but the score of every position is from the point of view of the side to move, so one function searches both sides.
+"""
+import math
+
+from ai import (DELTA_MARGIN, MoveOrdering, SearchLimits, SearchTimeout, capture_moves, count_cutoff, material_gain,
+                probe_table, staged_moves, store_table)
+from evaluation import PIECE_VALUES
+from tablebase import DRAW, WIN
+from tablebase import probe as probe_tablebase
+from transposition import TranspositionTable
+from zobrist import NEGAMAX_KEY, PLAYER_COLOUR_KEYS
+
+# score of being checkmated, a checkmate fewer moves away scores further from 0
+MATE_SCORE = 100000
+
+# half the width of the first aspiration window around the score of the previous depth: half a pawn, plus the
+# smallest score step because the window is open. Scores are whole pawns, so a score a pawn away still fits.
+ASPIRATION_WINDOW = (PIECE_VALUES[0] + 1) // 2 + 1
+
+# an aspiration window is widened this many times over when the score falls outside of it,
+# and is made infinite once it is wider than ASPIRATION_LIMIT
+ASPIRATION_GROWTH = 4
+ASPIRATION_LIMIT = 64
+
+# null move pruning: the depth taken off the search after passing the turn, and the least depth it is tried at
+NULL_MOVE_REDUCTION = 2
+NULL_MOVE_MIN_DEPTH = 3
+
+# late move reductions: quiet moves after this many moves have been searched are searched one ply less deep
+# at nodes with at least LATE_MOVE_MIN_DEPTH depth left, and searched again at full depth if they beat alpha
+LATE_MOVE_INDEX = 3
+LATE_MOVE_MIN_DEPTH = 3
+LATE_MOVE_REDUCTION = 1
+
+
+def evaluate(chessboard, colour):
+    """Evaluates the chessboard from the point of view of a colour
+
+    Args:
+        chessboard ('chessboard.Chessboard' object): instance of the Chessboard class
+        colour (int): the side to move
+
+    Returns:
+        int: material of the colour minus the material of the opponent
+    """
+    if colour == 0:
+        return chessboard.material
+
+    return -chessboard.material
+
+
+def quiesce(chessboard, alpha, beta, colour, limits=None, stats=None):
+    """Searches only captures past the depth limit, so a position is not evaluated in the middle of an exchange
+
+    Args:
+        chessboard ('chessboard.Chessboard' object): instance of the Chessboard class
+        alpha (int/inf): value of alpha
+        beta (int/inf): value of beta
+        colour (int): the side to move
+        limits ('ai.SearchLimits' object, optional): search budget. Defaults to None.
+        stats ('ai.SearchStats' object, optional): node counters. Defaults to None.
+
+    Returns:
+        int: the evaluation for the side to move
+    """
+    # stand pat: the side to move does not have to capture
+    best_score = stand_pat = evaluate(chessboard, colour)
+
+    if stats is not None:
+        stats.leaf_evaluations += 1
+
+    if best_score >= beta:
+        return best_score
+
+    alpha = max(alpha, best_score)
+
+    for gain, coord, move in capture_moves(chessboard, colour, stats):
+        # delta pruning, the captures are sorted by the value of the victim.
+        # None of the captures left can score more than stand_pat + gain, which keeps the returned bound correct
+        if stand_pat + gain + DELTA_MARGIN <= alpha:
+            best_score = max(best_score, stand_pat + gain)
+            break
+
+        if limits is not None:
+            limits.count_node()
+
+        if stats is not None:
+            stats.quiescence_nodes += 1
+
+        chessboard.move_and_special_moves(coord, move[0], move[1])
+        score = -quiesce(chessboard, -beta, -alpha, 1 - colour, limits, stats)
+        chessboard.undo_move()
+
+        if score > best_score:
+            best_score = score
+            alpha = max(alpha, score)
+
+        if alpha >= beta:
+            break
+
+    return best_score
+
+
+def after_null_move(chessboard):
+    """Checks whether the last move made was a null move. Two null moves in a row would only search the same position with less depth.
+
+    Args:
+        chessboard ('chessboard.Chessboard' object): instance of the Chessboard class
+
+    Returns:
+        bool: whether the last move was a null move
+    """
+    return chessboard.ply > 0 and chessboard.history[chessboard.ply - 1][0] is None
+
+
+def tablebase_score(chessboard, ply, stats=None):
+    """Scores the position from the endgame tablebase, a win or loss scoring the same as the mate it leads to
+
+    Args:
+        chessboard ('chessboard.Chessboard' object): instance of the Chessboard class
+        ply (int): distance from the root
+        stats ('ai.SearchStats' object, optional): counters of the search. Defaults to None.
+
+    Returns:
+        NoneType/int: None if the position is not in the tablebase, otherwise its exact score for the side to move
+    """
+    entry = probe_tablebase(chessboard)
+
+    if entry is None:
+        return None
+
+    if stats is not None:
+        stats.tablebase_hits += 1
+
+    result, plies = entry
+
+    if result == DRAW:
+        return 0
+
+    if result == WIN:
+        return MATE_SCORE - ply - plies
+
+    return -MATE_SCORE + ply + plies
+
+
+def negamax(chessboard, depth, alpha, beta, colour, pv, ply=0, table=None, limits=None, ordering=None, stats=None, quiescence=True,
+            null_move=False, reductions=False):
+    """Searches a position with principal variation search: the first move is searched with the full window and
+    the rest with a null window that only proves they are no better, and are searched again if they are
+
+    Args:
+        chessboard ('chessboard.Chessboard' object): instance of the Chessboard class
+        depth (int): the maximum depth to traverse the tree
+        alpha (int/inf): value of alpha
+        beta (int/inf): value of beta
+        colour (int): the side to move
+        pv (list): filled in with the principal variation, the best line of moves from this position
+        ply (int, optional): distance from the root. Defaults to 0.
+        table ('transposition.TranspositionTable' object, optional): transposition table. Defaults to None.
+        limits ('ai.SearchLimits' object, optional): search budget. Defaults to None.
+        ordering ('ai.MoveOrdering' object, optional): killer moves and history scores. Defaults to None (board scan order).
+        stats ('ai.SearchStats' object, optional): node and cutoff counters. Defaults to None.
+        quiescence (bool, optional): whether to search captures past the depth limit. Defaults to True.
+        null_move (bool, optional): whether to use null move pruning. Defaults to False.
+        reductions (bool, optional): whether to use late move reductions. Defaults to False.
+
+    Returns:
+        int: the evaluation for the side to move
+    """
+    if limits is not None:
+        limits.count_node()
+
+    if stats is not None:
+        stats.nodes += 1
+
+    del pv[:]
+
+    # the tablebase gives the exact score of an ending with few pieces, the root still searches to pick a move
+    if ply > 0:
+        score = tablebase_score(chessboard, ply, stats)
+
+        if score is not None:
+            return score
+
+    if depth == 0:
+        if quiescence:
+            return quiesce(chessboard, alpha, beta, colour, limits, stats)
+
+        if stats is not None:
+            stats.leaf_evaluations += 1
+
+        return evaluate(chessboard, colour)
+
+    original_alpha = alpha
+    hash_move = None
+
+    if table is not None:
+        key = chessboard.zobrist_key ^ NEGAMAX_KEY ^ PLAYER_COLOUR_KEYS[colour]
+        score, hash_move = probe_table(table, key, depth, alpha, beta, ply)
+
+        # only null window searches use a stored score, so the principal variation is never cut short
+        if score is not None and beta - alpha == 1:
+            if stats is not None:
+                stats.table_hits += 1
+
+            return score
+
+    best_score = -math.inf
+    best_move = None
+    moves_searched = 0
+    child_pv = []
+
+    in_check = (null_move or reductions) and chessboard.is_in_check(colour)
+
+    # null move pruning: if the opponent cannot reach beta even when the side to move passes, a real move
+    # will almost certainly reach it as well, so a shallower search of passing is enough to cut off
+    if null_move and beta - alpha == 1 and depth >= NULL_MOVE_MIN_DEPTH and not in_check \
+            and not after_null_move(chessboard) and chessboard.has_non_pawn_material(colour) \
+            and evaluate(chessboard, colour) >= beta:
+        chessboard.make_null_move()
+        score = -negamax(chessboard, depth - 1 - NULL_MOVE_REDUCTION, -beta, -beta + 1, 1 - colour, child_pv,
+                         ply + 1, table, limits, ordering, stats, quiescence, null_move, reductions)
+        chessboard.undo_move()
+
+        if score >= beta:
+            if stats is not None:
+                stats.null_move_cutoffs += 1
+
+            if table is not None:
+                store_table(table, key, depth, beta,
+                            original_alpha, beta, hash_move, ply)
+
+            # beta rather than the score, as passing is not a legal move a mate score could be trusted for
+            return beta
+
+    for coord, move in staged_moves(chessboard, colour, hash_move, ordering, stats):
+        quiet = reductions and not material_gain(chessboard, coord, move)
+
+        chessboard.move_and_special_moves(coord, move[0], move[1])
+
+        if moves_searched == 0:
+            score = -negamax(chessboard, depth - 1, -beta, -alpha, 1 - colour, child_pv,
+                             ply + 1, table, limits, ordering, stats, quiescence, null_move, reductions)
+        else:
+            # late move reductions: quiet moves ordered late rarely beat alpha, so they are searched less deeply
+            # first, unless the side to move is in check or the move gives check
+            if quiet and moves_searched >= LATE_MOVE_INDEX and depth >= LATE_MOVE_MIN_DEPTH and not in_check \
+                    and not chessboard.is_in_check(1 - colour):
+                if stats is not None:
+                    stats.reduced_moves += 1
+
+                score = -negamax(chessboard, depth - 1 - LATE_MOVE_REDUCTION, -alpha - 1, -alpha, 1 - colour, child_pv,
+                                 ply + 1, table, limits, ordering, stats, quiescence, null_move, reductions)
+            else:
+                score = alpha + 1
+
+            if score > alpha:
+                score = -negamax(chessboard, depth - 1, -alpha - 1, -alpha, 1 - colour, child_pv,
+                                 ply + 1, table, limits, ordering, stats, quiescence, null_move, reductions)
+
+            # the move is better than the principal variation so far, search it again to find its exact score
+            if alpha < score < beta:
+                score = -negamax(chessboard, depth - 1, -beta, -alpha, 1 - colour, child_pv,
+                                 ply + 1, table, limits, ordering, stats, quiescence, null_move, reductions)
+
+        chessboard.undo_move()
+
+        moves_searched += 1
+
+        if score > best_score:
+            best_score = score
+            best_move = (coord, move)
+
+            if score > alpha:
+                alpha = score
+                pv[:] = [best_move] + child_pv
+
+        if alpha >= beta:
+            count_cutoff(stats, moves_searched)
+
+            if ordering is not None:
+                ordering.record_cutoff(chessboard, coord, move, depth)
+
+            break
+
+    # no legal moves
+    if moves_searched == 0:
+        if chessboard.is_checkmate_or_draw(colour) == "checkmate":
+            best_score = -MATE_SCORE + ply
+        else:
+            best_score = 0
+
+    if table is not None:
+        store_table(table, key, depth, best_score,
+                    original_alpha, beta, best_move, ply)
+
+    return best_score
+
+
+def search(chessboard, depth, colour, alpha=-math.inf, beta=math.inf, table=None, limits=None, ordering=None, stats=None, quiescence=True,
+           null_move=False, reductions=False):
+    """Searches the position to a fixed depth. The table's generation is left as it is, so the re-searches of an
+    aspiration window and the helpers of a lazy SMP search store their entries in one generation. The caller starts
+    the generation, see iterative_deepening and parallel.lazy_smp_search.
+
+    Args:
+        chessboard ('chessboard.Chessboard' object): instance of the Chessboard class
+        depth (int): the maximum depth to traverse the tree
+        colour (int): the side to move
+        alpha (int/inf, optional): lower bound of the search window. Defaults to -inf.
+        beta (int/inf, optional): upper bound of the search window. Defaults to inf.
+        table ('transposition.TranspositionTable' object, optional): transposition table. Defaults to None.
+        limits ('ai.SearchLimits' object, optional): search budget. Defaults to None.
+        ordering ('ai.MoveOrdering' object, optional): killer moves and history scores. Defaults to None (board scan order).
+        stats ('ai.SearchStats' object, optional): node and cutoff counters. Defaults to None.
+        quiescence (bool, optional): whether to search captures past the depth limit. Defaults to True.
+        null_move (bool, optional): whether to use null move pruning. Defaults to False.
+        reductions (bool, optional): whether to use late move reductions. Defaults to False.
+
+    Returns:
+        tuple of (NoneType/tuple, int, list): the best move, its score and the principal variation. The best move is None
+            if there are no legal moves or the score is outside of the window.
+    """
+    pv = []
+    score = negamax(chessboard, depth, alpha, beta, colour, pv, 0,
+                    table, limits, ordering, stats, quiescence, null_move, reductions)
+
+    if pv:
+        return pv[0], score, pv
+
+    return None, score, pv
+
+
+def aspiration_search(chessboard, depth, colour, previous_score, table=None, limits=None, ordering=None, stats=None, quiescence=True,
+                      null_move=False, reductions=False):
+    """Searches the position with a narrow window around the score of the previous depth, which prunes more than
+    an infinite window. If the score falls outside of the window, the window is widened and the position searched again.
+
+    Args:
+        chessboard ('chessboard.Chessboard' object): instance of the Chessboard class
+        depth (int): the maximum depth to traverse the tree
+        colour (int): the side to move
+        previous_score (int): score of the search to the previous depth
+        table ('transposition.TranspositionTable' object, optional): transposition table. Defaults to None.
+        limits ('ai.SearchLimits' object, optional): search budget. Defaults to None.
+        ordering ('ai.MoveOrdering' object, optional): killer moves and history scores. Defaults to None (board scan order).
+        stats ('ai.SearchStats' object, optional): node and cutoff counters. Defaults to None.
+        quiescence (bool, optional): whether to search captures past the depth limit. Defaults to True.
+        null_move (bool, optional): whether to use null move pruning. Defaults to False.
+        reductions (bool, optional): whether to use late move reductions. Defaults to False.
+
+    Returns:
+        tuple of (NoneType/tuple, int, list): the best move, its score and the principal variation
+    """
+    window = ASPIRATION_WINDOW
+    alpha = previous_score - window
+    beta = previous_score + window
+
+    if stats is not None:
+        stats.aspiration_searches += 1
+
+    while True:
+        best_move, score, pv = search(chessboard, depth, colour, alpha, beta,
+                                      table, limits, ordering, stats, quiescence, null_move, reductions)
+
+        if alpha < score < beta:
+            return best_move, score, pv
+
+        if stats is not None:
+            stats.aspiration_researches += 1
+
+        window *= ASPIRATION_GROWTH
+
+        if window > ASPIRATION_LIMIT:
+            window = math.inf
+
+        if score <= alpha:
+            alpha = score - window
+        else:
+            beta = score + window
+
+
+def iterative_deepening(chessboard, colour, time_budget=None, max_depth=None, node_budget=None, table=None, stats=None, quiescence=True,
+                        null_move=False, reductions=False, workers=None):
+    """Searches to depth 1, 2, 3, ... until the time or node budget runs out, each depth after the first
+    with an aspiration window around the score of the depth before
+
+    Args:
+        chessboard ('chessboard.Chessboard' object): instance of the Chessboard class
+        colour (int): the side to move
+        time_budget (float, optional): seconds the search can take. Defaults to None (no limit).
+        max_depth (int, optional): the deepest depth to search to. Defaults to None (no limit).
+        node_budget (int, optional): number of nodes the search can visit. Defaults to None (no limit).
+        table ('transposition.TranspositionTable' object, optional): transposition table. Defaults to a new table for this search.
+        stats ('ai.SearchStats' object, optional): node and cutoff counters. Defaults to None.
+        quiescence (bool, optional): whether to search captures past the depth limit. Defaults to True.
+        null_move (bool, optional): whether to use null move pruning. Defaults to False.
+        reductions (bool, optional): whether to use late move reductions. Defaults to False.
+        workers (int, optional): number of processes searching each depth with lazy SMP, which uses the shared
+            table of the parallel module instead of table. Defaults to None (searched in this process).
+
+    Returns:
+        tuple of (NoneType/tuple, int, list): the best move, its score and the principal variation of the deepest completed search
+    """
+    if max_depth is None and time_budget is None and node_budget is None:
+        raise ValueError("Iterative deepening needs a depth, time or node limit.")
+
+    if workers is not None:
+        from parallel import get_shared_table, lazy_smp_search
+
+        table = get_shared_table()
+
+    if table is None:
+        table = TranspositionTable(1)
+
+    # the entries of earlier moves are replaced first
+    table.new_search()
+
+    limits = SearchLimits(time_budget, node_budget)
+    ordering = MoveOrdering()
+    start_ply = chessboard.ply
+
+    # depth 1 is always completed so there is a move to return
+    result = search(chessboard, 1, colour, table=table, ordering=ordering,
+                    stats=stats, quiescence=quiescence)
+    depth = 1
+
+    while max_depth is None or depth < max_depth:
+        if limits.half_used():
+            break
+
+        try:
+            if workers is not None:
+                result = lazy_smp_search(chessboard, depth + 1, colour, result[1], workers, limits, ordering, stats,
+                                         quiescence, null_move, reductions)
+            else:
+                result = aspiration_search(chessboard, depth + 1, colour, result[1],
+                                           table, limits, ordering, stats, quiescence, null_move, reductions)
+        except SearchTimeout:
+            # undo the moves of the unfinished search
+            while chessboard.ply > start_ply:
+                chessboard.undo_move()
+
+            break
+
+        depth += 1
+
+    # the depth of the unfinished search is not counted
+    if stats is not None:
+        stats.depth = depth
+        stats.elapsed = limits.elapsed()
+
+    return result
+
+
+if __name__ == "__main__":
+    from bitboard import Bitboard
+
+    # checks a mate score stored by one search is right for a later search that finds the position at another ply,
+    # as the compute pool keeps its transposition table between moves
+    table = TranspositionTable(4)
+    chess = Bitboard.from_fen("r2qkb1r/pp2nppp/3p4/2pNN1B1/2BnP3/3P4/PPP2PPP/R2bK2R w KQkq - 1 1")
+
+    # mate in 2: Nf6+ gxf6 Bxf7#
+    _, score, pv = iterative_deepening(chess, chess.turn, max_depth=4, table=table)
+    assert score == MATE_SCORE - 3, score
+
+    for coord, move in pv[:2]:
+        chess.move_and_special_moves(coord, move[0], move[1])
+
+    # the position after gxf6 was stored 2 plies from the root, now it is the root and mates in 1. A null window
+    # just below the mate score uses the stored score
+    _, score, _ = search(chess, 2, chess.turn, MATE_SCORE - 2, MATE_SCORE - 1, table=table)
+    assert score >= MATE_SCORE - 1, score
+
+    # the same for the tablebase wins of the minimax engine, which count plies from the start of the game: a table
+    # filled 2 plies into a game must score the position the same as a new table for a game that starts there
+    from ai import maximise, minimax
+
+    table = TranspositionTable(4)
+    chess = Bitboard.from_fen("8/8/3k4/8/8/2p5/8/R3K3 w - - 0 1")
+
+    # Rc1, the best move of the search, then Kc7
+    minimax(chess, 4, 1 - chess.turn, table)
+
+    for coord, move in ([(0, 7), ((2, 7), None)], [(3, 2), ((2, 1), 1)]):
+        chess.move_and_special_moves(coord, move[0], move[1])
+
+    started_there = Bitboard.from_fen(chess.to_fen())
+    scores = [maximise(started_there, 2, -math.inf, math.inf, 1 - chess.turn, False, stored_table)
+              for stored_table in (table, TranspositionTable(4))]
+    assert scores[0] == scores[1], scores
+
+    # a score outside of the aspiration window is searched again without starting a new generation of the table
+    from ai import SearchStats
+
+    stats = SearchStats()
+    generation = table.generation
+    aspiration_search(chess, 3, chess.turn, 50, table, stats=stats)
+    assert stats.aspiration_researches > 0 and table.generation == generation, (stats, table.generation)
+
+    print("mate scores are stored relative to the position, re-searches keep the table's generation")
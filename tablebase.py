@@ -0,0 +1,648 @@
+"""Endgame tablebases: the exact result and distance to mate of every position of an ending with few pieces.
+
+A table holds one pawnless ending, named by its pieces such as "KQvK" or "KRvKN", the stronger side being white.
+Tables are generated offline by retrograde analysis, working back from the checkmates: a position is won if a move
+reaches a position lost for the other side, and lost if every move reaches a position won for the other side.
+Captures lead into the table with one piece less, so the smaller tables are generated first.
+
+A table file is the magic bytes followed by one byte per position: the number of plies to mate, odd if the side to
+move mates and even if it is mated, or DRAW. Positions are indexed by the side to move, the white king's square in
+the a8-a5-d5 triangle and the squares of the other pieces, the board being reflected to bring the white king into the
+triangle. The files are memory mapped, so a probe reads a single byte and the pages are shared between processes.
+
+The tables of DEFAULT_TABLES are shipped in the tablebases directory, about 63 MB in all:
+    3 pieces: KQvK, KRvK
+    4 pieces: KQvKQ, KQvKR, KQvKB, KQvKN, KRvKR, KRvKB, KRvKN, KQQvK, KQRvK, KRRvK, KBBvK, KBNvK
+A king against a king and at most one minor piece is a draw without a table. Every other ending has no table, so
+probe returns None: the 4-piece endings of minor pieces only (KBvKB, KBvKN, KNvKN, KNNvK), every ending with a pawn,
+and every ending with 5 or more pieces. The app logs a warning at startup for a shipped table whose file is missing.
+
+Usage:
+    python tablebase.py generate [KQvK KRvK ...]
+    python tablebase.py probe KQvK e1 d5 e8 [--black]
+    python tablebase.py verify [KQvK KRvK ...] [--positions 2000]
+"""
+import argparse
+import mmap
+import os
+import random
+import time
+
+from bitboard import (BISHOP, BLACK, KING, KING_ATTACKS, KNIGHT, KNIGHT_ATTACKS, QUEEN, ROOK, WHITE, bishop_attacks,
+                      rook_attacks)
+from zobrist import PIECE_TYPE_INDEX
+
+# the directory the table files are kept in
+TABLEBASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tablebases")
+
+MAGIC = b"CHESSTB1"
+
+# the most pieces, kings included, a table can have
+MAX_PIECES = 4
+
+# the value of a drawn position, and of the positions that cannot be reached
+DRAW = 255
+
+# results of a probe for the side to move
+WIN, LOSS = 1, -1
+
+# the tables generated by default, each after the tables its captures lead to
+DEFAULT_TABLES = ["KQvK", "KRvK", "KQvKQ", "KQvKR", "KQvKB", "KQvKN", "KRvKR", "KRvKB", "KRvKN",
+                  "KQQvK", "KQRvK", "KRRvK", "KBBvK", "KBNvK"]
+
+PIECE_LETTERS = {KING: "K", QUEEN: "Q", ROOK: "R", BISHOP: "B", KNIGHT: "N"}
+LETTER_PIECES = {letter: piece_type for piece_type, letter in PIECE_LETTERS.items()}
+
+# the 8 reflections and rotations of the board, each as a list mapping a square index to its new square index
+TRANSFORMS = []
+for _swap in (False, True):
+    for _flip_x in (False, True):
+        for _flip_y in (False, True):
+            _transform = []
+
+            for _sq in range(64):
+                _x, _y = _sq % 8, _sq // 8
+
+                if _swap:
+                    _x, _y = _y, _x
+                if _flip_x:
+                    _x = 7 - _x
+                if _flip_y:
+                    _y = 7 - _y
+
+                _transform.append(_y * 8 + _x)
+
+            TRANSFORMS.append(_transform)
+
+# the squares the white king is kept on, the a8-a5-d5 triangle: x <= y < 4
+KING_SQUARES = [y * 8 + x for y in range(4) for x in range(y + 1)]
+KING_SQUARE_INDEX = {sq: index for index, sq in enumerate(KING_SQUARES)}
+
+# the transforms that bring the white king from each square into the triangle, two if it ends on the diagonal
+KING_TRANSFORMS = [[transform for transform in TRANSFORMS if transform[sq] in KING_SQUARE_INDEX]
+                   for sq in range(64)]
+
+# memory mapped tables by name, None if the table has no file
+_tables = {}
+
+
+def attacks(piece_type, sq, occupied):
+    """Gets the squares a piece other than a pawn attacks
+
+    Args:
+        piece_type (int): piece type index
+        sq (int): square index of the piece
+        occupied (int): bitboard of the occupied squares
+
+    Returns:
+        int: bitboard of the attacked squares
+    """
+    if piece_type == KING:
+        return KING_ATTACKS[sq]
+    if piece_type == KNIGHT:
+        return KNIGHT_ATTACKS[sq]
+    if piece_type == BISHOP:
+        return bishop_attacks(sq, occupied)
+    if piece_type == ROOK:
+        return rook_attacks(sq, occupied)
+
+    return bishop_attacks(sq, occupied) | rook_attacks(sq, occupied)
+
+
+def table_name(white_types, black_types):
+    """Names the ending of two sets of pieces, such as "KQvKR"
+
+    Args:
+        white_types (list of int): piece type indices of white's pieces
+        black_types (list of int): piece type indices of black's pieces
+
+    Returns:
+        str: the name
+    """
+    return "".join(PIECE_LETTERS[piece_type] for piece_type in white_types) + "v" + \
+        "".join(PIECE_LETTERS[piece_type] for piece_type in black_types)
+
+
+def parse_name(name):
+    """Gets the pieces of an ending from its name
+
+    Args:
+        name (str): the name, such as "KQvKR"
+
+    Returns:
+        tuple of (list of int, list of int): piece type indices of the white and black pieces, kings first
+    """
+    white, black = name.split("v")
+
+    return [LETTER_PIECES[letter] for letter in white], [LETTER_PIECES[letter] for letter in black]
+
+
+def is_insufficient(pieces):
+    """Checks whether neither side can ever mate: only the kings and at most one bishop or knight are left
+
+    Args:
+        pieces (list of tuple): (colour, piece type, square index) of every piece
+
+    Returns:
+        bool: whether the position is a draw
+    """
+    others = [piece_type for _, piece_type, _ in pieces if piece_type != KING]
+
+    return len(others) == 0 or (len(others) == 1 and others[0] in (BISHOP, KNIGHT))
+
+
+def arrange(pieces, turn):
+    """Puts the pieces of a position in the order of its table, the stronger side as white, kings first
+
+    Args:
+        pieces (list of tuple): (colour, piece type, square index) of every piece
+        turn (int): colour of the side to move
+
+    Returns:
+        tuple of (str, list of int, int): the table name, the square of each piece of the table and the side to move
+    """
+    sides = [sorted(((piece_type, sq) for colour, piece_type, sq in pieces if colour == side), reverse=True)
+             for side in (WHITE, BLACK)]
+
+    # the stronger side is white in the table, swapping the colours mirrors the board top to bottom
+    if [piece_type for piece_type, _ in sides[BLACK]] > [piece_type for piece_type, _ in sides[WHITE]]:
+        sides = [[(piece_type, sq ^ 56) for piece_type, sq in side] for side in sides[::-1]]
+        turn = 1 - turn
+
+    name = table_name([piece_type for piece_type, _ in sides[WHITE]],
+                      [piece_type for piece_type, _ in sides[BLACK]])
+
+    return name, [sq for side in sides for _, sq in side], turn
+
+
+def position_index(squares, turn):
+    """Finds the index of a position in its table. Of the reflections of the position that bring the white king into
+    the triangle, the one with the lowest index is used, so every reflection of a position has the same index.
+
+    Args:
+        squares (list of int): square index of each piece, in the order of the table
+        turn (int): colour of the side to move
+
+    Returns:
+        int: the index
+    """
+    best = None
+
+    for transform in KING_TRANSFORMS[squares[0]]:
+        index = turn * len(KING_SQUARES) + KING_SQUARE_INDEX[transform[squares[0]]]
+
+        for sq in squares[1:]:
+            index = index * 64 + transform[sq]
+
+        if best is None or index < best:
+            best = index
+
+    return best
+
+
+def table_size(piece_count):
+    return 2 * len(KING_SQUARES) * 64 ** (piece_count - 1)
+
+
+def table_path(name):
+    return os.path.join(TABLEBASE_DIR, name + ".tb")
+
+
+def missing_tables(names=None):
+    """Finds the tables that have no file
+
+    Args:
+        names (list of str, optional): names of the tables. Defaults to None (DEFAULT_TABLES).
+
+    Returns:
+        list of str: the names of the tables without a file
+    """
+    return [name for name in names or DEFAULT_TABLES if not os.path.exists(table_path(name))]
+
+
+def get_table(name):
+    """Gets a table, mapping its file into memory the first time it is used in this process
+
+    Args:
+        name (str): the table name
+
+    Returns:
+        NoneType/'mmap.mmap' object: None if the table has no file, otherwise the table's bytes, magic included
+    """
+    if name not in _tables:
+        path = table_path(name)
+        _tables[name] = None
+
+        if os.path.exists(path):
+            with open(path, "rb") as file:
+                table = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+            white_types, black_types = parse_name(name)
+
+            if table[:len(MAGIC)] != MAGIC or len(table) != len(MAGIC) + table_size(len(white_types) + len(black_types)):
+                raise ValueError(f"{path} is not a tablebase of {name}.")
+
+            _tables[name] = table
+
+    return _tables[name]
+
+
+def probe_pieces(pieces, turn):
+    """Looks up the value of a position in the tablebase
+
+    Args:
+        pieces (list of tuple): (colour, piece type, square index) of every piece
+        turn (int): colour of the side to move
+
+    Returns:
+        NoneType/int: None if the position has no table, otherwise the plies to mate or DRAW
+    """
+    if is_insufficient(pieces):
+        return DRAW
+
+    name, squares, turn = arrange(pieces, turn)
+    table = get_table(name)
+
+    if table is None:
+        return None
+
+    return table[len(MAGIC) + position_index(squares, turn)]
+
+
+def probe(chessboard):
+    """Looks up the position of a chessboard in the tablebase. Positions with castling rights are not in the tables.
+
+    Args:
+        chessboard ('chessboard.Chessboard' object): instance of the Chessboard class
+
+    Returns:
+        NoneType/tuple: None if the position is not in the tablebase, otherwise (WIN, LOSS or DRAW for the side
+            to move, plies to mate or 0 for a draw)
+    """
+    if chessboard.piece_count > MAX_PIECES or chessboard.castling_rights:
+        return None
+
+    pieces = []
+
+    for sq in range(64):
+        square = chessboard.get_square((sq % 8, sq // 8))
+
+        if square != 0:
+            # pawns can promote, so positions with pawns have no tables
+            if square.name == "Pawn":
+                return None
+
+            pieces.append((square.colour, PIECE_TYPE_INDEX[square.name], sq))
+
+    value = probe_pieces(pieces, chessboard.turn)
+
+    if value is None:
+        return None
+
+    if value == DRAW:
+        return DRAW, 0
+
+    return (WIN if value % 2 else LOSS), value
+
+
+def legal_moves(types, colours, squares, turn):
+    """Generates the legal moves of a position of a table
+
+    Args:
+        types (list of int): piece type index of each piece
+        colours (list of int): colour of each piece
+        squares (list of int): square index of each piece
+        turn (int): colour of the side to move
+
+    Yields:
+        tuple of (int, int, NoneType/int): index of the piece moved, its end square and the index of the captured piece
+    """
+    occupied = 0
+    own = 0
+
+    for colour, sq in zip(colours, squares):
+        occupied |= 1 << sq
+
+        if colour == turn:
+            own |= 1 << sq
+
+    for piece, (piece_type, colour, sq) in enumerate(zip(types, colours, squares)):
+        if colour != turn:
+            continue
+
+        targets = attacks(piece_type, sq, occupied) & ~own
+
+        while targets:
+            lowest_bit = targets & -targets
+            end_sq = lowest_bit.bit_length() - 1
+            targets ^= lowest_bit
+
+            captured = squares.index(end_sq) if occupied & lowest_bit else None
+
+            new_squares = list(squares)
+            new_squares[piece] = end_sq
+
+            if not is_attacked(types, colours, new_squares, turn, captured):
+                yield piece, end_sq, captured
+
+
+def is_attacked(types, colours, squares, colour, captured=None):
+    """Checks whether the king of a colour is attacked
+
+    Args:
+        types (list of int): piece type index of each piece
+        colours (list of int): colour of each piece
+        squares (list of int): square index of each piece
+        colour (int): colour of the king
+        captured (NoneType/int, optional): index of a piece that has been captured. Defaults to None.
+
+    Returns:
+        bool: whether the king is attacked
+    """
+    occupied = 0
+
+    for piece, sq in enumerate(squares):
+        if piece != captured:
+            occupied |= 1 << sq
+
+    king_sq = squares[colours.index(colour)]
+
+    for piece, (piece_type, piece_colour, sq) in enumerate(zip(types, colours, squares)):
+        if piece_colour != colour and piece != captured and attacks(piece_type, sq, occupied) >> king_sq & 1:
+            return True
+
+    return False
+
+
+def decode_index(index, piece_count):
+    """Gets the position at an index of a table
+
+    Args:
+        index (int): the index
+        piece_count (int): number of pieces of the table
+
+    Returns:
+        tuple of (list of int, int): the square index of each piece and the side to move
+    """
+    squares = []
+
+    for _ in range(piece_count - 1):
+        index, sq = divmod(index, 64)
+        squares.append(sq)
+
+    turn, king_index = divmod(index, len(KING_SQUARES))
+    squares.append(KING_SQUARES[king_index])
+
+    return squares[::-1], turn
+
+
+def generate(name):
+    """Generates a table by retrograde analysis and writes its file. The tables its captures lead to must exist.
+
+    Args:
+        name (str): the table name
+
+    Returns:
+        tuple of (int, int): number of positions won by the side to move and the longest mate in plies
+    """
+    white_types, black_types = parse_name(name)
+    types = white_types + black_types
+    colours = [WHITE] * len(white_types) + [BLACK] * len(black_types)
+    piece_count = len(types)
+    size = table_size(piece_count)
+
+    # plies to mate of each position, DRAW until it is known
+    values = bytearray([DRAW]) * size
+
+    # number of different positions each position's moves lead to that are not yet known to be won for the opponent
+    remaining = bytearray(size)
+
+    # the longest of the losses each position's moves are known to lead to
+    longest_loss = bytearray(size)
+
+    # buckets[plies] holds the positions found to be won or lost in that many plies, visited in order
+    buckets = [[] for _ in range(DRAW)]
+
+    for index in range(size):
+        squares, turn = decode_index(index, piece_count)
+
+        # skip the positions with two pieces on a square, the side that has just moved in check, or a reflection
+        # of the position with a lower index
+        if len(set(squares)) < piece_count or is_attacked(types, colours, squares, 1 - turn) \
+                or position_index(squares, turn) != index:
+            continue
+
+        successors = set()
+        has_moves = False
+
+        for piece, end_sq, captured in legal_moves(types, colours, squares, turn):
+            has_moves = True
+            new_squares = list(squares)
+            new_squares[piece] = end_sq
+
+            if captured is None:
+                successors.add(position_index(new_squares, 1 - turn))
+                continue
+
+            # a capture leads to a smaller table, so its value is already known
+            value = probe_pieces([(colours[other], types[other], new_squares[other])
+                                  for other in range(piece_count) if other != captured], 1 - turn)
+
+            if value is None:
+                raise ValueError(f"{name} needs the table a capture leads to, generate it first.")
+
+            if value == DRAW:
+                # the position can never be lost
+                remaining[index] = 1
+            elif value % 2 == 0:
+                buckets[value + 1].append(index)
+                remaining[index] = 1
+            else:
+                longest_loss[index] = max(longest_loss[index], value + 1)
+
+        if successors and not remaining[index]:
+            remaining[index] = len(successors)
+        elif successors:
+            # a drawing or winning capture keeps the position from being lost
+            remaining[index] = 1 + len(successors)
+
+        if not has_moves:
+            # checkmate, stalemate is left as a draw
+            if is_attacked(types, colours, squares, turn):
+                buckets[0].append(index)
+        elif remaining[index] == 0:
+            # every move is a capture that loses
+            buckets[longest_loss[index]].append(index)
+
+    wins = 0
+    longest_mate = 0
+
+    for plies in range(DRAW):
+        for index in buckets[plies]:
+            if values[index] != DRAW:
+                continue
+
+            values[index] = plies
+            longest_mate = plies
+            squares, turn = decode_index(index, piece_count)
+
+            if plies % 2:
+                wins += 1
+
+            # positions one move before this one: a piece of the side that has just moved is moved back
+            predecessors = set()
+            occupied = 0
+
+            for sq in squares:
+                occupied |= 1 << sq
+
+            for piece, (piece_type, colour, sq) in enumerate(zip(types, colours, squares)):
+                if colour == turn:
+                    continue
+
+                # the piece moves back to an empty square the same way it would move forward
+                targets = attacks(piece_type, sq, occupied) & ~occupied
+
+                while targets:
+                    lowest_bit = targets & -targets
+                    start_sq = lowest_bit.bit_length() - 1
+                    targets ^= lowest_bit
+
+                    new_squares = list(squares)
+                    new_squares[piece] = start_sq
+
+                    # the side to move in this position cannot have been left in check
+                    if not is_attacked(types, colours, new_squares, turn):
+                        predecessors.add(position_index(new_squares, 1 - turn))
+
+            for predecessor in predecessors:
+                if values[predecessor] != DRAW:
+                    continue
+
+                if plies % 2 == 0:
+                    # a move to a lost position wins
+                    buckets[plies + 1].append(predecessor)
+                else:
+                    longest_loss[predecessor] = max(longest_loss[predecessor], plies + 1)
+                    remaining[predecessor] -= 1
+
+                    # every move leads to a position won for the opponent
+                    if remaining[predecessor] == 0:
+                        buckets[longest_loss[predecessor]].append(predecessor)
+
+        buckets[plies] = None
+
+    os.makedirs(TABLEBASE_DIR, exist_ok=True)
+
+    with open(table_path(name), "wb") as file:
+        file.write(MAGIC)
+        file.write(values)
+
+    # the table is mapped again if it was already used
+    _tables.pop(name, None)
+
+    return wins, longest_mate
+
+
+def generate_tables(args):
+    for name in args.tables or DEFAULT_TABLES:
+        time_before = time.perf_counter()
+        wins, longest_mate = generate(name)
+
+        print(f"{name}: {wins} won positions, longest mate {longest_mate} plies, "
+              f"{time.perf_counter() - time_before:.1f}s")
+
+
+def probe_position(args):
+    from chessboard import Chessboard
+
+    white_types, black_types = parse_name(args.table)
+    colours = [WHITE] * len(white_types) + [BLACK] * len(black_types)
+    pieces = []
+
+    for colour, piece_type, notation in zip(colours, white_types + black_types, args.squares):
+        x, y = Chessboard.notation_to_coord(notation)
+        pieces.append((colour, piece_type, y * 8 + x))
+
+    value = probe_pieces(pieces, BLACK if args.black else WHITE)
+
+    if value == DRAW:
+        print("draw")
+    elif value is not None:
+        print(f"{'win' if value % 2 else 'loss'} for the side to move, mate in {value} plies")
+
+
+def verify(args):
+    # checks random positions of each table against the values of the positions their moves lead to. The moves,
+    # checks and checkmates come from the mailbox Chessboard's rules, which share no code with the generator's
+    # bitboard attack tables
+    from chessboard import Chessboard
+
+    rng = random.Random(0)
+
+    for name in args.tables or [name for name in DEFAULT_TABLES if get_table(name) is not None]:
+        white_types, black_types = parse_name(name)
+        types = white_types + black_types
+        colours = [WHITE] * len(white_types) + [BLACK] * len(black_types)
+        table = get_table(name)
+        checked = 0
+
+        while checked < args.positions:
+            index = rng.randrange(table_size(len(types)))
+            squares, turn = decode_index(index, len(types))
+
+            if len(set(squares)) < len(types) or is_attacked(types, colours, squares, 1 - turn) \
+                    or position_index(squares, turn) != index:
+                continue
+
+            chessboard = Chessboard()
+            chessboard.set_position(list(zip(colours, types, squares)), turn, 0)
+            child_values = []
+
+            for coord, (end_coord, special_move) in chessboard.legal_moves():
+                chessboard.move_and_special_moves(coord, end_coord, special_move)
+                result, plies = probe(chessboard)
+                child_values.append(DRAW if result == DRAW else plies)
+                chessboard.undo_move()
+
+            lost_children = [value for value in child_values if value != DRAW and value % 2 == 0]
+
+            if not child_values:
+                expected = 0 if chessboard.is_in_check(turn) else DRAW
+            elif lost_children:
+                expected = min(lost_children) + 1
+            elif DRAW in child_values:
+                expected = DRAW
+            else:
+                expected = max(child_values) + 1
+
+            assert table[len(MAGIC) + index] == expected, (name, squares, turn, table[len(MAGIC) + index], expected)
+            checked += 1
+
+        print(f"{name}: {checked} positions match the values of their moves")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    parser_generate = subparsers.add_parser(
+        "generate", help="generates tables, by default every table in DEFAULT_TABLES")
+    parser_generate.add_argument("tables", nargs="*")
+    parser_generate.set_defaults(run=generate_tables)
+
+    parser_probe = subparsers.add_parser(
+        "probe", help="prints the plies to mate of a position given as the squares of the table's pieces")
+    parser_probe.add_argument("table")
+    parser_probe.add_argument("squares", nargs="+")
+    parser_probe.add_argument("--black", action="store_true", help="black to move")
+    parser_probe.set_defaults(run=probe_position)
+
+    parser_verify = subparsers.add_parser(
+        "verify", help="checks random positions of the generated tables with the mailbox Chessboard's move generation")
+    parser_verify.add_argument("tables", nargs="*")
+    parser_verify.add_argument("--positions", type=int, default=2000)
+    parser_verify.set_defaults(run=verify)
+
+    arguments = parser.parse_args()
+    arguments.run(arguments)